@@ -0,0 +1,276 @@
+"""
+An in-process load test for the dashboard.
+
+Drives a `Dashboard` app directly over ASGI, with no network or server, so
+that the numbers reflect the dashboard itself. The app serves generated
+`MockDataSource` tables, and a weighted mix of scripted traffic is sent at
+a fixed concurrency. Throughput and p50/p95/p99 latency are reported for
+each kind of request.
+
+For example:
+
+python -m benchmarks.loadtest --rows 100000 --concurrency 200 --requests 5000
+python -m benchmarks.loadtest --mix list=1,search=1 --table-class streaming
+"""
+
+import argparse
+import asyncio
+import datetime
+import math
+import random
+import time
+import typing
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+import typesystem
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+import dashboard
+
+DEFAULT_MIX = {
+    "list": 40,
+    "search": 20,
+    "sort": 15,
+    "deep-page": 10,
+    "detail": 10,
+    "edit": 5,
+}
+
+# A request to send, as (method, path, query string, form body).
+Request = typing.Tuple[str, str, str, typing.Optional[dict]]
+
+
+class StreamingTable(dashboard.DashboardTable):
+    STREAMING = True
+
+
+class PrefetchTable(dashboard.DashboardTable):
+    PREFETCH = True
+
+
+TABLE_CLASSES = {
+    "default": dashboard.DashboardTable,
+    "streaming": StreamingTable,
+    "prefetch": PrefetchTable,
+}
+
+
+def make_app(
+    rows: int,
+    table_class: typing.Type[dashboard.DashboardTable] = dashboard.DashboardTable,
+    seed: int = 0,
+) -> Starlette:
+    """
+    Return an app with a generated users table of `rows` rows.
+    """
+    generator = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+    schema = typesystem.Schema(
+        fields={
+            "pk": typesystem.Integer(title="Identity", read_only=True),
+            "username": typesystem.String(title="Username", max_length=100),
+            "is_admin": typesystem.Boolean(title="Is Admin", default=False),
+            "score": typesystem.Integer(title="Score"),
+            "joined": typesystem.DateTime(title="Joined"),
+        }
+    )
+    initial = [
+        {
+            "pk": pk,
+            "username": f"user{pk}@example.org",
+            "is_admin": generator.random() < 0.1,
+            "score": generator.randrange(1000),
+            "joined": start + datetime.timedelta(minutes=generator.randrange(10**6)),
+        }
+        for pk in range(rows)
+    ]
+    users = dashboard.MockDataSource(schema=schema, initial=initial)
+    table = table_class(ident="users", title="Users", datasource=users)
+    return Starlette(
+        routes=[
+            Mount("/admin", dashboard.Dashboard(tables=[table]), name="dashboard"),
+        ]
+    )
+
+
+def get_request(kind: str, rows: int, generator: random.Random) -> Request:
+    """
+    Return a scripted request of the given kind, against the users table.
+    """
+    path = "/admin/users/"
+    if kind == "list":
+        return ("GET", path, "", None)
+    if kind == "search":
+        term = str(generator.randrange(rows))[: generator.randint(1, 3)]
+        return ("GET", path, urlencode({"search": term}), None)
+    if kind == "sort":
+        order = generator.choice(["username", "-score", "joined", "-is_admin,score"])
+        return ("GET", path, urlencode({"order": order}), None)
+    if kind == "deep-page":
+        pages = max(rows // dashboard.DashboardTable.PAGE_SIZE, 1)
+        page = generator.randint(max(pages - 10, 1), pages)
+        return ("GET", path, urlencode({"page": page, "order": "-score"}), None)
+    if kind == "detail":
+        return ("GET", f"{path}{generator.randrange(rows)}", "", None)
+    if kind == "edit":
+        pk = generator.randrange(rows)
+        values = {
+            "username": f"edited{pk}@example.org",
+            "score": generator.randrange(1000),
+            "joined": "2021-01-01T00:00:00",
+        }
+        return ("POST", f"{path}{pk}", "", values)
+    raise ValueError(f"Unknown kind of request {kind!r}.")
+
+
+async def send_request(app: typing.Any, request: Request) -> int:
+    """
+    Send a request to an ASGI app, returning the response status code.
+    """
+    method, path, query_string, form = request
+    body = urlencode(form).encode() if form is not None else b""
+    headers = [(b"host", b"testserver")]
+    if form is not None:
+        headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string.encode(),
+        "headers": headers,
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+        "scheme": "http",
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+
+    async def receive() -> dict:
+        if messages:
+            return messages.pop()
+        # The client stays connected until the response is complete.
+        await asyncio.Event().wait()
+        return {}
+
+    async def send(message: dict) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def percentile(samples: typing.List[float], percent: float) -> float:
+    """
+    Return a percentile of the samples, using the nearest rank.
+    """
+    ordered = sorted(samples)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+@dataclass
+class Stats:
+    latencies: typing.List[float] = field(default_factory=list)
+    errors: int = 0
+
+
+async def run(
+    app: typing.Any,
+    rows: int,
+    mix: typing.Dict[str, int],
+    requests: int,
+    concurrency: int,
+    seed: int = 0,
+) -> typing.Tuple[typing.Dict[str, Stats], float]:
+    """
+    Send `requests` requests from the traffic mix, with `concurrency` clients
+    each sending one request at a time. Returns the stats for each kind of
+    request, and the elapsed time.
+    """
+    generator = random.Random(seed)
+    kinds = generator.choices(list(mix), weights=list(mix.values()), k=requests)
+    scripted = [(kind, get_request(kind, rows, generator)) for kind in kinds]
+    stats = {kind: Stats() for kind in mix}
+    position = 0
+
+    async def client() -> None:
+        nonlocal position
+        while position < len(scripted):
+            kind, request = scripted[position]
+            position += 1
+            started = time.perf_counter()
+            status = await send_request(app, request)
+            stats[kind].latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                stats[kind].errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return stats, time.perf_counter() - started
+
+
+def report(stats: typing.Dict[str, Stats], elapsed: float) -> str:
+    lines = [
+        f"{'route':<12}{'requests':>10}{'errors':>8}{'req/s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    ]
+    everything = Stats()
+    for kind, kind_stats in list(stats.items()) + [("total", everything)]:
+        latencies = kind_stats.latencies
+        if kind != "total":
+            everything.latencies.extend(latencies)
+            everything.errors += kind_stats.errors
+        if not latencies:
+            continue
+        p50, p95, p99 = [percentile(latencies, p) * 1000 for p in (50, 95, 99)]
+        lines.append(
+            f"{kind:<12}{len(latencies):>10}{kind_stats.errors:>8}"
+            f"{len(latencies) / elapsed:>10.1f}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_mix(value: str) -> typing.Dict[str, int]:
+    """
+    Parse a traffic mix, such as "list=3,search=1".
+    """
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown kind of request {kind!r}.")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def main(argv: typing.Sequence[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--table-class", choices=TABLE_CLASSES, default="default")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.rows, TABLE_CLASSES[args.table_class], seed=args.seed)
+    stats, elapsed = asyncio.run(
+        run(app, args.rows, args.mix, args.requests, args.concurrency, args.seed)
+    )
+    print(
+        f"{args.requests} requests, {args.concurrency} concurrent clients, "
+        f"{args.rows} rows, {elapsed:.2f}s"
+    )
+    print(report(stats, elapsed))
+
+
+if __name__ == "__main__":
+    main()
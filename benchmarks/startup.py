@@ -0,0 +1,88 @@
+"""
+Checks the import time of the dashboard package against a budget.
+
+Each statement is run in a fresh interpreter with `-X importtime`, and the
+time spent importing modules is compared with the time for an empty
+program. The best of several runs is used, to reduce noise.
+
+For example:
+
+python -m benchmarks.startup
+python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import subprocess
+import sys
+import typing
+
+# The budget for each statement, in milliseconds of import time.
+BUDGETS = {
+    # Importing the package loads nothing until a name is used.
+    "import dashboard": 5.0,
+    # Datasources don't need the web application, templates or forms.
+    "from dashboard import MockDataSource": 125.0,
+    "from dashboard import Dashboard": 250.0,
+}
+
+
+def parse_import_time(output: str) -> float:
+    """
+    Return the total import time in milliseconds, from `-X importtime` output.
+    Only top level imports are counted, as their times include any nested
+    imports.
+    """
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total / 1000
+
+
+def measure(statement: str) -> float:
+    """
+    Return the import time for a statement in a fresh interpreter, in
+    milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_import_time(result.stderr)
+
+
+def check(
+    budgets: typing.Dict[str, float], runs: int = 5
+) -> typing.List[typing.Tuple[str, float, float]]:
+    """
+    Return (statement, import time, budget) for each statement, where the
+    import time is the best of `runs` runs, less that of an empty program.
+    """
+    baseline = min(measure("pass") for _ in range(runs))
+    return [
+        (statement, min(measure(statement) for _ in range(runs)) - baseline, budget)
+        for statement, budget in budgets.items()
+    ]
+
+
+def main(argv: typing.Sequence[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for statement, elapsed, budget in check(BUDGETS, runs=args.runs):
+        status = "ok" if elapsed <= budget else "OVER BUDGET"
+        failed = failed or elapsed > budget
+        print(f"{statement:<40}{elapsed:>8.1f} ms  (budget {budget:.0f} ms)  {status}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
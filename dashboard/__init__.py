@@ -1,12 +1,48 @@
-from .application import Dashboard, DashboardTable
-from .datasource import DataSource, MockDataSource, autoincrement
+import importlib
+import typing
 
 __version__ = "0.0.6"
 
 __all__ = [
+    "CachedDataSource",
     "Dashboard",
     "DashboardTable",
     "DataSource",
     "MockDataSource",
+    "SQLiteCache",
+    "SnapshotStore",
     "autoincrement",
 ]
+
+# Public names are imported from their modules on first use, so that
+# `import dashboard` stays cheap for code that only needs part of it.
+_modules = {
+    "CachedDataSource": ".cache",
+    "Dashboard": ".application",
+    "DashboardTable": ".application",
+    "DataSource": ".datasource",
+    "MockDataSource": ".datasource",
+    "SQLiteCache": ".cache",
+    "SnapshotStore": ".persistence",
+    "autoincrement": ".datasource",
+}
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from .application import Dashboard, DashboardTable
+    from .cache import CachedDataSource, SQLiteCache
+    from .datasource import DataSource, MockDataSource, autoincrement
+    from .persistence import SnapshotStore
+
+
+def __getattr__(name: str) -> typing.Any:
+    try:
+        module_name = _modules[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> typing.List[str]:
+    return sorted(set(globals()) | set(__all__))
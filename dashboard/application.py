@@ -1,28 +1,137 @@
+import asyncio
+import functools
+import hashlib
 import math
 
 import jinja2
 import typesystem
+from starlette.datastructures import URLPath
 from starlette.exceptions import HTTPException
-from starlette.responses import RedirectResponse
-from starlette.routing import Mount, Route, Router
+from starlette.responses import (
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.routing import (
+    BaseRoute,
+    Match,
+    Mount,
+    NoMatchFound,
+    Route,
+    Router,
+    compile_path,
+    replace_params,
+)
 from starlette.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 
-from . import ordering, pagination, search
+from . import filtering, live, ordering, pagination, streaming
+from .cache import MISSING, MemoryCache, call, get_generation
+from .datasource import BudgetExceeded
+from .query import TableQuery
+from .relations import RelationLoader
+
+
+@functools.lru_cache(maxsize=None)
+def get_forms():
+    """
+    Return the form renderer. Its template environment is created on first
+    use, rather than when the module is imported.
+    """
+    return typesystem.Jinja2Forms(directory="templates", package="dashboard")
+
+
+def format_bytes(size):
+    """
+    Format a size in bytes for display, such as "1.5 MB".
+    """
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return f"{size:,.0f} {unit}" if unit == "bytes" else f"{size:,.1f} {unit}"
+
+
+def create_templates():
+    templates = Jinja2Templates(directory="templates")
+    templates.env.loader = jinja2.ChoiceLoader(
+        [
+            jinja2.FileSystemLoader("templates"),
+            jinja2.PackageLoader("dashboard", "templates"),
+        ]
+    )
+    templates.env.filters["format_bytes"] = format_bytes
+    return templates
+
+
+# Requests with this header get just the table and pagination, for swapping
+# into a page that is already open.
+FRAGMENT_HEADER = "X-Dashboard-Fragment"
+
 
-forms = typesystem.Jinja2Forms(directory="templates", package="dashboard")
+# The routes of each table, as (path, name, methods). Each route's endpoint is
+# the table method of the same name.
+TABLE_ROUTES = [
+    ("/", "table", ["GET"]),
+    ("/", "create", ["POST"]),
+    ("/-/live", "live", ["GET"]),
+    ("/-/suggest", "suggest", ["GET"]),
+    ("/-/stats", "stats", ["GET"]),
+    ("/{ident}", "detail", ["GET"]),
+    ("/{ident}", "edit", ["POST"]),
+    ("/{ident}/delete", "delete", ["POST"]),
+]
 
 
-class TableMount(Mount):
-    def __init__(self, table):
-        super().__init__(f"/{table.tablename}", app=table)
-        self.tablename = table.tablename
+class TableMount(BaseRoute):
+    """
+    Routes requests to the tables of a dashboard.
+
+    Requests are dispatched with a dictionary lookup on the first path
+    segment, rather than trying each table in turn, and URLs are built from
+    a precomputed map of route names, so both stay fast with many tables.
+    """
+
+    def __init__(self, tables):
+        self.tables = {}
+        for table in tables:
+            if table.tablename in self.tables:
+                raise ValueError(f"Duplicate table name {table.tablename!r}.")
+            self.tables[table.tablename] = table
+        self.paths = {}
+        for path, name, _ in TABLE_ROUTES:
+            _, path_format, convertors = compile_path(path)
+            self.paths[name] = (path_format, convertors)
+
+    def matches(self, scope):
+        if scope["type"] != "http":
+            return Match.NONE, {}
+        tablename, slash, remaining_path = scope["path"][1:].partition("/")
+        table = self.tables.get(tablename)
+        if table is None or not slash:
+            return Match.NONE, {}
+        root_path = scope.get("root_path", "")
+        child_scope = {
+            "app_root_path": scope.get("app_root_path", root_path),
+            "root_path": root_path + "/" + tablename,
+            "path": "/" + remaining_path,
+            "endpoint": table,
+        }
+        return Match.FULL, child_scope
+
+    async def handle(self, scope, receive, send) -> None:
+        await scope["endpoint"](scope, receive, send)
 
     def url_path_for(self, name: str, **path_params: str):
         tablename = path_params.pop("tablename", None)
-        if tablename:
-            name = tablename + "_" + name
-        return super().url_path_for(name, **path_params)
+        if tablename not in self.tables or name not in self.paths:
+            raise NoMatchFound()
+        path_format, convertors = self.paths[name]
+        if set(path_params) != set(convertors):
+            raise NoMatchFound()
+        path, _ = replace_params(path_format, convertors, path_params)
+        return URLPath(path=f"/{tablename}{path}")
 
 
 class Dashboard:
@@ -31,30 +140,38 @@ class Dashboard:
         self.routes = [
             Route("/", endpoint=self.index, name="index"),
             Mount("/statics", app=statics, name="static"),
-        ] + [TableMount(table) for table in tables]
+            TableMount(tables),
+        ]
         self.router = Router(routes=self.routes)
-        self.templates = Jinja2Templates(directory="templates")
-        self.templates.env.loader = jinja2.ChoiceLoader(
-            [
-                jinja2.FileSystemLoader("templates"),
-                jinja2.PackageLoader("dashboard", "templates"),
-            ]
-        )
         self.tables = tables
+        self._templates = None
+
+    @property
+    def templates(self):
+        if self._templates is None:
+            self._templates = create_templates()
+        return self._templates
 
     async def __call__(self, scope, receive, send) -> None:
         await self.router(scope, receive, send)
 
     async def index(self, request):
         template = "dashboard/index.html"
-        rows = [
-            {
-                "text": table.title,
-                "url": request.url_for("dashboard:table", tablename=table.tablename),
-                "count": await table.datasource.count(),
-            }
-            for table in self.tables
-        ]
+        rows = []
+        for table in self.tables:
+            # In-memory datasources also report the memory they use.
+            memory = None
+            if hasattr(table.datasource, "memory_usage"):
+                memory = await table.datasource.memory_usage()
+            url = request.url_for("dashboard:table", tablename=table.tablename)
+            rows.append(
+                {
+                    "text": table.title,
+                    "url": url,
+                    "count": await table.datasource.count(),
+                    "memory": memory,
+                }
+            )
         context = {
             "request": request,
             "rows": rows,
@@ -65,98 +182,498 @@ class Dashboard:
 class DashboardTable:
     PAGE_SIZE = 10
     LOOKUP_FIELD = "pk"
+    # The field shown in links to rows of this table, from relationship
+    # columns of other tables. Defaults to the lookup field.
+    DISPLAY_FIELD = None
+    # Stream table pages, so that the page head is sent before the queries
+    # complete, and rows are sent in batches as they are read and rendered.
+    STREAMING = False
+    STREAMING_BATCH_SIZE = 100
+    # Push row changes to open table pages, for datasources with `subscribe()`.
+    LIVE_UPDATES = False
+    # The most rows returned by the typeahead search endpoint.
+    SUGGEST_LIMIT = 10
+    # Time budgets in seconds for counting, for fetching the rows, and for
+    # loading the whole page. `None` means no limit. Slow counts degrade to
+    # next and previous paging, while slow rows fail the request with a 503.
+    COUNT_TIMEOUT = None
+    ROWS_TIMEOUT = None
+    REQUEST_TIMEOUT = None
+    # An integer field incremented on every edit. When set, an edit only
+    # applies if the row hasn't changed since the form was loaded, and
+    # otherwise gets a 409 response showing the current values.
+    VERSION_FIELD = None
+    # Load the next page in the background after serving each page, so that
+    # paging forward is served from a short-lived cache. At most
+    # `PREFETCH_CONCURRENCY` pages are loaded at once, and prefetched pages
+    # are kept for `PREFETCH_TTL` seconds, or until a write to the table.
+    PREFETCH = False
+    PREFETCH_CONCURRENCY = 2
+    PREFETCH_TTL = 5.0
+    # Cache rows by their lookup field, for `ROW_CACHE_TTL` seconds, so that
+    # rows that were just listed or viewed are shown without another query.
+    # Writes through the dashboard clear the cache, but writes made elsewhere
+    # are only seen once the cached row expires.
+    #
+    # Both caches are held in the same backend as the datasource's `cache`,
+    # if it has one, so that with a shared backend such as `SQLiteCache` a
+    # write in any worker clears them for every worker.
+    ROW_CACHE = False
+    ROW_CACHE_SIZE = 1000
+    ROW_CACHE_TTL = 30.0
 
     def __init__(
-        self, ident, title, datasource, can_create=True, can_edit=True, can_delete=True
+        self,
+        ident,
+        title,
+        datasource,
+        can_create=True,
+        can_edit=True,
+        can_delete=True,
+        filter_fields=None,
+        relations=None,
     ):
-        self.routes = [
-            Route("/", endpoint=self.table, name=f"{ident}_table", methods=["GET"]),
-            Route("/", endpoint=self.create, name=f"{ident}_create", methods=["POST"]),
-            Route(
-                "/{ident}",
-                endpoint=self.detail,
-                name=f"{ident}_detail",
-                methods=["GET"],
-            ),
-            Route(
-                "/{ident}", endpoint=self.edit, name=f"{ident}_edit", methods=["POST"]
-            ),
-            Route(
-                "/{ident}/delete",
-                endpoint=self.delete,
-                name=f"{ident}_delete",
-                methods=["POST"],
-            ),
-        ]
-        self.router = Router(routes=self.routes)
-        self.templates = Jinja2Templates(directory="templates")
-        self.templates.env.loader = jinja2.ChoiceLoader(
-            [
-                jinja2.FileSystemLoader("templates"),
-                jinja2.PackageLoader("dashboard", "templates"),
-            ]
-        )
         self.title = title
         self.tablename = ident
         self.datasource = datasource
         self.can_create = can_create
         self.can_edit = can_edit
         self.can_delete = can_delete
+        if filter_fields is not None:
+            # Check the fields up front, rather than failing on every request.
+            filtering.get_facet_fields(datasource.schema, filter_fields)
+        self.filter_fields = filter_fields
+        # Relationship columns, mapping field names to the related tables.
+        self.relations = relations or {}
+        self.change_feed = None
+        self._router = None
+        self._templates = None
+        self._streaming_env = None
+        # The in-progress typeahead search for each client.
+        self._suggestions = {}
+        # Prefetched pages, and the pages being prefetched, keyed by query.
+        self._prefetched = self._create_cache("prefetched", 100, self.PREFETCH_TTL)
+        self._prefetching = {}
+        # Recently listed or viewed rows, keyed by their lookup field.
+        self._rows = self._create_cache("rows", self.ROW_CACHE_SIZE, self.ROW_CACHE_TTL)
+        if self.LIVE_UPDATES and hasattr(datasource, "subscribe"):
+            self.change_feed = live.ChangeFeed(datasource, self._load_live_page)
+
+    def _create_cache(self, name, max_size, ttl):
+        backend = getattr(self.datasource, "cache", None)
+        if backend is None:
+            return MemoryCache(max_size=max_size, ttl=ttl)
+        return backend.derive(name, max_size=max_size, ttl=ttl)
+
+    async def _cache_get(self, cache, key):
+        value = await call(cache, cache.get, key)
+        if value is MISSING or not cache.is_shared:
+            return value
+        # Shared caches hold rows as their field values.
+        return self.datasource.load(value)
+
+    async def _cache_set(self, cache, key, value, generation):
+        if cache.is_shared:
+            value = self.datasource.dump(value)
+        await call(cache, cache.set, key, value, generation)
+
+    # The router and templates are built on the first request to the table,
+    # so that dashboards with many tables start quickly.
+
+    @property
+    def router(self):
+        if self._router is None:
+            routes = [
+                Route(
+                    path,
+                    endpoint=getattr(self, name),
+                    name=f"{self.tablename}_{name}",
+                    methods=methods,
+                )
+                for path, name, methods in TABLE_ROUTES
+            ]
+            self._router = Router(routes=routes)
+        return self._router
+
+    @property
+    def templates(self):
+        if self._templates is None:
+            self._templates = create_templates()
+        return self._templates
+
+    @property
+    def streaming_env(self):
+        if self._streaming_env is None:
+            self._streaming_env = self.templates.env.overlay(enable_async=True)
+        return self._streaming_env
 
     async def __call__(self, scope, receive, send) -> None:
         await self.router(scope, receive, send)
 
     async def table(self, request):
         template = "dashboard/table.html"
+        query = self._get_query(request.url)
+        if FRAGMENT_HEADER in request.headers:
+            return await self.fragment(request, query)
+
+        form = get_forms().create_form(schema=self.datasource.schema)
+        live_url = None
+        if self.change_feed is not None:
+            live_url = request.url_for("dashboard:live", tablename=self.tablename)
+
+        if self.STREAMING:
+            # Send the page head at once, and load the rows while streaming.
+            async def load_page():
+                return await self._load(request, query, stream=True)
+
+            context = self._context(
+                form=form, request=request, live_url=live_url, load_page=load_page
+            )
+            return streaming.TemplateStreamingResponse(
+                self.streaming_env.get_template(template),
+                context,
+                headers={"Vary": FRAGMENT_HEADER},
+            )
+
+        page = await self._load(request, query)
+        context = self._context(form=form, request=request, live_url=live_url, **page)
+        headers = {"Vary": FRAGMENT_HEADER}
+        return self.templates.TemplateResponse(
+            template, context, status_code=200, headers=headers
+        )
 
-        datasource = self.datasource
+    async def fragment(self, request, query):
+        """
+        Render only the rows and pagination of a page, without the facets.
+        """
+        template = "dashboard/table_fragment.html"
+        page = await self._load(request, query, include_facets=False)
+        context = self._context(form=None, request=request, **page)
+        headers = {"Vary": FRAGMENT_HEADER}
+        return self.templates.TemplateResponse(
+            template, context, status_code=200, headers=headers
+        )
 
-        columns = {key: field.title for key, field in datasource.schema.fields.items()}
+    async def live(self, request):
+        """
+        Stream server-sent events with changes to the rows on a page.
+        """
+        if self.change_feed is None:
+            raise HTTPException(status_code=404)
+
+        query = self._get_query(request.url)
+        return StreamingResponse(
+            self.change_feed.stream(query),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
 
-        # Get some normalised information from URL query parameters
-        current_page = pagination.get_page_number(url=request.url)
-        order_by = ordering.get_ordering(url=request.url, columns=columns)
-        search_term = search.get_search_term(url=request.url)
+    async def suggest(self, request):
+        """
+        Return the first rows matching a search term as JSON, for typeahead.
+
+        Clients may pass an opaque `client` token. A new search from the same
+        client cancels its previous search, which gets an empty response.
+        """
+        search_term = request.query_params.get("q", "").strip()
+        client = request.query_params.get("client")
+        if not search_term:
+            return JSONResponse({"results": []})
+
+        task = asyncio.ensure_future(
+            self.datasource.suggest(search_term, limit=self.SUGGEST_LIMIT)
+        )
+        if client is not None:
+            previous = self._suggestions.get(client)
+            if previous is not None:
+                previous.cancel()
+            self._suggestions[client] = task
+        try:
+            rows = await task
+        except asyncio.CancelledError:
+            if client is None or self._suggestions.get(client) is task:
+                raise
+            # Superseded by a newer search from the same client.
+            return Response(status_code=204)
+        finally:
+            if client is not None and self._suggestions.get(client) is task:
+                del self._suggestions[client]
+
+        fields = list(self.datasource.schema.fields.keys())
+        results = []
+        for row in rows:
+            key = getattr(row, self.LOOKUP_FIELD)
+            url = request.url_for(
+                "dashboard:detail", tablename=self.tablename, ident=key
+            )
+            cells = [str(getattr(row, field)) for field in fields]
+            results.append({"key": str(key), "url": url, "cells": cells})
+        return JSONResponse({"results": results})
+
+    async def stats(self, request):
+        """
+        Show summary statistics for each column of the table.
+        """
+        template = "dashboard/stats.html"
+        try:
+            stats = await asyncio.wait_for(
+                self._with_timeout(self.datasource, self.REQUEST_TIMEOUT).stats(),
+                self.REQUEST_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503)
+
+        fields = self.datasource.schema.fields
+        columns = [(field.title, stats[key]) for key, field in fields.items()]
+        context = self._context(form=None, request=request, columns=columns)
+        return self.templates.TemplateResponse(template, context)
+
+    async def _load_live_page(self, query):
+        page = await self._load_page(query)
+        rows = page["rows"]
+        fields = list(self.datasource.schema.fields.keys())
+        rendered = {}
+        for row in rows:
+            key = str(getattr(row, self.LOOKUP_FIELD))
+            rendered[key] = [str(getattr(row, field)) for field in fields]
+        return page["count"], rendered
+
+    async def _load_related(self, request, rows):
+        """
+        Return links to the rows referenced by any relationship columns.
+        """
+        if not self.relations:
+            return {}
+        return await RelationLoader(request).resolve(self.relations, rows)
+
+    def _get_query(self, url):
+        """
+        Parse the table state from the URL query parameters.
+        """
+        schema = self.datasource.schema
+        columns = {key: field.title for key, field in schema.fields.items()}
+        filter_fields = filtering.get_facet_fields(
+            schema, filter_fields=self.filter_fields
+        )
+        return TableQuery.from_url(url, columns=columns, filter_fields=filter_fields)
+
+    async def _load(self, request, query, include_facets=True, stream=False):
+        """
+        Load a page of the table and any related rows, within the time budget
+        for the whole request.
+
+        With `stream`, the rows are a `RowStream`, and only the first batch of
+        rows is loaded before returning. Later batches are loaded as they are
+        rendered.
+
+        The facets are loaded separately from the rest of the page, so that
+        prefetched pages serve both full pages and fragments.
+        """
+
+        generation = await self._rows_generation()
+
+        async def load_page():
+            task = self._prefetching.get(query)
+            if task is not None:
+                # The page is already being prefetched, so wait for it.
+                await asyncio.wait({task})
+            page = MISSING
+            if self.PREFETCH:
+                page = await self._cache_get(self._prefetched, query)
+            if page is MISSING:
+                page = await self._load_page(query, stream=stream)
+            # Prefetched pages are shared, so each response gets its own copy.
+            return dict(page)
+
+        async def load():
+            if include_facets:
+                page, facets = await asyncio.gather(
+                    load_page(), self._load_facets(query)
+                )
+                page["facets"] = facets
+            else:
+                page = await load_page()
+            if not stream:
+                page["related"] = await self._load_related(request, page["rows"])
+                await self._cache_rows(page["rows"], generation)
+                return page
+
+            # Related rows are looked up for each batch, as it is loaded.
+            related = page["related"] = {}
+
+            async def on_batch(rows):
+                links = await self._load_related(request, rows)
+                for key, values in links.items():
+                    related.setdefault(key, {}).update(values)
+                await self._cache_rows(rows, generation)
+
+            page["rows"] = streaming.RowStream(
+                page["rows"],
+                batch_size=self.STREAMING_BATCH_SIZE,
+                on_batch=on_batch,
+                timeout=self.ROWS_TIMEOUT,
+            )
+            await page["rows"].start()
+            return page
+
+        try:
+            page = await asyncio.wait_for(load(), self.REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503)
+
+        # Pages requested by a browser prefetch hint don't prefetch further.
+        purpose = request.headers.get("sec-purpose", request.headers.get("purpose"))
+        if self.PREFETCH and not (purpose or "").startswith("prefetch"):
+            self._prefetch(page["next_query"])
+        return page
+
+    def _prefetch(self, query):
+        """
+        Start loading a page in the background, unless it is already loaded
+        or loading, or too many pages are being loaded.
+        """
+        if query is None or query in self._prefetching:
+            return
+        if len(self._prefetching) >= self.PREFETCH_CONCURRENCY:
+            return
+
+        async def prefetch():
+            cache = self._prefetched
+            if await call(cache, cache.get, query) is not MISSING:
+                return
+            generation = await call(cache, get_generation, cache)
+            page = await asyncio.wait_for(self._load_page(query), self.REQUEST_TIMEOUT)
+            # Pages loaded across a write to the table are discarded.
+            await self._cache_set(cache, query, page, generation)
+
+        def done(task):
+            del self._prefetching[query]
+            if not task.cancelled():
+                # Prefetching is best effort, so failures are ignored.
+                task.exception()
+
+        task = asyncio.ensure_future(prefetch())
+        task.add_done_callback(done)
+        self._prefetching[query] = task
+
+    async def _load_facets(self, query):
+        """
+        Return the facets for the filter sidebar. Facets are left out if
+        counting them exceeds the count budget.
+        """
+        datasource = self._with_timeout(self.datasource, self.COUNT_TIMEOUT)
+        if query.search:
+            datasource = datasource.search(query.search)
+        try:
+            counts = await asyncio.wait_for(
+                filtering.get_facet_counts(
+                    datasource, query.filter_fields, query.filter_values
+                ),
+                self.COUNT_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            return []
+        return filtering.get_facet_controls(
+            url=query,
+            fields=query.filter_fields,
+            filters=query.filter_values,
+            counts=counts,
+        )
+
+    async def _load_page(self, query, stream=False):
+        """
+        Run the queries for a page of the table, other than the facets.
+
+        With `stream`, the rows are returned as the batches from the
+        datasource's `iterate()`, rather than read at once. Pages without a
+        count are still read at once, to find out if there is a next page.
+        """
+        datasource = self._with_timeout(self.datasource, self.REQUEST_TIMEOUT)
+        if hasattr(datasource, "snapshot"):
+            # Read the count and the rows from the same version of the table.
+            datasource = datasource.snapshot()
+
+        columns = {key: field.title for key, field in datasource.schema.fields.items()}
+        order_by = list(query.order)
+        search_term = query.search
+        filters = query.filter_values
 
         # Filter by any search term
         if search_term:
             datasource = datasource.search(search_term)
 
-        # Determine pagination info
-        count = await datasource.count()
-        total_pages = max(math.ceil(count / self.PAGE_SIZE), 1)
-        current_page = max(min(current_page, total_pages), 1)
+        # Filter by any column filters
+        if filters:
+            datasource = datasource.filter(**filters)
+
+        # Determine pagination info. If counting exceeds its budget, the page
+        # is still shown, with just next and previous links.
+        try:
+            count = await asyncio.wait_for(
+                self._with_timeout(datasource, self.COUNT_TIMEOUT).count(),
+                self.COUNT_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            count = None
+            current_page = query.page
+        else:
+            total_pages = max(math.ceil(count / self.PAGE_SIZE), 1)
+            current_page = min(query.page, total_pages)
         offset = (current_page - 1) * self.PAGE_SIZE
 
-        # Perform column ordering
-        if order_by is not None:
-            datasource = datasource.order_by(order_by=order_by)
-
-        #  Perform pagination
-        datasource = datasource.offset(offset).limit(self.PAGE_SIZE)
-        rows = await datasource.all()
-
-        # Get pagination and column controls to render on the page
+        # Perform column ordering, with a tiebreaker for deterministic pages
+        if order_by:
+            datasource = ordering.apply_ordering(
+                datasource, ordering.with_tiebreaker(order_by, self.LOOKUP_FIELD)
+            )
+
+        # Perform pagination. Without a count, fetch an extra row to find out
+        # whether there is a next page.
+        limit = self.PAGE_SIZE if count is not None else self.PAGE_SIZE + 1
+        if stream and count is not None:
+            rows = self._with_timeout(datasource, self.ROWS_TIMEOUT).iterate(
+                batch_size=self.STREAMING_BATCH_SIZE, offset=offset, limit=limit
+            )
+        else:
+            datasource = datasource.offset(offset).limit(limit)
+            rows = await asyncio.wait_for(
+                self._with_timeout(datasource, self.ROWS_TIMEOUT).all(),
+                self.ROWS_TIMEOUT,
+            )
+
+        # Get pagination and column controls to render on the page.
+        # Links are built from the parsed query, rather than the raw URL.
+        query = query.replace(page=current_page)
         column_controls = ordering.get_column_controls(
-            url=request.url,
+            url=query,
             columns=columns,
             order_by=order_by,
         )
-        page_controls = pagination.get_page_controls(
-            url=request.url, current_page=current_page, total_pages=total_pages
-        )
-
-        form = forms.create_form(schema=datasource.schema)
-        context = self._context(
-            form=form,
-            request=request,
-            rows=rows,
-            column_controls=column_controls,
-            page_controls=page_controls,
-            search_term=search_term,
-        )
+        if count is None:
+            has_next = len(rows) > self.PAGE_SIZE
+            page_controls = pagination.get_next_previous_controls(
+                url=query, current_page=current_page, has_next=has_next
+            )
+            rows = rows[: self.PAGE_SIZE]
+        else:
+            has_next = current_page < total_pages
+            page_controls = pagination.get_page_controls(
+                url=query, current_page=current_page, total_pages=total_pages
+            )
+        return {
+            "rows": rows,
+            "count": count,
+            "column_controls": column_controls,
+            "page_controls": page_controls,
+            "facets": [],
+            "query": query,
+            "next_query": query.replace(page=current_page + 1) if has_next else None,
+            "search_term": search_term,
+        }
 
-        return self.templates.TemplateResponse(template, context, status_code=200)
+    def _with_timeout(self, datasource, timeout):
+        # Let the backend cancel the query itself, where it supports that.
+        return datasource if timeout is None else datasource.timeout(timeout)
 
     async def create(self, request):
         template = "dashboard/table.html"
@@ -164,11 +681,18 @@ class DashboardTable:
         if not self.can_create:
             raise HTTPException(status_code=401)
 
-        form = forms.create_form(schema=self.datasource.schema)
+        form = get_forms().create_form(schema=self.datasource.schema)
         data = await request.form()
         form.validate(data)
         if form.is_valid:
-            await self.datasource.create(**form.validated_data)
+            generation = await self._rows_generation()
+            try:
+                item = await self.datasource.create(**form.validated_data)
+            except BudgetExceeded:
+                raise HTTPException(status_code=507)
+            if self.PREFETCH:
+                await call(self._prefetched, self._prefetched.clear)
+            await self._cache_rows([item], generation)
             return RedirectResponse(url=request.url, status_code=303)
 
         context = self._context(form=form, request=request)
@@ -179,11 +703,19 @@ class DashboardTable:
         template = "dashboard/detail.html"
 
         item = await self._get_item(request)
-
-        form = forms.create_form(schema=self.datasource.schema, values=item)
-        context = self._context(form=form, item=item, request=request)
-
-        return self.templates.TemplateResponse(template, context, status_code=200)
+        # Browsers revalidate the page each time, and get a 304 response if
+        # the row hasn't changed.
+        headers = {"ETag": self._get_etag(item), "Cache-Control": "no-cache"}
+        if self._etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        related = await self._load_related(request, [item])
+
+        form = get_forms().create_form(schema=self.datasource.schema, values=item)
+        context = self._context(form=form, item=item, request=request, related=related)
+
+        return self.templates.TemplateResponse(
+            template, context, status_code=200, headers=headers
+        )
 
     async def edit(self, request):
         template = "dashboard/detail.html"
@@ -191,15 +723,35 @@ class DashboardTable:
         if not self.can_edit:
             raise HTTPException(status_code=401)
 
-        item = await self._get_item(request)
-
-        form = forms.create_form(schema=self.datasource.schema, values=item)
+        form = get_forms().create_form(schema=self.datasource.schema)
         data = await request.form()
         form.validate(data)
         if form.is_valid:
-            await item.update(**form.validated_data)
-            return RedirectResponse(url=request.url, status_code=303)
+            # Write straight to the row, without reading it first.
+            values = form.validated_data
+            expected = None
+            if self.VERSION_FIELD is not None:
+                version = self._get_version(data)
+                expected = {self.VERSION_FIELD: version}
+                values = {**values, self.VERSION_FIELD: version + 1}
+            updated = await self.datasource.update_by_key(
+                request.path_params["ident"],
+                values,
+                lookup_field=self.LOOKUP_FIELD,
+                expected=expected,
+            )
+            await self._clear_caches()
+            if updated:
+                return RedirectResponse(url=request.url, status_code=303)
+            # Nothing was updated, because the row either doesn't exist, or
+            # was changed by someone else since the form was loaded.
+            item = await self._get_item(request)
+            context = self._context(
+                form=form, item=item, request=request, conflict=True
+            )
+            return self.templates.TemplateResponse(template, context, status_code=409)
 
+        item = await self._get_item(request)
         context = self._context(form=form, item=item, request=request)
         return self.templates.TemplateResponse(template, context, status_code=400)
 
@@ -207,13 +759,66 @@ class DashboardTable:
         if not self.can_delete:
             raise HTTPException(status_code=401)
 
-        item = await self._get_item(request)
-
-        await item.delete()
+        deleted = await self.datasource.delete_by_key(
+            request.path_params["ident"], lookup_field=self.LOOKUP_FIELD
+        )
+        await self._clear_caches()
+        if not deleted:
+            raise HTTPException(status_code=404)
 
         url = request.url_for("dashboard:table", tablename=self.tablename)
         return RedirectResponse(url=url, status_code=303)
 
+    async def _clear_caches(self):
+        if self.PREFETCH:
+            await call(self._prefetched, self._prefetched.clear)
+        if self.ROW_CACHE:
+            await call(self._rows, self._rows.clear)
+
+    async def _rows_generation(self):
+        if not self.ROW_CACHE:
+            return None
+        return await call(self._rows, get_generation, self._rows)
+
+    async def _cache_rows(self, rows, generation):
+        """
+        Add rows to the row cache, unless the cache was cleared by a write
+        since `generation`, as the rows may then be out of date.
+        """
+        if not self.ROW_CACHE:
+            return
+        cache = self._rows
+        items = [(str(getattr(row, self.LOOKUP_FIELD)), row) for row in rows]
+        if cache.is_shared:
+            items = [(key, self.datasource.dump(row)) for key, row in items]
+
+        def set_rows():
+            for key, row in items:
+                cache.set(key, row, generation=generation)
+
+        # The rows are written together, in a single call to the backend.
+        await call(cache, set_rows)
+
+    def _get_etag(self, item):
+        values = [getattr(item, key) for key in self.datasource.schema.fields]
+        digest = hashlib.blake2b(repr(values).encode(), digest_size=16)
+        # The page also shows related rows, so it's only a weak validator.
+        return f'W/"{digest.hexdigest()}"'
+
+    def _etag_matches(self, request, etag):
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or etag[2:] in tags
+
+    def _get_version(self, data):
+        field = self.datasource.schema.fields[self.VERSION_FIELD]
+        try:
+            return field.validate(data.get(self.VERSION_FIELD))
+        except typesystem.ValidationError:
+            raise HTTPException(status_code=400)
+
     def _context(self, form, request, **kwargs):
         base_context = {
             "form": form,
@@ -222,6 +827,8 @@ class DashboardTable:
             "title": self.title,
             "tablename": self.tablename,
             "lookup_field": self.LOOKUP_FIELD,
+            "version_field": self.VERSION_FIELD,
+            "prefetch": self.PREFETCH,
             "can_create": self.can_create,
             "can_edit": self.can_edit,
             "can_delete": self.can_delete,
@@ -230,10 +837,16 @@ class DashboardTable:
 
     async def _get_item(self, request):
         ident = request.path_params["ident"]
-        lookup = {self.LOOKUP_FIELD: ident}
+        if self.ROW_CACHE:
+            item = await self._cache_get(self._rows, ident)
+            if item is not MISSING:
+                return item
 
+        generation = await self._rows_generation()
+        lookup = {self.LOOKUP_FIELD: ident}
         item = await self.datasource.filter(**lookup).get()
         if item is None:
             raise HTTPException(status_code=404)
 
+        await self._cache_rows([item], generation)
         return item
@@ -0,0 +1,569 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from .datasource import DataItem, DataSource
+from .filtering import count_facets
+from .ordering import apply_ordering
+from .stats import ColumnSummary
+
+MISSING = object()
+
+T = typing.TypeVar("T")
+
+
+class MemoryCache:
+    """
+    An in-process cache with LRU eviction, and entries that expire
+    after `ttl` seconds.
+
+    The `generation` counter increments on every `clear()`. Values computed
+    before an invalidation are passed to `set()` with their older generation,
+    and are discarded rather than stored.
+    """
+
+    # Shared caches hold copies of values, so only store plain data.
+    is_shared = False
+    # Caches that block on I/O are called from a thread, by `call()`.
+    is_blocking = False
+
+    def __init__(self, max_size: int = 1000, ttl: float = 60.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: typing.Hashable, default: typing.Any = MISSING) -> typing.Any:
+        try:
+            expires, value = self._entries[key]
+        except KeyError:
+            return default
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(
+        self, key: typing.Hashable, value: typing.Any, generation: int = None
+    ) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+
+    def derive(self, name: str, max_size: int, ttl: float) -> "MemoryCache":
+        """
+        Return a separate cache, held in the same kind of backend.
+        """
+        return MemoryCache(max_size=max_size, ttl=ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    A cache stored in a local SQLite file, and so shared by every worker
+    process on a host, with entries that expire after `ttl` seconds.
+
+    The generation counter is stored in the file, so a `clear()` in any worker
+    invalidates the entries for all of them. Tables sharing a file should
+    each use their own `namespace`. Values are stored with pickle, so only
+    use files that other users can't write to.
+
+    For example:
+
+    cache = SQLiteCache("/tmp/dashboard-cache.db", namespace="users")
+    users = CachedDataSource(MockDataSource(schema=user), cache=cache)
+    """
+
+    is_shared = True
+    is_blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "",
+        max_size: int = 10000,
+        ttl: float = 60.0,
+    ) -> None:
+        self.path = path
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # Connections can't be shared between threads, or across a fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS generations (
+                    namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT, key TEXT, generation INTEGER,
+                    expires REAL, value BLOB, PRIMARY KEY (namespace, key)
+                );
+                CREATE INDEX IF NOT EXISTS entries_namespace_expires
+                ON entries (namespace, expires);
+                """)
+            connection.execute(
+                "INSERT OR IGNORE INTO generations VALUES (?, 0)", (self.namespace,)
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @property
+    def generation(self) -> int:
+        (generation,) = self._connection.execute(
+            "SELECT generation FROM generations WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        return generation
+
+    def get(self, key: typing.Hashable, default: typing.Any = MISSING) -> typing.Any:
+        # Only entries written in the current generation are valid.
+        row = self._connection.execute(
+            """
+            SELECT value FROM entries JOIN generations USING (namespace)
+            WHERE namespace = ? AND key = ? AND expires > ?
+            AND entries.generation = generations.generation
+            """,
+            (self.namespace, repr(key), time.time()),
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def set(
+        self, key: typing.Hashable, value: typing.Any, generation: int = None
+    ) -> None:
+        connection = self._connection
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        # The generation is checked by the insert itself, so that a `clear()`
+        # in another worker can't come between the check and the write.
+        connection.execute(
+            """
+            INSERT OR REPLACE INTO entries
+            SELECT ?, ?, generation, ?, ? FROM generations
+            WHERE namespace = ? AND (? IS NULL OR generation = ?)
+            """,
+            (
+                self.namespace,
+                repr(key),
+                time.time() + self.ttl,
+                data,
+                self.namespace,
+                generation,
+                generation,
+            ),
+        )
+        # Evict the entries closest to expiring, once over the size limit.
+        (count,) = connection.execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()
+        if count > self.max_size:
+            connection.execute(
+                """
+                DELETE FROM entries WHERE rowid IN (
+                    SELECT rowid FROM entries WHERE namespace = ?
+                    ORDER BY expires LIMIT ?
+                )
+                """,
+                (self.namespace, count - self.max_size),
+            )
+
+    def clear(self) -> None:
+        with self._connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "UPDATE generations SET generation = generation + 1 "
+                "WHERE namespace = ?",
+                (self.namespace,),
+            )
+            connection.execute(
+                "DELETE FROM entries WHERE namespace = ?", (self.namespace,)
+            )
+
+    def derive(self, name: str, max_size: int, ttl: float) -> "SQLiteCache":
+        """
+        Return a separate cache in the same file, under its own namespace, so
+        that it is shared by the same workers.
+        """
+        namespace = f"{self.namespace}/{name}"
+        return SQLiteCache(self.path, namespace=namespace, max_size=max_size, ttl=ttl)
+
+    def __len__(self) -> int:
+        (count,) = self._connection.execute(
+            """
+            SELECT COUNT(*) FROM entries JOIN generations USING (namespace)
+            WHERE namespace = ? AND expires > ?
+            AND entries.generation = generations.generation
+            """,
+            (self.namespace, time.time()),
+        ).fetchone()
+        return count
+
+
+async def call(
+    cache: typing.Any, func: typing.Callable[..., T], *args: typing.Any
+) -> T:
+    """
+    Call `func`, a method of the cache backend `cache`. Backends that block
+    on I/O are called in a thread, so that they don't block the event loop.
+    """
+    if not cache.is_blocking:
+        return func(*args)
+    # Imported here, as the thread pool is only needed for blocking caches.
+    from starlette.concurrency import run_in_threadpool
+
+    return await run_in_threadpool(func, *args)
+
+
+def get_generation(cache: typing.Any) -> int:
+    return cache.generation
+
+
+def freeze(value: typing.Any) -> typing.Hashable:
+    """
+    Return a hashable version of a filter value, for use in cache keys.
+    """
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+
+class CachedDataSource(DataSource):
+    """
+    A read-through caching wrapper for any datasource.
+
+    Results of `all()`, `count()` and `get()` are cached, keyed on the
+    normalized shape of the query. Concurrent identical queries share a single
+    request to the underlying datasource. Any write made through the wrapper
+    invalidates the cache.
+
+    Results are held in a `MemoryCache` for this process, unless another
+    `cache` backend is given. With a shared backend such as `SQLiteCache`,
+    rows are stored as their field values, and updates and deletes look the
+    row up again by `lookup_field`.
+
+    For example:
+
+    users = CachedDataSource(MockDataSource(schema=user), ttl=30.0)
+    """
+
+    def __init__(
+        self,
+        datasource: typing.Any,
+        max_size: int = 1000,
+        ttl: float = 60.0,
+        cache: typing.Any = None,
+        lookup_field: str = "pk",
+        _inflight: dict = None,
+        _query: dict = None,
+    ) -> None:
+        self.datasource = datasource
+        self.schema = datasource.schema
+        self.lookup_field = lookup_field
+        self._cache = (
+            MemoryCache(max_size=max_size, ttl=ttl) if cache is None else cache
+        )
+        self._inflight = {} if _inflight is None else _inflight
+        self._query = {} if _query is None else _query
+
+    def _copy(self, datasource: typing.Any, **query: typing.Any) -> "CachedDataSource":
+        return self.__class__(
+            datasource=datasource,
+            cache=self._cache,
+            lookup_field=self.lookup_field,
+            _inflight=self._inflight,
+            _query={**self._query, **query},
+        )
+
+    def search(self, search_term: str) -> "CachedDataSource":
+        return self._copy(self.datasource.search(search_term), search=search_term)
+
+    def filter(self, **kwargs: typing.Any) -> "CachedDataSource":
+        existing = dict(self._query.get("filter", ()))
+        existing.update({key: freeze(value) for key, value in kwargs.items()})
+        return self._copy(
+            self.datasource.filter(**kwargs), filter=tuple(sorted(existing.items()))
+        )
+
+    def order_by(self, *order_by: str) -> "CachedDataSource":
+        datasource = apply_ordering(self.datasource, order_by)
+        return self._copy(datasource, order_by=order_by)
+
+    def offset(self, offset: int) -> "CachedDataSource":
+        return self._copy(self.datasource.offset(offset), offset=offset)
+
+    def limit(self, limit: int) -> "CachedDataSource":
+        return self._copy(self.datasource.limit(limit), limit=limit)
+
+    def timeout(self, seconds: float) -> "CachedDataSource":
+        # Timeouts don't change the results, so aren't part of the cache key.
+        return self._copy(self.datasource.timeout(seconds))
+
+    @property
+    def cache(self) -> typing.Any:
+        """
+        The cache backend, so that related values can be cached alongside.
+        """
+        return self._cache
+
+    def cache_key(self, operation: typing.Hashable) -> typing.Hashable:
+        return (operation,) + tuple(sorted(self._query.items()))
+
+    async def _fetch(
+        self, operation: typing.Hashable, func: typing.Callable[[], typing.Awaitable]
+    ) -> typing.Any:
+        key = self.cache_key(operation)
+        value = await call(self._cache, self._cache.get, key)
+        if value is not MISSING:
+            return self.load(value)
+
+        # Identical requests that arrive while a fetch is in progress share
+        # its result, rather than each hitting the underlying datasource.
+        generation = await call(self._cache, get_generation, self._cache)
+        inflight_key = (generation, key)
+        future = self._inflight.get(inflight_key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The request we were waiting on was cancelled. Try again.
+                return await self._fetch(operation, func)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            value = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved, in case nobody else was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # Results that may predate a write made during the fetch are
+            # discarded by the cache, as their generation is out of date.
+            await call(self._cache, self._cache.set, key, self.dump(value), generation)
+            return value
+        finally:
+            del self._inflight[inflight_key]
+
+    async def all(self) -> typing.List["CachedDataItem"]:
+        async def func() -> typing.Tuple["CachedDataItem", ...]:
+            items = await self.datasource.all()
+            return tuple(self._wrap(item) for item in items)
+
+        # Each caller gets its own list, so that it can't modify the cache.
+        return list(await self._fetch("all", func))
+
+    async def count(self) -> int:
+        return await self._fetch("count", self.datasource.count)
+
+    async def get(self, **filter: typing.Any) -> typing.Optional["CachedDataItem"]:
+        if filter:
+            return await self.filter(**filter).get()
+
+        async def func() -> typing.Optional["CachedDataItem"]:
+            item = await self.datasource.get()
+            return None if item is None else self._wrap(item)
+
+        return await self._fetch("get", func)
+
+    async def facets(
+        self, *fields: str
+    ) -> typing.Dict[str, typing.Dict[typing.Any, int]]:
+        async def func() -> typing.Dict[str, typing.Dict[typing.Any, int]]:
+            facet_fields = {key: self.schema.fields[key] for key in fields}
+            return await count_facets(self.datasource, facet_fields)
+
+        return await self._fetch(("facets",) + fields, func)
+
+    async def suggest(
+        self, search_term: str, limit: int = 10
+    ) -> typing.List["CachedDataItem"]:
+        async def func() -> typing.Tuple["CachedDataItem", ...]:
+            items = await self.datasource.suggest(search_term, limit=limit)
+            return tuple(self._wrap(item) for item in items)
+
+        return list(await self._fetch(("suggest", search_term, limit), func))
+
+    async def stats(self) -> typing.Dict[str, ColumnSummary]:
+        return await self._fetch("stats", self.datasource.stats)
+
+    async def iterate(
+        self, batch_size: int = 1000, offset: int = 0, limit: int = None
+    ) -> typing.AsyncIterator[typing.List["CachedDataItem"]]:
+        # Batches are read straight from the underlying datasource. Caching
+        # them would only evict the results of more frequent queries.
+        batches = self.datasource.iterate(
+            batch_size=batch_size, offset=offset, limit=limit
+        )
+        async for batch in batches:
+            yield [self._wrap(item) for item in batch]
+
+    async def create(self, **kwargs: typing.Any) -> "CachedDataItem":
+        try:
+            item = await self.datasource.create(**kwargs)
+        finally:
+            await call(self._cache, self.invalidate)
+        return self._wrap(item)
+
+    async def update_by_key(
+        self,
+        key: typing.Any,
+        values: typing.Dict[str, typing.Any],
+        lookup_field: str = "pk",
+        expected: typing.Dict[str, typing.Any] = None,
+    ) -> int:
+        try:
+            return await self.datasource.update_by_key(
+                key, values, lookup_field=lookup_field, expected=expected
+            )
+        finally:
+            await call(self._cache, self.invalidate)
+
+    async def delete_by_key(
+        self,
+        key: typing.Any,
+        lookup_field: str = "pk",
+        expected: typing.Dict[str, typing.Any] = None,
+    ) -> int:
+        try:
+            return await self.datasource.delete_by_key(
+                key, lookup_field=lookup_field, expected=expected
+            )
+        finally:
+            await call(self._cache, self.invalidate)
+
+    def invalidate(self) -> None:
+        """
+        Discard all cached results for this datasource.
+        """
+        self._cache.clear()
+
+    def _wrap(self, item: typing.Any) -> "CachedDataItem":
+        return CachedDataItem(item=item, datasource=self)
+
+    def dump(self, value: typing.Any) -> typing.Any:
+        """
+        Return a result in the form it is stored in the cache backend.
+        Shared backends hold copies, so rows are stored as their field values.
+        """
+        if not self._cache.is_shared:
+            return value
+        if isinstance(value, (tuple, list)):
+            return type(value)(self.dump(item) for item in value)
+        if isinstance(value, dict):
+            return {key: self.dump(item) for key, item in value.items()}
+        if isinstance(value, CachedDataItem):
+            fields = dict.fromkeys([self.lookup_field, *self.schema.fields])
+            return StoredValues({key: getattr(value, key) for key in fields})
+        return value
+
+    def load(self, value: typing.Any) -> typing.Any:
+        """
+        Return a result from the form it is stored in the cache backend.
+        """
+        if not self._cache.is_shared:
+            return value
+        if isinstance(value, (tuple, list)):
+            return type(value)(self.load(item) for item in value)
+        if isinstance(value, StoredValues):
+            return self._wrap(StoredItem(dict(value), self))
+        if isinstance(value, dict):
+            return {key: self.load(item) for key, item in value.items()}
+        return value
+
+
+class CachedDataItem(DataItem):
+    """
+    Wraps a data item returned by a `CachedDataSource`, so that any updates
+    or deletes invalidate the cached results.
+    """
+
+    def __init__(self, item: typing.Any, datasource: CachedDataSource) -> None:
+        self._item = item
+        self._datasource = datasource
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self._item, name)
+
+    async def delete(self) -> None:
+        try:
+            await self._item.delete()
+        finally:
+            await call(self._datasource._cache, self._datasource.invalidate)
+
+    async def update(self, **kwargs: typing.Any) -> None:
+        try:
+            await self._item.update(**kwargs)
+        finally:
+            await call(self._datasource._cache, self._datasource.invalidate)
+
+
+class StoredValues(dict):
+    """
+    The field values of a row, as held in a shared cache backend.
+    """
+
+
+class StoredItem(DataItem):
+    """
+    A row read back from a shared cache backend. Field values are available
+    as attributes, and writes are made to the row in the underlying
+    datasource, looked up by the cached datasource's `lookup_field`.
+    """
+
+    def __init__(self, values: dict, datasource: CachedDataSource) -> None:
+        self._values = values
+        self._datasource = datasource
+
+    def __getattr__(self, name: str) -> typing.Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    async def _get_item(self) -> typing.Any:
+        lookup = self._datasource.lookup_field
+        filter = {lookup: self._values[lookup]}
+        item = await self._datasource.datasource.filter(**filter).get()
+        if item is None:
+            raise ValueError("Row does not exist.")
+        return item
+
+    async def delete(self) -> None:
+        item = await self._get_item()
+        await item.delete()
+
+    async def update(self, **kwargs: typing.Any) -> None:
+        item = await self._get_item()
+        await item.update(**kwargs)
+        self._values.update(kwargs)
@@ -0,0 +1,464 @@
+import datetime
+import typing
+from collections import Counter
+
+import typesystem
+
+from .datasource import DataItem, DataSource, validate_filters
+from .scanning import IN_LOOKUP
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class Column:
+    """
+    A column of values, stored in a growable, typed NumPy array.
+    """
+
+    # Typed arrays have no representation for `None`.
+    nullable = False
+
+    def __init__(self, dtype: typing.Any, capacity: int = 16) -> None:
+        self.data = numpy.empty(max(capacity, 1), dtype=dtype)
+        self.size = 0
+
+    @property
+    def values(self) -> "numpy.ndarray":
+        return self.data[: self.size]
+
+    def encode(self, value: typing.Any) -> typing.Any:
+        return value
+
+    def decode(self, value: typing.Any) -> typing.Any:
+        return value.item() if isinstance(value, numpy.generic) else value
+
+    def append(self, value: typing.Any) -> None:
+        if self.size == len(self.data):
+            # Grow geometrically, so that appends are amortized O(1).
+            data = numpy.empty(len(self.data) * 2, dtype=self.data.dtype)
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+        self.data[self.size] = self.encode(value)
+        self.size += 1
+
+    def extend(self, values: typing.List[typing.Any]) -> None:
+        required = self.size + len(values)
+        if required > len(self.data):
+            data = numpy.empty(max(required, len(self.data) * 2), dtype=self.data.dtype)
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+        encoded = [self.encode(value) for value in values]
+        if self.data.dtype.kind == "O":
+            for index, value in enumerate(encoded, start=self.size):
+                self.data[index] = value
+        else:
+            self.data[self.size : required] = numpy.array(
+                encoded, dtype=self.data.dtype
+            )
+        self.size = required
+
+    def get(self, index: int) -> typing.Any:
+        return self.decode(self.data[index])
+
+    def set(self, index: int, value: typing.Any) -> None:
+        self.data[index] = self.encode(value)
+
+    def equals(self, value: typing.Any) -> "numpy.ndarray":
+        return self.values == self.encode(value)
+
+    def sort_values(self, reverse: bool) -> "numpy.ndarray":
+        """
+        Return numeric values that sort in the same order as the column.
+        """
+        values = self.values
+        if values.dtype.kind in "mM":
+            values = values.view("int64")
+        elif values.dtype.kind == "b":
+            values = values.astype("int64")
+        return -values if reverse else values
+
+    def search(self, search_term: str) -> "numpy.ndarray":
+        # Match against each distinct value once, rather than once per row.
+        uniques, inverse = numpy.unique(self.values, return_inverse=True)
+        matches = numpy.array(
+            [search_term in str(value).lower() for value in uniques.tolist()],
+            dtype=bool,
+        )
+        return matches[inverse.reshape(-1)]
+
+    def counts(self, indexes: "numpy.ndarray") -> typing.Dict[typing.Any, int]:
+        uniques, counts = numpy.unique(self.values[indexes], return_counts=True)
+        return dict(zip(uniques.tolist(), counts.tolist()))
+
+
+class ObjectColumn(Column):
+    """
+    A column of arbitrary Python values, which may include `None`.
+    """
+
+    nullable = True
+
+    def __init__(self, capacity: int = 16) -> None:
+        super().__init__(dtype=object, capacity=capacity)
+
+    def sort_values(self, reverse: bool) -> "numpy.ndarray":
+        # Dense ranks, so that equal values compare equal. `None` sorts first.
+        values = self.values.tolist()
+        order = sorted(
+            range(len(values)),
+            key=lambda index: (values[index] is not None, values[index]),
+        )
+        ranks = numpy.empty(len(values), dtype="int64")
+        rank = 0
+        for position, index in enumerate(order):
+            if position and values[index] != values[order[position - 1]]:
+                rank += 1
+            ranks[index] = rank
+        return -ranks if reverse else ranks
+
+    def search(self, search_term: str) -> "numpy.ndarray":
+        return numpy.array(
+            [search_term in str(value).lower() for value in self.values.tolist()],
+            dtype=bool,
+        )
+
+    def counts(self, indexes: "numpy.ndarray") -> typing.Dict[typing.Any, int]:
+        return dict(Counter(self.values[indexes].tolist()))
+
+
+class DateTimeColumn(Column):
+    """
+    A column of datetimes. Timezone-aware values are stored in UTC, and
+    returned as UTC datetimes. A column can't mix aware and naive values.
+    """
+
+    def __init__(self, capacity: int = 16) -> None:
+        super().__init__(dtype="datetime64[us]", capacity=capacity)
+        self.is_aware: typing.Optional[bool] = None
+
+    def encode(self, value: datetime.datetime) -> typing.Any:
+        is_aware = value.utcoffset() is not None
+        if self.is_aware is None:
+            self.is_aware = is_aware
+        elif is_aware != self.is_aware:
+            raise ValueError("Can't mix timezone-aware and naive datetimes.")
+        if is_aware:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return numpy.datetime64(value, "us")
+
+    def decode(self, value: typing.Any) -> typing.Any:
+        value = value.item()
+        if self.is_aware:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value
+
+    def equals(self, value: typing.Any) -> "numpy.ndarray":
+        if self.is_aware is not None and self.is_aware != (
+            value.utcoffset() is not None
+        ):
+            return numpy.zeros(self.size, dtype=bool)
+        return super().equals(value)
+
+
+class EncodedColumn(Column):
+    """
+    A column of strings, dictionary encoded as integer codes into a list of
+    distinct values. A code of -1 represents `None`.
+    """
+
+    nullable = True
+
+    def __init__(self, capacity: int = 16) -> None:
+        super().__init__(dtype="int32", capacity=capacity)
+        self.categories: typing.List[str] = []
+        self.lookup: typing.Dict[str, int] = {}
+
+    def encode(self, value: typing.Any) -> int:
+        if value is None:
+            return -1
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(value)
+            self.lookup[value] = code
+        return code
+
+    def decode(self, value: typing.Any) -> typing.Any:
+        return None if value < 0 else self.categories[value]
+
+    def equals(self, value: typing.Any) -> "numpy.ndarray":
+        code = -1 if value is None else self.lookup.get(value)
+        if code is None:
+            return numpy.zeros(self.size, dtype=bool)
+        return self.values == code
+
+    def sort_values(self, reverse: bool) -> "numpy.ndarray":
+        # Rank the distinct values, with `None` sorting first.
+        ranks = numpy.empty(len(self.categories) + 1, dtype="int64")
+        ranks[numpy.argsort(numpy.array(self.categories, dtype=object))] = numpy.arange(
+            1, len(self.categories) + 1
+        )
+        ranks[-1] = 0
+        values = ranks[self.values]
+        return -values if reverse else values
+
+    def search(self, search_term: str) -> "numpy.ndarray":
+        # Match against each distinct value once. The final entry is for `None`.
+        matches = [search_term in value.lower() for value in self.categories]
+        matches.append(search_term in "none")
+        return numpy.array(matches, dtype=bool)[self.values]
+
+    def counts(self, indexes: "numpy.ndarray") -> typing.Dict[typing.Any, int]:
+        counts = numpy.bincount(
+            self.values[indexes] + 1, minlength=len(self.categories) + 1
+        )
+        values = [None] + self.categories
+        return {
+            values[code]: count for code, count in enumerate(counts.tolist()) if count
+        }
+
+
+# String fields that validate to other types, such as `datetime.date`.
+NON_STRING_FIELDS = (
+    typesystem.Date,
+    typesystem.Time,
+    typesystem.DateTime,
+    typesystem.UUID,
+    typesystem.IPAddress,
+)
+
+
+def create_column(field: typesystem.Field, capacity: int) -> Column:
+    if isinstance(field, typesystem.Choice):
+        return EncodedColumn(capacity=capacity)
+    if isinstance(field, typesystem.String):
+        if not isinstance(field, NON_STRING_FIELDS):
+            return EncodedColumn(capacity=capacity)
+    if field.allow_null:
+        return ObjectColumn(capacity=capacity)
+    if isinstance(field, typesystem.Boolean):
+        return Column(dtype=bool, capacity=capacity)
+    if isinstance(field, typesystem.Integer):
+        return Column(dtype="int64", capacity=capacity)
+    if isinstance(field, typesystem.Float):
+        return Column(dtype="float64", capacity=capacity)
+    if isinstance(field, typesystem.DateTime):
+        return DateTimeColumn(capacity=capacity)
+    return ObjectColumn(capacity=capacity)
+
+
+class Table:
+    """
+    The columns of a `ColumnarDataSource`, shared between its copies.
+    Deleted rows are marked in the `deleted` column, so that row positions
+    remain stable.
+    """
+
+    def __init__(self, schema: typesystem.Schema, rows: typing.List[dict]) -> None:
+        capacity = len(rows)
+        self.columns = {
+            key: create_column(field, capacity=capacity)
+            for key, field in schema.fields.items()
+        }
+        self.deleted = Column(dtype=bool, capacity=capacity)
+        for row in rows:
+            self.check(row)
+        for key, column in self.columns.items():
+            column.extend([row.get(key) for row in rows])
+        self.deleted.extend([False] * len(rows))
+
+    @property
+    def size(self) -> int:
+        return self.deleted.size
+
+    def check(self, row: dict) -> None:
+        """
+        Raise a `ValueError` if the row is missing a value that its column
+        can't store as `None`.
+        """
+        for key, column in self.columns.items():
+            if not column.nullable and row.get(key) is None:
+                raise ValueError(f"Missing a value for non-nullable field {key!r}.")
+
+    def append(self, row: dict) -> int:
+        self.check(row)
+        for key, column in self.columns.items():
+            column.append(row.get(key))
+        self.deleted.append(False)
+        return self.size - 1
+
+    def row(self, index: int) -> dict:
+        return {key: column.get(index) for key, column in self.columns.items()}
+
+
+class ColumnarDataSource(DataSource):
+    """
+    An in-memory datasource that stores each field as a typed NumPy array,
+    with strings dictionary encoded. Filtering, searching and ordering are
+    vectorized, and data items are only built for the rows returned.
+
+    Requires `numpy` to be installed.
+
+    For example:
+
+    events = ColumnarDataSource(schema=event, initial=rows)
+    """
+
+    def __init__(
+        self,
+        schema: typesystem.Schema,
+        initial: typing.List[dict] = None,
+        _table: Table = None,
+        _search_term: str = None,
+        _filter_kwargs: dict = None,
+        _order_by: typing.Tuple[str, ...] = None,
+        _offset: int = None,
+        _limit: int = None,
+    ) -> None:
+        assert numpy is not None, "'numpy' must be installed to use ColumnarDataSource"
+        self.schema = schema
+        self._search_term = _search_term
+        self._filter_kwargs = _filter_kwargs
+        self._order_by = _order_by
+        self._offset = _offset
+        self._limit = _limit
+
+        if _table is None:
+            rows = [self._with_defaults(dict(row)) for row in initial or []]
+            # Rows are listed newest first, so store them oldest first.
+            _table = Table(schema, rows[::-1])
+        self._table = _table
+
+    def _copy(self, **kwargs: typing.Any) -> "ColumnarDataSource":
+        base_kwargs = {
+            "schema": self.schema,
+            "_table": self._table,
+            "_search_term": self._search_term,
+            "_filter_kwargs": self._filter_kwargs,
+            "_order_by": self._order_by,
+            "_offset": self._offset,
+            "_limit": self._limit,
+        }
+        base_kwargs.update(kwargs)
+        return self.__class__(**base_kwargs)
+
+    def _with_defaults(self, row: dict) -> dict:
+        for key, field in self.schema.fields.items():
+            if key not in row and field.has_default():
+                row[key] = field.get_default_value()
+        return row
+
+    def search(self, search_term: str) -> "ColumnarDataSource":
+        return self._copy(_search_term=search_term)
+
+    def filter(self, **kwargs: typing.Any) -> "ColumnarDataSource":
+        kwargs = validate_filters(self.schema, kwargs)
+        if self._filter_kwargs is not None:
+            kwargs = {**self._filter_kwargs, **kwargs}
+        return self._copy(_filter_kwargs=kwargs)
+
+    def order_by(self, *order_by: str) -> "ColumnarDataSource":
+        return self._copy(_order_by=order_by or None)
+
+    def offset(self, offset: int) -> "ColumnarDataSource":
+        return self._copy(_offset=offset)
+
+    def limit(self, limit: int) -> "ColumnarDataSource":
+        return self._copy(_limit=limit)
+
+    def _mask(self) -> "numpy.ndarray":
+        table = self._table
+        mask = ~table.deleted.values
+        for key, value in (self._filter_kwargs or {}).items():
+            if key.endswith(IN_LOOKUP):
+                column = table.columns[key[: -len(IN_LOOKUP)]]
+                matches = numpy.zeros(table.size, dtype=bool)
+                for item in value:
+                    matches |= column.equals(item)
+                mask &= matches
+            else:
+                mask &= table.columns[key].equals(value)
+        if self._search_term:
+            search_term = self._search_term.lower()
+            matches = numpy.zeros(table.size, dtype=bool)
+            for column in table.columns.values():
+                matches |= column.search(search_term)
+            mask &= matches
+        return mask
+
+    def _select(self) -> "numpy.ndarray":
+        """
+        Return the positions of the selected rows, in order.
+        """
+        indexes = numpy.flatnonzero(self._mask())
+        start = self._offset or 0
+        stop = None if self._limit is None else start + self._limit
+
+        if self._order_by is None:
+            # Default to newest rows first.
+            return indexes[::-1][start:stop]
+
+        keys = [
+            self._table.columns[column.lstrip("-")].sort_values(
+                reverse=column.startswith("-")
+            )[indexes]
+            for column in self._order_by
+        ]
+        if stop is not None and stop < len(indexes):
+            # Only fully sort the rows that can appear on the requested page.
+            # These are the rows up to the `stop`-th value of the first key,
+            # including any ties with it.
+            primary = keys[0]
+            boundary = numpy.partition(primary, stop - 1)[stop - 1]
+            candidates = primary <= boundary
+            indexes = indexes[candidates]
+            keys = [key[candidates] for key in keys]
+
+        # `lexsort` sorts by the last key first. Ties fall back to newest first.
+        order = numpy.lexsort([-indexes] + keys[::-1])
+        return indexes[order][start:stop]
+
+    async def all(self) -> typing.List["ColumnarDataItem"]:
+        return [
+            ColumnarDataItem(datasource=self, index=index)
+            for index in self._select().tolist()
+        ]
+
+    async def get(self) -> typing.Optional["ColumnarDataItem"]:
+        items = await self.limit(1).all() if self._limit is None else await self.all()
+        return items[0] if items else None
+
+    async def count(self) -> int:
+        return len(self._select())
+
+    async def facets(
+        self, *fields: str
+    ) -> typing.Dict[str, typing.Dict[typing.Any, int]]:
+        indexes = numpy.flatnonzero(self._mask())
+        return {field: self._table.columns[field].counts(indexes) for field in fields}
+
+    async def create(self, **kwargs: typing.Any) -> "ColumnarDataItem":
+        index = self._table.append(self._with_defaults(kwargs))
+        return ColumnarDataItem(datasource=self, index=index)
+
+
+class ColumnarDataItem(DataItem):
+    def __init__(self, datasource: ColumnarDataSource, index: int) -> None:
+        self._datasource = datasource
+        self._index = index
+        for key, value in datasource._table.row(index).items():
+            setattr(self, key, value)
+
+    async def delete(self) -> None:
+        self._datasource._table.deleted.set(self._index, True)
+
+    async def update(self, **kwargs: typing.Any) -> None:
+        table = self._datasource._table
+        table.check({**table.row(self._index), **kwargs})
+        columns = table.columns
+        for key, value in kwargs.items():
+            columns[key].set(self._index, value)
+            setattr(self, key, value)
@@ -1,8 +1,20 @@
+import concurrent.futures
+import itertools
+import logging
+import sys
+import threading
 import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+from operator import itemgetter
 
 import typesystem
 
-from . import search
+from . import scanning
+from .persistence import SnapshotStore
+from .stats import ColumnSummary, TableStats
+
+logger = logging.getLogger("dashboard")
 
 user = typesystem.Schema(
     fields={
@@ -37,6 +49,23 @@ def autoincrement():
     return func
 
 
+def validate_filters(
+    schema: typesystem.Schema, filters: typing.Dict[str, typing.Any]
+) -> typing.Dict[str, typing.Any]:
+    """
+    Validate filter values against the schema. Filters on a key ending in
+    `__in` take a collection of values, and match rows with any of them.
+    """
+    validated = {}
+    for key, value in filters.items():
+        if key.endswith(scanning.IN_LOOKUP):
+            field = schema.fields[key[: -len(scanning.IN_LOOKUP)]]
+            validated[key] = tuple(field.validate(item) for item in value)
+        else:
+            validated[key] = schema.fields[key].validate(value)
+    return validated
+
+
 class DataSource:
     def search(self, search_term: str) -> "DataSource":
         raise NotImplementedError()  # pragma: no cover
@@ -44,7 +73,15 @@ class DataSource:
     def filter(self, **filter: typing.Any) -> "DataSource":
         raise NotImplementedError()  # pragma: no cover
 
-    def order_by(self, order_by: str) -> "DataSource":
+    def order_by(self, *order_by: str) -> "DataSource":
+        """
+        Return a datasource ordered by each of the given columns in turn,
+        where a leading "-" sorts a column in reverse, eg.
+        `order_by("status", "-created")`.
+
+        Datasources that only take a single column, as `order_by(order_by: str)`,
+        are still supported, and are ordered by the first column of a table.
+        """
         raise NotImplementedError()  # pragma: no cover
 
     def offset(self, offset: int) -> "DataSource":
@@ -53,6 +90,17 @@ class DataSource:
     def limit(self, limit: int) -> "DataSource":
         raise NotImplementedError()  # pragma: no cover
 
+    def timeout(self, seconds: float) -> "DataSource":
+        """
+        Return a datasource whose queries are cancelled by the backend after
+        `seconds`, raising `asyncio.TimeoutError`.
+
+        Callers always enforce their own deadlines as well, so by default this
+        does nothing. Database backends can override it to set a statement
+        timeout, so that abandoned queries stop using the database.
+        """
+        return self
+
     async def count(self) -> int:
         raise NotImplementedError()  # pragma: no cover
 
@@ -65,6 +113,108 @@ class DataSource:
     async def create(self, **kwargs) -> "DataItem":
         raise NotImplementedError()  # pragma: no cover
 
+    async def update_by_key(
+        self,
+        key: typing.Any,
+        values: typing.Dict[str, typing.Any],
+        lookup_field: str = "pk",
+        expected: typing.Dict[str, typing.Any] = None,
+    ) -> int:
+        """
+        Update the row whose `lookup_field` is `key`, returning the number of
+        rows updated. If `expected` is given, the row is only updated if its
+        current values match, so that concurrent edits can be detected.
+
+        The default implementation reads the row and then updates it.
+        Database backends can override this to make a single
+        `UPDATE ... WHERE` statement instead.
+        """
+        item = await self.filter(**{lookup_field: key}, **(expected or {})).get()
+        if item is None:
+            return 0
+        await item.update(**values)
+        return 1
+
+    async def delete_by_key(
+        self,
+        key: typing.Any,
+        lookup_field: str = "pk",
+        expected: typing.Dict[str, typing.Any] = None,
+    ) -> int:
+        """
+        Delete the row whose `lookup_field` is `key`, returning the number of
+        rows deleted. `expected` works as for `update_by_key()`.
+        """
+        item = await self.filter(**{lookup_field: key}, **(expected or {})).get()
+        if item is None:
+            return 0
+        await item.delete()
+        return 1
+
+    async def stats(self) -> typing.Dict[str, ColumnSummary]:
+        """
+        Return summary statistics for each column of the selected rows.
+
+        The default implementation scans the rows using `iterate()`. Database
+        backends can override it to use a single aggregate query instead.
+        """
+        fields = list(self.schema.fields)
+        stats = TableStats(fields)
+        async for batch in self.iterate():
+            for item in batch:
+                stats.add({field: getattr(item, field) for field in fields})
+        return stats.summarize()
+
+    async def suggest(
+        self, search_term: str, limit: int = 10
+    ) -> typing.List["DataItem"]:
+        """
+        Return up to `limit` rows matching a search term, for typeahead.
+
+        Unlike `search()`, there is no count of all matches, so datasources
+        can stop looking as soon as `limit` rows are found.
+        """
+        return await self.search(search_term).limit(limit).all()
+
+    async def iterate(
+        self, batch_size: int = 1000, offset: int = 0, limit: int = None
+    ) -> typing.AsyncIterator[typing.List["DataItem"]]:
+        """
+        Yield all of the selected rows, in batches of up to `batch_size` rows,
+        so that large result sets can be walked in constant memory. Only the
+        rows from `offset` onwards are read, up to `limit` rows if it is set.
+
+        The default implementation fetches each batch using `offset()` and
+        `limit()`, so it should be called on a query without either applied.
+
+        For example:
+
+        async for batch in users.order_by("pk").iterate(batch_size=500):
+            ...
+        """
+        while limit is None or limit > 0:
+            size = batch_size if limit is None else min(batch_size, limit)
+            batch = await self.offset(offset).limit(size).all()
+            if batch:
+                yield batch
+            if len(batch) < size:
+                return
+            offset += size
+            if limit is not None:
+                limit -= size
+
+
+@dataclass(frozen=True)
+class Change:
+    """
+    A change to a row, emitted by datasources that support `subscribe()`.
+    The `operation` is one of "insert", "update" or "delete", and `row` holds
+    the values of the row after the change, or before it for deletes.
+    """
+
+    operation: str
+    row: dict
+
 
 class DataItem:
     async def delete(self):
@@ -74,39 +224,270 @@ class DataItem:
         raise NotImplementedError()  # pragma: no cover
 
 
+class BudgetExceeded(Exception):
+    """
+    Raised when an insert would take a `MockDataSource` over its row or
+    memory budget, and the budget rejects inserts rather than evicting rows.
+    """
+
+
+@dataclass(frozen=True)
+class MemoryUsage:
+    """
+    The approximate memory used by a `MockDataSource`, in bytes, and its
+    budget, if it has one.
+    """
+
+    rows: int
+    row_bytes: int
+    index_bytes: int
+    stats_bytes: int
+    max_rows: typing.Optional[int] = None
+    max_bytes: typing.Optional[int] = None
+    budget_warning: float = 0.9
+
+    @property
+    def total_bytes(self) -> int:
+        return self.row_bytes + self.index_bytes + self.stats_bytes
+
+    @property
+    def budget_used(self) -> typing.Optional[float]:
+        """
+        The fraction of the row or memory budget used, whichever is greater,
+        or `None` if there is no budget.
+        """
+        return get_budget_used(self.rows, self.row_bytes, self.max_rows, self.max_bytes)
+
+    @property
+    def near_budget(self) -> bool:
+        used = self.budget_used
+        return used is not None and used >= self.budget_warning
+
+
+def get_budget_used(
+    rows: int, row_bytes: int, max_rows: int = None, max_bytes: int = None
+) -> typing.Optional[float]:
+    used = [
+        count / limit
+        for count, limit in ((rows, max_rows), (row_bytes, max_bytes))
+        if limit is not None
+    ]
+    return max(used) if used else None
+
+
+def get_row_size(row: dict) -> int:
+    """
+    Return the approximate size of a row in bytes. Keys are shared between
+    rows, so only the values are counted.
+    """
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+class Reversed:
+    """
+    Wraps a value so that it sorts in reverse order.
+    Used for composite sort keys with mixed sort directions.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: typing.Any) -> None:
+        self.value = value
+
+    def __eq__(self, other: typing.Any) -> bool:
+        return self.value == other.value
+
+    def __lt__(self, other: "Reversed") -> bool:
+        return other.value < self.value
+
+
+def get_sort_key(
+    order_by: typing.Sequence[str],
+) -> typing.Tuple[typing.Callable[[dict], typing.Any], bool]:
+    """
+    Return a `(key, reverse)` pair for sorting items with a single `sorted()`
+    call, given an ordering such as `("status", "-created")`.
+    """
+    keys = [column.lstrip("-") for column in order_by]
+    directions = {column.startswith("-") for column in order_by}
+    if len(directions) == 1:
+        # All columns are sorted in the same direction, so we can use a plain
+        # tuple key, and let `sorted()` handle the direction.
+        return itemgetter(*keys), directions.pop()
+
+    reverse = [column.startswith("-") for column in order_by]
+
+    def key(item: dict) -> tuple:
+        return tuple(
+            Reversed(item[key]) if is_reverse else item[key]
+            for key, is_reverse in zip(keys, reverse)
+        )
+
+    return key, False
+
+
+class Row(dict):
+    """
+    A row in a `MockDataSource`.
+
+    Rows are never modified once they have been published. Instead updates
+    replace the row with a new one that has the same `row_id`.
+    """
+
+    __slots__ = ("row_id",)
+
+    def __init__(self, values: dict, row_id: int = None) -> None:
+        super().__init__(values)
+        self.row_id = next(row_ids) if row_id is None else row_id
+
+
+row_ids = itertools.count()
+
+
+class MockTable:
+    """
+    The rows of a `MockDataSource`, shared between all of its copies.
+
+    Each version of the rows is a list that is never modified once published.
+    Queries read the current version without taking a lock, and writers
+    publish a new version, so that a query always sees a consistent set of
+    rows. Old versions are reclaimed once no query is using them.
+    """
+
+    def __init__(self, rows: typing.List[dict]) -> None:
+        self.current: typing.Tuple[int, typing.List[Row]] = (
+            0,
+            [Row(row) for row in rows],
+        )
+        self.indexes: OrderedDict = OrderedDict()
+        # Column statistics, built on first use and then kept up to date.
+        self.stats: typing.Optional[TableStats] = None
+        # The size of the rows in bytes, measured on first use, or when there
+        # is a memory budget, and then kept up to date.
+        self.row_bytes: typing.Optional[int] = None
+        self.near_budget = False
+        self.listeners: typing.List[typing.Callable[[Change], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self) -> typing.List[Row]:
+        return self.current[1]
+
+    def write(
+        self, func: typing.Callable[[typing.List[Row]], typing.Any]
+    ) -> typing.Any:
+        """
+        Apply `func` to a copy of the current rows, and publish the result
+        as a new version.
+        """
+        with self._lock:
+            version, rows = self.current
+            rows = list(rows)
+            result = func(rows)
+            self.current = (version + 1, rows)
+            self.indexes.clear()
+            return result
+
+
+def get_position(rows: typing.List[Row], row: Row) -> int:
+    for index, item in enumerate(rows):
+        if item.row_id == row.row_id:
+            return index
+    raise ValueError("Row does not exist.")
+
+
 class MockDataSource(DataSource):
+    """
+    An in-memory datasource.
+
+    The number of rows, or their approximate size in bytes, can be limited
+    with `max_rows` and `max_bytes`. Inserts over the budget evict the oldest
+    rows, or with `evict=False` raise `BudgetExceeded`. The same applies to
+    the initial or restored rows, where the last rows are the oldest. Updates
+    aren't limited. A warning is logged when the table reaches
+    `BUDGET_WARNING` of its budget.
+
+    For example:
+
+    users = MockDataSource(schema=user, max_rows=100000, max_bytes=50_000_000)
+    """
+
+    # The maximum number of sorted indexes to retain.
+    MAX_SORT_INDEXES = 8
+    # The fraction of the budget at which a warning is logged.
+    BUDGET_WARNING = 0.9
+    # Scans over this many rows are moved off the event loop, and partitioned
+    # across the executor, if one is given.
+    PARALLEL_SCAN_THRESHOLD = scanning.PARALLEL_SCAN_THRESHOLD
+
     def __init__(
         self,
         schema,
         initial: typing.List[dict] = None,
+        store: SnapshotStore = None,
+        executor: concurrent.futures.Executor = None,
+        max_rows: int = None,
+        max_bytes: int = None,
+        evict: bool = True,
+        _table: MockTable = None,
         _search_term: str = None,
         _filter_kwargs: dict = None,
-        _order_by: str = None,
+        _order_by: typing.Tuple[str, ...] = None,
         _offset: int = None,
         _limit: int = None,
+        _snapshot: typing.Tuple[int, typing.List[Row]] = None,
     ):
         self.schema = schema
-        self._items = [] if initial is None else initial
+        self.store = store
+        self.executor = executor
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.evict = evict
         self._search_term = _search_term
         self._filter_kwargs = _filter_kwargs
         self._order_by = _order_by
         self._offset = _offset
         self._limit = _limit
-
-        for item in self._items:
-            for key, field in self.schema.fields.items():
-                if key not in item and field.has_default():
-                    item[key] = field.get_default_value()
+        self._snapshot = _snapshot
+
+        if _table is not None:
+            self._table = _table
+        elif store is not None and store.exists():
+            # Warm start from the persisted rows, which are already complete.
+            self._table = MockTable(store.load())
+            if self._apply_budget():
+                store.compact(self._table.rows, background=False)
+        else:
+            items = [] if initial is None else initial
+            for item in items:
+                for key, field in self.schema.fields.items():
+                    if key not in item and field.has_default():
+                        item[key] = field.get_default_value()
+            if store is not None:
+                for item in items:
+                    store.check_key(item)
+            self._table = MockTable(items)
+            self._apply_budget()
+            if store is not None:
+                store.compact(self._table.rows, background=False)
+        if max_bytes is not None and self._table.row_bytes is None:
+            self._table.row_bytes = sum(map(get_row_size, self._table.rows))
 
     def _copy(self, **kwargs: typing.Any) -> "MockDataSource":
         base_kwargs = {
             "schema": self.schema,
-            "initial": self._items,
+            "store": self.store,
+            "executor": self.executor,
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "evict": self.evict,
+            "_table": self._table,
             "_search_term": self._search_term,
             "_filter_kwargs": self._filter_kwargs,
             "_order_by": self._order_by,
             "_offset": self._offset,
             "_limit": self._limit,
+            "_snapshot": self._snapshot,
         }
         base_kwargs.update(kwargs)
         return self.__class__(**base_kwargs)
@@ -115,14 +496,13 @@ class MockDataSource(DataSource):
         return self._copy(_search_term=search_term)
 
     def filter(self, **kwargs) -> "MockDataSource":
-        kwargs = {
-            key: self.schema.fields[key].validate(value)
-            for key, value in kwargs.items()
-        }
+        kwargs = validate_filters(self.schema, kwargs)
+        if self._filter_kwargs is not None:
+            kwargs = {**self._filter_kwargs, **kwargs}
         return self._copy(_filter_kwargs=kwargs)
 
-    def order_by(self, order_by: str) -> "MockDataSource":
-        return self._copy(_order_by=order_by)
+    def order_by(self, *order_by: str) -> "MockDataSource":
+        return self._copy(_order_by=order_by or None)
 
     def offset(self, offset: int) -> "MockDataSource":
         return self._copy(_offset=offset)
@@ -130,54 +510,369 @@ class MockDataSource(DataSource):
     def limit(self, limit: int) -> "MockDataSource":
         return self._copy(_limit=limit)
 
+    def snapshot(self) -> "MockDataSource":
+        """
+        Return a copy of the datasource that reads the current version of the
+        rows in all later queries, so that several queries see the same rows.
+        Writes are still applied to the latest version.
+        """
+        return self._copy(_snapshot=self._table.current)
+
+    def _current(self) -> typing.Tuple[int, typing.List[Row]]:
+        if self._snapshot is not None:
+            return self._snapshot
+        return self._table.current
+
+    async def _sorted_items(
+        self, order_by: typing.Tuple[str, ...], version: int, items: typing.List[Row]
+    ) -> typing.List[Row]:
+        """
+        Return all items, sorted using a single composite key sort.
+
+        Sorted lists are retained as indexes for the current version of the
+        rows, so that repeated queries against the same ordering only need to
+        filter a pre-sorted list.
+        """
+        indexes = self._table.indexes
+        index = indexes.get(order_by)
+        if index is not None and index[0] == version:
+            indexes.move_to_end(order_by)
+            return index[1]
+
+        key, reverse = get_sort_key(order_by)
+        items = await scanning.run(
+            sorted,
+            items,
+            key=key,
+            reverse=reverse,
+            threshold=self.PARALLEL_SCAN_THRESHOLD,
+        )
+        if version == self._table.current[0]:
+            indexes[order_by] = (version, items)
+            while len(indexes) > self.MAX_SORT_INDEXES:
+                indexes.popitem(last=False)
+        return items
+
+    async def _filter_items(self, items: typing.List[Row]) -> typing.List[Row]:
+        return await scanning.scan(
+            items,
+            filter_kwargs=self._filter_kwargs,
+            search_term=self._search_term,
+            executor=self.executor,
+            threshold=self.PARALLEL_SCAN_THRESHOLD,
+        )
+
+    async def _select_range(self) -> typing.Tuple[typing.List[Row], range]:
+        """
+        Return the matching items, and the range of positions selected by any
+        offset and limit, without copying the items.
+        """
+        # Each query reads a single version of the rows.
+        version, items = self._current()
+        if self._order_by is not None:
+            # Sort first, so that filtering works on a pre-sorted index.
+            items = await self._sorted_items(self._order_by, version, items)
+        items = await self._filter_items(items)
+        start = min(self._offset or 0, len(items))
+        stop = len(items) if self._limit is None else start + self._limit
+        return items, range(start, min(stop, len(items)))
+
+    async def _select_items(self) -> typing.List[Row]:
+        items, selected = await self._select_range()
+        return items[selected.start : selected.stop]
+
     async def all(self) -> typing.List["MockDataItem"]:
-        items = self._items
-        if self._filter_kwargs is not None:
-            for key, value in self._filter_kwargs.items():
-                items = [item for item in items if item[key] == value]
-        if self._search_term is not None:
-            items = search.filter_by_search_term(items, self._search_term)
+        items = await self._select_items()
+        return [MockDataItem(item=item, datasource=self) for item in items]
+
+    async def iterate(
+        self, batch_size: int = 1000, offset: int = 0, limit: int = None
+    ) -> typing.AsyncIterator[typing.List["MockDataItem"]]:
+        datasource = self.offset(offset) if offset else self
+        if limit is not None:
+            datasource = datasource.limit(limit)
+        # Walk a single version of the rows. Without filters this is the
+        # stored list itself, so only the current batch is ever copied.
+        items, selected = await datasource._select_range()
+        for start in selected[::batch_size]:
+            stop = min(start + batch_size, selected.stop)
+            yield [
+                MockDataItem(item=item, datasource=self) for item in items[start:stop]
+            ]
+
+    async def suggest(
+        self, search_term: str, limit: int = 10
+    ) -> typing.List["MockDataItem"]:
+        version, items = self._current()
         if self._order_by is not None:
-            order_by = self._order_by.lstrip("-")
-            reverse = self._order_by.startswith("-")
-            items = sorted(
-                items,
-                key=lambda item: item[order_by],
-                reverse=reverse,
-            )
-        if self._offset is not None:
-            items = items[self._offset :]
-        if self._limit is not None:
-            items = items[: self._limit]
-        return [MockDataItem(item=item, container=self._items) for item in items]
+            items = await self._sorted_items(self._order_by, version, items)
+        found = await scanning.find_first(
+            items, limit, filter_kwargs=self._filter_kwargs, search_term=search_term
+        )
+        return [MockDataItem(item=item, datasource=self) for item in found]
 
     async def get(self) -> typing.Optional["MockDataItem"]:
         items = await self.all()
         return items[0] if items else None
 
     async def count(self) -> int:
-        items = await self.all()
-        return len(items)
+        _, selected = await self._select_range()
+        return len(selected)
+
+    async def facets(
+        self, *fields: str
+    ) -> typing.Dict[str, typing.Dict[typing.Any, int]]:
+        items = await self._filter_items(self._current()[1])
+        return await scanning.run(
+            scanning.count_values,
+            items,
+            fields,
+            threshold=self.PARALLEL_SCAN_THRESHOLD,
+        )
+
+    async def stats(self) -> typing.Dict[str, ColumnSummary]:
+        if self._filter_kwargs or self._search_term or self._snapshot is not None:
+            return await super().stats()
+        table = self._table
+        while True:
+            # Build the statistics on first use, and afterwards rebuild any
+            # columns that a removal left out of date.
+            version, rows = table.current
+            if table.stats is None:
+                fields = list(self.schema.fields)
+            else:
+                fields = table.stats.stale_fields()
+            if not fields:
+                return table.stats.summarize()
+            stats = await scanning.run(
+                lambda rows: TableStats(fields, rows),
+                rows,
+                threshold=self.PARALLEL_SCAN_THRESHOLD,
+            )
+            # Writes made while building aren't included, so build again.
+            if table.current[0] == version:
+                if table.stats is None:
+                    table.stats = stats
+                else:
+                    table.stats.columns.update(stats.columns)
+
+    async def memory_usage(self) -> MemoryUsage:
+        """
+        Return the approximate memory used by the rows, the sorted indexes and
+        the column statistics.
+        """
+        table = self._table
+        while table.row_bytes is None:
+            version, rows = table.current
+            row_bytes = await scanning.run(
+                lambda rows: sum(map(get_row_size, rows)),
+                rows,
+                threshold=self.PARALLEL_SCAN_THRESHOLD,
+            )
+            # Writes made while measuring aren't included, so measure again.
+            if table.current[0] == version:
+                table.row_bytes = row_bytes
+        indexes = list(table.indexes.values())
+        return MemoryUsage(
+            rows=len(table.rows),
+            row_bytes=table.row_bytes,
+            index_bytes=sum(sys.getsizeof(index) for _, index in indexes),
+            stats_bytes=0 if table.stats is None else table.stats.memory_size(),
+            max_rows=self.max_rows,
+            max_bytes=self.max_bytes,
+            budget_warning=self.BUDGET_WARNING,
+        )
 
     async def create(self, **kwargs) -> "MockDataItem":
         for key, field in self.schema.fields.items():
             if key not in kwargs and field.has_default():
                 kwargs[key] = field.get_default_value()
-        self._items.insert(0, kwargs)
-        return MockDataItem(item=kwargs, container=self._items)
+        if self.store is not None:
+            self.store.check_key(kwargs)
+        row = Row(kwargs)
+        evicted: typing.List[Row] = []
+
+        def insert(rows: typing.List[Row]) -> Row:
+            rows.insert(0, row)
+            row_bytes = self._table.row_bytes
+            if row_bytes is not None:
+                row_bytes += get_row_size(row)
+            # New rows are inserted first, so the oldest rows are last.
+            while self._is_over_budget(len(rows), row_bytes):
+                if not self.evict or len(rows) == 1:
+                    raise BudgetExceeded("The table is full.")
+                evicted.append(rows.pop())
+                if row_bytes is not None:
+                    row_bytes -= get_row_size(evicted[-1])
+            self._table.row_bytes = row_bytes
+            if self._table.stats is not None:
+                self._table.stats.add(row)
+                for item in evicted:
+                    self._table.stats.remove(item)
+            self._log("create", None, kwargs)
+            for item in evicted:
+                self._log_delete(item)
+            self._check_budget(len(rows), row_bytes)
+            return row
+
+        self._write("insert", insert)
+        for item in evicted:
+            self._notify("delete", item)
+        return MockDataItem(item=row, datasource=self)
+
+    def _apply_budget(self) -> int:
+        """
+        Fit the rows of a new table into the budget, the same way as inserts,
+        by evicting the last rows, or raising `BudgetExceeded` with
+        `evict=False`. Returns the number of rows evicted.
+        """
+        if self.max_rows is None and self.max_bytes is None:
+            return 0
+        version, rows = self._table.current
+        row_bytes = None
+        if self.max_bytes is not None:
+            row_bytes = sum(map(get_row_size, rows))
+        count = len(rows)
+        while self._is_over_budget(count, row_bytes):
+            if not self.evict:
+                raise BudgetExceeded("The rows are over the table's budget.")
+            count -= 1
+            if row_bytes is not None:
+                row_bytes -= get_row_size(rows[count])
+        self._table.current = (version, rows[:count])
+        self._table.row_bytes = row_bytes
+        self._check_budget(count, row_bytes)
+        return len(rows) - count
+
+    def _is_over_budget(self, rows: int, row_bytes: typing.Optional[int]) -> bool:
+        if self.max_rows is not None and rows > self.max_rows:
+            return True
+        return self.max_bytes is not None and row_bytes > self.max_bytes
+
+    def _check_budget(self, rows: int, row_bytes: typing.Optional[int]) -> None:
+        used = get_budget_used(rows, row_bytes or 0, self.max_rows, self.max_bytes)
+        near_budget = used is not None and used >= self.BUDGET_WARNING
+        if near_budget and not self._table.near_budget:
+            logger.warning("A table has used %d%% of its budget.", used * 100)
+        self._table.near_budget = near_budget
+
+    async def update_by_key(
+        self,
+        key: typing.Any,
+        values: typing.Dict[str, typing.Any],
+        lookup_field: str = "pk",
+        expected: typing.Dict[str, typing.Any] = None,
+    ) -> int:
+        row = self._find_by_key(key, lookup_field, expected)
+        if row is None:
+            return 0
+        self._update_item(row, values)
+        return 1
+
+    async def delete_by_key(
+        self,
+        key: typing.Any,
+        lookup_field: str = "pk",
+        expected: typing.Dict[str, typing.Any] = None,
+    ) -> int:
+        row = self._find_by_key(key, lookup_field, expected)
+        if row is None:
+            return 0
+        self._delete_item(row)
+        return 1
+
+    def _find_by_key(
+        self,
+        key: typing.Any,
+        lookup_field: str,
+        expected: typing.Optional[typing.Dict[str, typing.Any]],
+    ) -> typing.Optional[Row]:
+        # Writes run without yielding to the event loop between finding the
+        # row and replacing it, so the check and the write are atomic.
+        conditions = validate_filters(
+            self.schema, {lookup_field: key, **(expected or {})}
+        )
+        for row in self._table.rows:
+            if all(row.get(name) == value for name, value in conditions.items()):
+                return row
+        return None
+
+    def _delete_item(self, item: Row) -> None:
+        def delete(rows: typing.List[Row]) -> Row:
+            row = rows.pop(get_position(rows, item))
+            if self._table.stats is not None:
+                self._table.stats.remove(row)
+            if self._table.row_bytes is not None:
+                self._table.row_bytes -= get_row_size(row)
+            self._log_delete(row)
+            self._check_budget(len(rows), self._table.row_bytes)
+            return row
+
+        self._write("delete", delete)
+
+    def _update_item(self, item: Row, values: dict) -> Row:
+        def update(rows: typing.List[Row]) -> Row:
+            index = get_position(rows, item)
+            current = rows[index]
+            row = Row({**current, **values}, row_id=current.row_id)
+            if self.store is not None:
+                self.store.check_key(row)
+            rows[index] = row
+            if self._table.stats is not None:
+                self._table.stats.update(current, row)
+            if self._table.row_bytes is not None:
+                self._table.row_bytes += get_row_size(row) - get_row_size(current)
+            if self.store is not None:
+                self._log("update", current[self.store.lookup_field], values)
+            return row
+
+        return self._write("update", update)
+
+    def _write(
+        self, operation: str, func: typing.Callable[[typing.List[Row]], Row]
+    ) -> Row:
+        row = self._table.write(func)
+        if self.store is not None and self.store.needs_compaction:
+            self.store.compact(self._table.rows)
+        self._notify(operation, row)
+        return row
+
+    def _notify(self, operation: str, row: Row) -> None:
+        if self._table.listeners:
+            change = Change(operation=operation, row=dict(row))
+            for listener in list(self._table.listeners):
+                listener(change)
+
+    def subscribe(
+        self, listener: typing.Callable[[Change], None]
+    ) -> typing.Callable[[], None]:
+        """
+        Call `listener` with a `Change` after each insert, update or delete.
+        Returns a function that cancels the subscription.
+        """
+        self._table.listeners.append(listener)
+        return lambda: self._table.listeners.remove(listener)
+
+    def _log(self, operation: str, key: typing.Any, values: typing.Any) -> None:
+        if self.store is not None:
+            self.store.append(operation, key, values)
+
+    def _log_delete(self, row: Row) -> None:
+        if self.store is not None:
+            self._log("delete", row[self.store.lookup_field], None)
 
 
 class MockDataItem(DataItem):
-    def __init__(self, item: dict, container: typing.List[dict]) -> None:
+    def __init__(self, item: Row, datasource: MockDataSource) -> None:
         self._item = item
-        self._container = container
+        self._datasource = datasource
         for key, value in item.items():
             setattr(self, key, value)
 
     async def delete(self) -> None:
-        self._container.remove(self._item)
+        self._datasource._delete_item(self._item)
 
     async def update(self, **kwargs) -> None:
+        self._item = self._datasource._update_item(self._item, kwargs)
         for key, value in kwargs.items():
-            self._item[key] = value
             setattr(self, key, value)
@@ -0,0 +1,181 @@
+import typing
+from dataclasses import dataclass
+
+import typesystem
+from starlette.datastructures import URL, QueryParams
+
+FILTER_PREFIX = "filter."
+
+
+@dataclass
+class FacetControl:
+    text: str
+    url: URL = None
+    count: int = 0
+    is_active: bool = False
+    is_disabled: bool = False
+
+
+@dataclass
+class Facet:
+    id: str
+    text: str
+    controls: typing.List[FacetControl]
+
+
+def is_facet_field(field: typesystem.Field) -> bool:
+    return isinstance(field, (typesystem.Boolean, typesystem.Choice))
+
+
+def get_facet_choices(
+    field: typesystem.Field,
+) -> typing.List[typing.Tuple[typing.Any, str]]:
+    """
+    Return the possible `(value, text)` pairs for a boolean or choice field.
+    """
+    if isinstance(field, typesystem.Boolean):
+        return [(True, "Yes"), (False, "No")]
+    return list(field.choices)
+
+
+def get_facet_fields(
+    schema: typesystem.Schema, filter_fields: typing.Sequence[str] = None
+) -> typing.Dict[str, typesystem.Field]:
+    """
+    Return the fields that can be filtered on. If no explicit `filter_fields`
+    are given, then all boolean and choice fields are used.
+
+    Raises `ValueError` if any of the `filter_fields` is not a boolean or
+    choice field of the schema.
+    """
+    if filter_fields is None:
+        filter_fields = [
+            key for key, field in schema.fields.items() if is_facet_field(field)
+        ]
+    for key in filter_fields:
+        if not is_facet_field(schema.fields.get(key)):
+            raise ValueError(f"Filter field {key!r} must be a boolean or choice field.")
+    return {key: schema.fields[key] for key in filter_fields}
+
+
+def format_value(value: typing.Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def get_filters(
+    url: URL, fields: typing.Dict[str, typesystem.Field]
+) -> typing.Dict[str, typing.Any]:
+    """
+    Determine any column filters from `?filter.<field>=<value>` parameters
+    in the URL query string. Invalid fields or values are ignored.
+    """
+    return parse_filters(QueryParams(url.query), fields)
+
+
+def parse_filters(
+    query_params: QueryParams, fields: typing.Dict[str, typesystem.Field]
+) -> typing.Dict[str, typing.Any]:
+    filters = {}
+    for key, value in query_params.items():
+        if not key.startswith(FILTER_PREFIX):
+            continue
+        field_id = key[len(FILTER_PREFIX) :]
+        if field_id not in fields:
+            continue
+        validated, error = fields[field_id].validate_or_error(value)
+        if not error:
+            filters[field_id] = validated
+    return filters
+
+
+async def count_facets(
+    datasource: typing.Any, fields: typing.Dict[str, typesystem.Field]
+) -> typing.Dict[str, typing.Dict[typing.Any, int]]:
+    """
+    Return the number of rows for each value of each facet field.
+
+    Datasources that provide a `facets()` method compute all the counts
+    at once. Otherwise we fall back to counting each value separately.
+    """
+    if not fields:
+        return {}
+
+    if hasattr(datasource, "facets"):
+        return await datasource.facets(*fields.keys())
+
+    counts = {}
+    for key, field in fields.items():
+        counts[key] = {
+            value: await datasource.filter(**{key: value}).count()
+            for value, _ in get_facet_choices(field)
+        }
+    return counts
+
+
+async def get_facet_counts(
+    datasource: typing.Any,
+    fields: typing.Dict[str, typesystem.Field],
+    filters: typing.Dict[str, typing.Any] = None,
+) -> typing.Dict[str, typing.Dict[typing.Any, int]]:
+    """
+    Return the number of rows for each value of each facet field, given the
+    active column `filters`.
+
+    The counts for a filtered field ignore its own filter, so that they show
+    how many rows each of the other values would select.
+    """
+    filters = {} if filters is None else filters
+    unfiltered = {key: field for key, field in fields.items() if key not in filters}
+    filtered = datasource.filter(**filters) if filters else datasource
+    counts = await count_facets(filtered, unfiltered)
+    for key, field in fields.items():
+        if key in filters:
+            others = {other: value for other, value in filters.items() if other != key}
+            filtered = datasource.filter(**others) if others else datasource
+            counts.update(await count_facets(filtered, {key: field}))
+    return counts
+
+
+def get_facet_controls(
+    url: URL,
+    fields: typing.Dict[str, typesystem.Field],
+    filters: typing.Dict[str, typing.Any],
+    counts: typing.Dict[str, typing.Dict[typing.Any, int]],
+) -> typing.List[Facet]:
+    """
+    Returns a list of facets, with a control for each value, that toggles
+    filtering on that value.
+    """
+    facets = []
+    for field_id, field in fields.items():
+        param = FILTER_PREFIX + field_id
+        controls = []
+        for value, text in get_facet_choices(field):
+            count = counts.get(field_id, {}).get(value, 0)
+            is_active = field_id in filters and filters[field_id] == value
+            if is_active:
+                # Value is selected. Link URL to remove the filter.
+                linked_url = url.remove_query_params(param).remove_query_params("page")
+            elif count:
+                # Value is not selected. Link URL to filter by the value.
+                linked_url = url.include_query_params(
+                    **{param: format_value(value)}
+                ).remove_query_params("page")
+            else:
+                # There are no matching rows. No need to link.
+                linked_url = None
+
+            control = FacetControl(
+                text=text,
+                url=linked_url,
+                count=count,
+                is_active=is_active,
+                is_disabled=linked_url is None,
+            )
+            controls.append(control)
+
+        facet = Facet(id=field_id, text=field.title, controls=controls)
+        facets.append(facet)
+    return facets
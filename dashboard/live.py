@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import typing
+
+from .datasource import Change
+
+logger = logging.getLogger("dashboard")
+
+# A page of rows, as an ordered mapping of row keys to their rendered cells.
+Rows = typing.Dict[str, typing.List[str]]
+LoadPage = typing.Callable[[typing.Hashable], typing.Awaitable[typing.Tuple[int, Rows]]]
+
+
+def get_diff(
+    old_count: int, old_rows: Rows, new_count: int, new_rows: Rows
+) -> typing.Optional[dict]:
+    """
+    Return the changes between two versions of a page of rows, or `None` if
+    nothing changed. Only inserted or updated rows are included in full.
+    """
+    deleted = [key for key in old_rows if key not in new_rows]
+    changed = {
+        key: cells for key, cells in new_rows.items() if old_rows.get(key) != cells
+    }
+    if not deleted and not changed and old_count == new_count:
+        if list(old_rows) == list(new_rows):
+            return None
+    return {
+        "count": new_count,
+        "keys": list(new_rows),
+        "rows": changed,
+        "deleted": deleted,
+    }
+
+
+def format_event(data: dict, event: str = "diff") -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ViewerGroup:
+    """
+    The viewers of a table that share the same query, and so see the same
+    page of rows. Each change reloads the page once for the whole group.
+    """
+
+    def __init__(self, query: typing.Hashable, load_page: LoadPage) -> None:
+        self.query = query
+        self.load_page = load_page
+        self.queues: typing.Set[asyncio.Queue] = set()
+        self.count = 0
+        self.rows: Rows = {}
+        self._task: typing.Optional[asyncio.Task] = None
+        self._is_stale = False
+
+    async def load(self) -> None:
+        self.count, self.rows = await self.load_page(self.query)
+
+    def schedule_refresh(self) -> None:
+        """
+        Reload the page. Changes that arrive while a reload is in progress are
+        coalesced into a single further reload.
+        """
+        self._is_stale = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh())
+
+    async def _refresh(self) -> None:
+        while self._is_stale:
+            self._is_stale = False
+            try:
+                count, rows = await self.load_page(self.query)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Viewers keep the rows they have, until the next change.
+                logger.exception("Failed to reload a page for live viewers.")
+                continue
+            diff = get_diff(self.count, self.rows, count, rows)
+            self.count, self.rows = count, rows
+            if diff is not None:
+                for queue in self.queues:
+                    queue.put_nowait(diff)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+class ChangeFeed:
+    """
+    Pushes row diffs to the live viewers of a table.
+
+    A single subscription to the datasource is shared by all viewers, and is
+    only held while there are viewers. Viewers are grouped by their query,
+    so each change costs one page load per distinct query, rather than one
+    per viewer.
+    """
+
+    def __init__(self, datasource: typing.Any, load_page: LoadPage) -> None:
+        self.datasource = datasource
+        self.load_page = load_page
+        self.groups: typing.Dict[typing.Hashable, ViewerGroup] = {}
+        self._unsubscribe: typing.Optional[typing.Callable[[], None]] = None
+
+    async def connect(self, query: typing.Hashable) -> asyncio.Queue:
+        """
+        Register a viewer, returning a queue that receives its diffs.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        group = self.groups.get(query)
+        if group is not None:
+            group.queues.add(queue)
+            return queue
+
+        group = ViewerGroup(query, self.load_page)
+        group.queues.add(queue)
+        self.groups[query] = group
+        if self._unsubscribe is None:
+            self._unsubscribe = self.datasource.subscribe(self.on_change)
+        try:
+            await group.load()
+        except BaseException:
+            # The viewer went away, or the page failed to load.
+            self.disconnect(query, queue)
+            raise
+        return queue
+
+    def disconnect(self, query: typing.Hashable, queue: asyncio.Queue) -> None:
+        group = self.groups[query]
+        group.queues.discard(queue)
+        if not group.queues:
+            group.close()
+            del self.groups[query]
+        if not self.groups and self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def on_change(self, change: Change) -> None:
+        for group in self.groups.values():
+            group.schedule_refresh()
+
+    async def stream(
+        self, query: typing.Hashable, keepalive: float = 15.0
+    ) -> typing.AsyncIterator[str]:
+        """
+        Yield server-sent events with the diffs for a viewer, until the
+        client disconnects.
+        """
+        queue = await self.connect(query)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    diff = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # A comment line, so that proxies don't close the stream.
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_event(diff)
+        finally:
+            self.disconnect(query, queue)
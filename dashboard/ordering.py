@@ -1,3 +1,5 @@
+import functools
+import inspect
 import typing
 from dataclasses import dataclass
 
@@ -9,6 +11,8 @@ class ColumnControl:
     id: str
     text: str
     url: URL = None
+    add_url: URL = None
+    sort_position: typing.Optional[int] = None
     is_forward_sorted: bool = False
     is_reverse_sorted: bool = False
 
@@ -17,48 +21,115 @@ class ColumnControl:
         return self.is_forward_sorted or self.is_reverse_sorted
 
 
-def get_ordering(url: URL, columns: typing.Dict[str, str]) -> typing.Optional[str]:
+def get_ordering(url: URL, columns: typing.Dict[str, str]) -> typing.List[str]:
     """
     Determine a column ordering based on the URL query string.
+
+    Multiple columns may be given, separated by commas, eg. "?order=status,-created".
+    Invalid or repeated columns are ignored.
+    """
+    return parse_ordering(QueryParams(url.query).get("order"), columns)
+
+
+def parse_ordering(
+    order_by: typing.Optional[str], columns: typing.Container[str]
+) -> typing.List[str]:
+    if not order_by:
+        return []
+
+    ordering = []
+    seen = set()
+    for column in order_by.split(","):
+        column_id = column.lstrip("-")
+        if column_id in columns and column_id not in seen:
+            seen.add(column_id)
+            ordering.append(column)
+    return ordering
+
+
+def with_tiebreaker(order_by: typing.List[str], field: str) -> typing.List[str]:
+    """
+    Append a unique field to an ordering, so that rows with equal values in
+    the ordered columns still have a deterministic order across pages.
+    """
+    if not order_by or field in [column.lstrip("-") for column in order_by]:
+        return order_by
+    return order_by + [field]
+
+
+@functools.lru_cache(maxsize=None)
+def accepts_multiple_columns(cls: type) -> bool:
+    """
+    Return True if a datasource class takes several columns to `order_by()`.
     """
-    query_params = QueryParams(url.query)
-    order_by = query_params.get("order")
-    if order_by is not None and order_by.lstrip("-") not in columns:
-        return None
-    return order_by
+    parameters = inspect.signature(cls.order_by).parameters.values()
+    return any(param.kind == param.VAR_POSITIONAL for param in parameters)
+
+
+def apply_ordering(
+    datasource: typing.Any, order_by: typing.Sequence[str]
+) -> typing.Any:
+    """
+    Order a datasource by each column in turn, eg. `order_by("status", "-pk")`.
+
+    Datasources written to the single column `order_by(order_by: str)`
+    signature are ordered by the first column only.
+    """
+    if len(order_by) > 1 and not accepts_multiple_columns(type(datasource)):
+        order_by = order_by[:1]
+    return datasource.order_by(*order_by)
+
+
+def get_ordered_url(url: URL, order_by: typing.List[str]) -> URL:
+    if not order_by:
+        return url.remove_query_params("order").remove_query_params("page")
+    return url.include_query_params(order=",".join(order_by)).remove_query_params(
+        "page"
+    )
 
 
 def get_column_controls(
     url: URL,
     columns: typing.Dict[str, str],
-    order_by: typing.Optional[str],
+    order_by: typing.List[str],
 ) -> typing.List[ColumnControl]:
-    selected_column = None if order_by is None else order_by.lstrip("-")
-    is_reverse = order_by is not None and order_by.startswith("-")
+    """
+    Returns a list of column controls.
+
+    Each control has a `url` that sorts by that column alone, and an `add_url`
+    that adds the column as an additional sort key, for use with shift-click.
+    """
+    sorted_columns = [column.lstrip("-") for column in order_by]
 
     controls = []
     for column_id, name in columns.items():
-
-        if selected_column != column_id:
+        if column_id not in sorted_columns:
             # Column is not selected. Link URL to forward search.
-            linked_url = url.include_query_params(order=column_id).remove_query_params(
-                "page"
-            )
-        elif not is_reverse:
-            # Column is selected as a forward search. Link URL to reverse search.
-            linked_url = url.include_query_params(
-                order="-" + column_id
-            ).remove_query_params("page")
+            position = None
+            is_reverse = False
+            ordering = [column_id]
+            added_ordering = order_by + [column_id]
         else:
-            # Column is selected as a reverse search. Link URL to remove search.
-            linked_url = url.remove_query_params("order").remove_query_params("page")
+            position = sorted_columns.index(column_id)
+            is_reverse = order_by[position].startswith("-")
+            if not is_reverse:
+                # Column is selected as a forward search. Link URL to reverse search.
+                ordering = ["-" + column_id]
+                added_ordering = list(order_by)
+                added_ordering[position] = "-" + column_id
+            else:
+                # Column is selected as a reverse search. Link URL to remove search.
+                ordering = []
+                added_ordering = order_by[:position] + order_by[position + 1 :]
 
         control = ColumnControl(
             id=column_id,
             text=name,
-            url=linked_url,
-            is_forward_sorted=selected_column == column_id and not is_reverse,
-            is_reverse_sorted=selected_column == column_id and is_reverse,
+            url=get_ordered_url(url, ordering),
+            add_url=get_ordered_url(url, added_ordering),
+            sort_position=None if position is None else position + 1,
+            is_forward_sorted=position is not None and not is_reverse,
+            is_reverse_sorted=position is not None and is_reverse,
         )
         controls.append(control)
     return controls
@@ -22,15 +22,18 @@ def inclusive_range(st: int, en: int, cutoff: int) -> typing.List[int]:
     return list(range(st, en + 1))
 
 
+def parse_page_number(value: typing.Optional[str]) -> int:
+    try:
+        return int(value if value is not None else "1")
+    except (TypeError, ValueError):
+        return 1
+
+
 def get_page_number(url: URL) -> int:
     """
     Return a page number specified in the URL query parameters.
     """
-    query_params = QueryParams(url.query)
-    try:
-        return int(query_params.get("page", default="1"))
-    except (TypeError, ValueError):
-        return 1
+    return parse_page_number(QueryParams(url.query).get("page"))
 
 
 def get_page_controls(
@@ -142,3 +145,33 @@ def get_page_controls(
     controls.append(next)
 
     return controls
+
+
+def get_next_previous_controls(
+    url: URL, current_page: int, has_next: bool
+) -> typing.List[PageControl]:
+    """
+    Returns pagination controls for when the total number of pages isn't
+    known, with just the current page between 'Previous' and 'Next' links.
+    Previous [7] Next
+    """
+    assert current_page >= 1
+
+    if current_page == 1 and not has_next:
+        return []
+
+    if current_page == 1:
+        previous_url = None
+    elif current_page == 2:
+        previous_url = url.remove_query_params("page")
+    else:
+        previous_url = url.include_query_params(page=current_page - 1)
+    next_url = url.include_query_params(page=current_page + 1) if has_next else None
+
+    return [
+        PageControl(
+            text="Previous", url=previous_url, is_disabled=previous_url is None
+        ),
+        PageControl(text=str(current_page), is_active=True),
+        PageControl(text="Next", url=next_url, is_disabled=next_url is None),
+    ]
@@ -0,0 +1,234 @@
+import mmap
+import os
+import pickle
+import struct
+import threading
+import typing
+
+SNAPSHOT_HEADER = b"DASHSNAP1\n"
+RECORD_HEADER = struct.Struct(">I")
+
+
+def save_snapshot(items: typing.List[dict], path: str) -> None:
+    """
+    Atomically write a list of rows to a snapshot file.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(SNAPSHOT_HEADER)
+        pickle.dump(items, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path: str) -> typing.List[dict]:
+    """
+    Load a list of rows from a snapshot file.
+
+    The file is memory-mapped and decoded in a single call, without first
+    copying it into memory. Snapshots use pickle, so only load trusted files.
+    """
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[: len(SNAPSHOT_HEADER)] != SNAPSHOT_HEADER:
+                raise ValueError(f"{path!r} is not a snapshot file.")
+            view = memoryview(mapped)
+            try:
+                return pickle.loads(view[len(SNAPSHOT_HEADER) :])
+            finally:
+                view.release()
+
+
+def read_log(path: str) -> typing.Iterator[tuple]:
+    """
+    Yield the records in a write-ahead log file.
+    Any incomplete record at the end of the file is ignored.
+    """
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            (length,) = RECORD_HEADER.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            yield pickle.loads(data)
+
+
+def replay_log(
+    items: typing.List[dict], records: typing.Iterable[tuple], lookup_field: str
+) -> int:
+    """
+    Apply write-ahead log records to a list of rows, in place.
+    Returns the number of records applied.
+
+    Replaying is idempotent, so replaying records that are already included
+    in a snapshot is harmless.
+    """
+    index = {item[lookup_field]: item for item in items}
+    deleted: typing.Set[int] = set()
+    created = []
+    count = 0
+
+    for operation, key, values in records:
+        count += 1
+        if operation == "create":
+            item = index.get(values[lookup_field])
+            if item is not None and id(item) not in deleted:
+                item.clear()
+                item.update(values)
+            else:
+                created.append(values)
+                index[values[lookup_field]] = values
+        elif operation == "update":
+            item = index.get(key)
+            if item is not None and id(item) not in deleted:
+                item.update(values)
+                if item[lookup_field] != key:
+                    del index[key]
+                    index[item[lookup_field]] = item
+        elif operation == "delete":
+            item = index.pop(key, None)
+            if item is not None:
+                deleted.add(id(item))
+
+    # New rows are inserted at the start, matching `MockDataSource.create()`.
+    items[:0] = reversed(created)
+    if deleted:
+        items[:] = [item for item in items if id(item) not in deleted]
+    return count
+
+
+class SnapshotStore:
+    """
+    Persists the rows of a `MockDataSource`, as a snapshot file together with
+    an append-only write-ahead log of changes.
+
+    Once the log holds `compact_after` records, a new snapshot is written in a
+    background thread, so that restarts only need to replay recent changes.
+
+    Note that defaults such as `autoincrement()` restart on each run, so
+    persisted tables should use keys that won't clash with restored rows.
+
+    For example:
+
+    users = MockDataSource(schema=user, store=SnapshotStore("users.snapshot"))
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lookup_field: str = "pk",
+        compact_after: int = 10000,
+        fsync: bool = False,
+    ) -> None:
+        self.path = path
+        self.log_path = path + ".wal"
+        self.old_log_path = path + ".wal.old"
+        self.lookup_field = lookup_field
+        self.compact_after = compact_after
+        self.fsync = fsync
+        self.records = 0
+        self._file: typing.Optional[typing.BinaryIO] = None
+        self._lock = threading.Lock()
+        self._compaction: typing.Optional[threading.Thread] = None
+
+    def check_key(self, values: dict) -> None:
+        """
+        Rows are identified by `lookup_field` in the log, so every persisted
+        row needs a value for it.
+        """
+        if values.get(self.lookup_field) is None:
+            raise ValueError(f"Persisted rows must include {self.lookup_field!r}.")
+
+    def exists(self) -> bool:
+        return any(
+            os.path.exists(path)
+            for path in (self.path, self.old_log_path, self.log_path)
+        )
+
+    def load(self) -> typing.List[dict]:
+        """
+        Load the rows from the latest snapshot, and replay any logged changes.
+        """
+        items = load_snapshot(self.path) if os.path.exists(self.path) else []
+        if os.path.exists(self.old_log_path):
+            # A previous compaction did not complete.
+            replay_log(items, read_log(self.old_log_path), self.lookup_field)
+        if os.path.exists(self.log_path):
+            self.records = replay_log(items, read_log(self.log_path), self.lookup_field)
+        return items
+
+    def append(self, operation: str, key: typing.Any, values: typing.Any) -> None:
+        """
+        Record a "create", "update" or "delete" operation in the log.
+        """
+        data = pickle.dumps((operation, key, values), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.log_path, "ab")
+            self._file.write(RECORD_HEADER.pack(len(data)) + data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records += 1
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.records >= self.compact_after and not self.is_compacting
+
+    @property
+    def is_compacting(self) -> bool:
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def compact(self, items: typing.List[dict], background: bool = True) -> None:
+        """
+        Write a new snapshot of the given rows, and discard the log records
+        that it includes.
+
+        The rows are serialized in the background, so neither the list nor
+        the rows in it may be modified afterwards. `MockDataSource` passes a
+        published version of its rows, which is never modified.
+        """
+        with self._lock:
+            if self.is_compacting:
+                return
+
+            # Start a new log file. Changes made from now on are not part of
+            # the new snapshot.
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.log_path):
+                if os.path.exists(self.old_log_path):
+                    with open(self.old_log_path, "ab") as old_log:
+                        with open(self.log_path, "rb") as log:
+                            old_log.write(log.read())
+                    os.remove(self.log_path)
+                else:
+                    os.replace(self.log_path, self.old_log_path)
+            self.records = 0
+
+        def write_snapshot() -> None:
+            save_snapshot([dict(item) for item in items], self.path)
+            if os.path.exists(self.old_log_path):
+                os.remove(self.old_log_path)
+
+        if background:
+            self._compaction = threading.Thread(target=write_snapshot, daemon=True)
+            self._compaction.start()
+        else:
+            write_snapshot()
+
+    def close(self) -> None:
+        """
+        Wait for any compaction to complete, and close the log file.
+        """
+        if self._compaction is not None:
+            self._compaction.join()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,182 @@
+import dataclasses
+import typing
+from urllib.parse import urlencode
+
+import typesystem
+from starlette.datastructures import URL, QueryParams
+
+from .filtering import FILTER_PREFIX, format_value, parse_filters
+from .ordering import parse_ordering
+from .pagination import parse_page_number
+
+# The query parameters that make up the state of a table view.
+TABLE_PARAMS = ("search", "order", "page")
+
+
+@dataclasses.dataclass(frozen=True)
+class TableQuery:
+    """
+    The validated state of a table view, parsed once from the URL query string.
+
+    Queries are immutable and hashable, so they can be used as cache keys.
+    Two URLs that select the same rows give equal queries, whatever the order
+    or the spelling of their parameters.
+
+    `include_query_params()` and `remove_query_params()` mirror the methods on
+    `URL`, so that a query can be used in place of a URL when building links.
+    Each returns a new query, and only the changed parts of the query string
+    are encoded again when it is rendered.
+
+    For example:
+
+    query = TableQuery.from_url(request.url, columns=columns)
+    next_page = query.include_query_params(page=query.page + 1)
+    """
+
+    path: str
+    page: int = 1
+    order: typing.Tuple[str, ...] = ()
+    search: typing.Optional[str] = None
+    filters: typing.Tuple[typing.Tuple[str, typing.Any], ...] = ()
+    params: typing.Tuple[typing.Tuple[str, str], ...] = ()
+    filter_fields: typing.Dict[str, typesystem.Field] = dataclasses.field(
+        default_factory=dict, compare=False, repr=False
+    )
+    _encoded: typing.Dict[str, str] = dataclasses.field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+    @classmethod
+    def from_url(
+        cls,
+        url: URL,
+        columns: typing.Container[str] = (),
+        filter_fields: typing.Dict[str, typesystem.Field] = None,
+    ) -> "TableQuery":
+        """
+        Parse the table state from a URL. Invalid values are ignored.
+        Any other query parameters are preserved in links.
+        """
+        filter_fields = {} if filter_fields is None else filter_fields
+        query_params = QueryParams(url.query)
+        filters = parse_filters(query_params, filter_fields)
+        search = query_params.get("search")
+        return cls(
+            path=url.path,
+            page=max(parse_page_number(query_params.get("page")), 1),
+            order=tuple(parse_ordering(query_params.get("order"), columns)),
+            search=search or None,
+            filters=tuple(
+                (key, filters[key]) for key in filter_fields if key in filters
+            ),
+            params=tuple(
+                (key, value)
+                for key, value in query_params.multi_items()
+                if key not in TABLE_PARAMS and not key.startswith(FILTER_PREFIX)
+            ),
+            filter_fields=filter_fields,
+        )
+
+    @property
+    def filter_values(self) -> typing.Dict[str, typing.Any]:
+        return dict(self.filters)
+
+    def replace(self, **changes: typing.Any) -> "TableQuery":
+        """
+        Return a copy of the query with some parts changed, reusing the
+        encoded form of the unchanged parts.
+        """
+        encoded = {
+            key: value for key, value in self._encoded.items() if key not in changes
+        }
+        return dataclasses.replace(self, _encoded=encoded, **changes)
+
+    def include_query_params(self, **kwargs: typing.Any) -> "TableQuery":
+        changes: typing.Dict[str, typing.Any] = {}
+        filters = dict(self.filters)
+        params = list(self.params)
+        for key, value in kwargs.items():
+            if key == "page":
+                changes["page"] = max(int(value), 1)
+            elif key == "order":
+                changes["order"] = tuple(str(value).split(",")) if value else ()
+            elif key == "search":
+                changes["search"] = str(value) or None
+            elif key.startswith(FILTER_PREFIX):
+                field_id = key[len(FILTER_PREFIX) :]
+                field = self.filter_fields.get(field_id)
+                filters[field_id] = value if field is None else field.validate(value)
+                changes["filters"] = self._ordered_filters(filters)
+            else:
+                params = [param for param in params if param[0] != key]
+                params.append((key, str(value)))
+                changes["params"] = tuple(params)
+        return self.replace(**changes)
+
+    def remove_query_params(
+        self, keys: typing.Union[str, typing.Sequence[str]]
+    ) -> "TableQuery":
+        if isinstance(keys, str):
+            keys = [keys]
+        changes: typing.Dict[str, typing.Any] = {}
+        filters = dict(self.filters)
+        for key in keys:
+            if key == "page":
+                changes["page"] = 1
+            elif key == "order":
+                changes["order"] = ()
+            elif key == "search":
+                changes["search"] = None
+            elif key.startswith(FILTER_PREFIX):
+                filters.pop(key[len(FILTER_PREFIX) :], None)
+                changes["filters"] = self._ordered_filters(filters)
+            else:
+                changes["params"] = tuple(
+                    param for param in self.params if param[0] != key
+                )
+        return self.replace(**changes)
+
+    def _ordered_filters(
+        self, filters: typing.Dict[str, typing.Any]
+    ) -> typing.Tuple[typing.Tuple[str, typing.Any], ...]:
+        order = list(self.filter_fields)
+        return tuple(
+            sorted(
+                filters.items(),
+                key=lambda item: (
+                    order.index(item[0]) if item[0] in order else len(order),
+                    item[0],
+                ),
+            )
+        )
+
+    def _encode(self, part: str) -> str:
+        encoded = self._encoded.get(part)
+        if encoded is None:
+            if part == "params":
+                encoded = urlencode(self.params)
+            elif part == "search":
+                encoded = urlencode({"search": self.search}) if self.search else ""
+            elif part == "filters":
+                encoded = urlencode(
+                    [
+                        (FILTER_PREFIX + key, format_value(value))
+                        for key, value in self.filters
+                    ]
+                )
+            elif part == "order":
+                encoded = urlencode({"order": ",".join(self.order)})
+                encoded = encoded if self.order else ""
+            else:
+                encoded = f"page={self.page}" if self.page > 1 else ""
+            self._encoded[part] = encoded
+        return encoded
+
+    @property
+    def query(self) -> str:
+        parts = [self._encode(part) for part in ("params", "filters") + TABLE_PARAMS]
+        return "&".join(part for part in parts if part)
+
+    def __str__(self) -> str:
+        query = self.query
+        return f"{self.path}?{query}" if query else self.path
@@ -0,0 +1,86 @@
+import asyncio
+import typing
+from dataclasses import dataclass
+
+from starlette.requests import Request
+
+from .scanning import IN_LOOKUP
+
+
+@dataclass(frozen=True)
+class Link:
+    text: str
+    url: str
+
+
+# The links for each relationship column, keyed by the related row's key.
+Links = typing.Dict[str, typing.Dict[typing.Any, Link]]
+
+
+class RelationLoader:
+    """
+    Loads the rows referenced by the relationship columns of a table.
+
+    Keys are collected across a whole page of rows, and then each related
+    table is queried once, using `filter(<lookup field>__in=[...])`, rather
+    than once per row. Loaded rows are memoized for the rest of the request.
+
+    For example:
+
+    loader = RelationLoader(request)
+    links = await loader.resolve({"owner": users_table}, rows)
+    """
+
+    def __init__(self, request: Request) -> None:
+        self.request = request
+        self._loaded: typing.Dict[str, typing.Dict[typing.Any, typing.Any]] = {}
+
+    async def load(
+        self, table: typing.Any, keys: typing.Iterable[typing.Any]
+    ) -> typing.Dict[typing.Any, typing.Any]:
+        """
+        Return the rows of `table` with the given keys. Missing rows are left
+        out of the result.
+        """
+        loaded = self._loaded.setdefault(table.tablename, {})
+        keys = list(dict.fromkeys(key for key in keys if key is not None))
+        missing = [key for key in keys if key not in loaded]
+        if missing:
+            lookup = table.LOOKUP_FIELD + IN_LOOKUP
+            items = await table.datasource.filter(**{lookup: missing}).all()
+            loaded.update(dict.fromkeys(missing))
+            for item in items:
+                loaded[getattr(item, table.LOOKUP_FIELD)] = item
+        return {key: loaded[key] for key in keys if loaded.get(key) is not None}
+
+    async def resolve(
+        self, relations: typing.Dict[str, typing.Any], rows: typing.Sequence
+    ) -> Links:
+        """
+        Return the links for the relationship columns of `rows`.
+        """
+        # Columns that refer to the same table share a single query.
+        keys: typing.Dict[typing.Any, typing.List[typing.Any]] = {}
+        for field, table in relations.items():
+            keys.setdefault(table, []).extend(getattr(row, field) for row in rows)
+
+        tables = list(keys)
+        results = await asyncio.gather(
+            *[self.load(table, keys[table]) for table in tables]
+        )
+        loaded = dict(zip(tables, results))
+
+        links: Links = {}
+        for field, table in relations.items():
+            links[field] = {
+                key: self.link(table, item) for key, item in loaded[table].items()
+            }
+        return links
+
+    def link(self, table: typing.Any, item: typing.Any) -> Link:
+        key = getattr(item, table.LOOKUP_FIELD)
+        text = getattr(item, table.DISPLAY_FIELD or table.LOOKUP_FIELD)
+        url = self.request.url_for(
+            "dashboard:detail", tablename=table.tablename, ident=key
+        )
+        return Link(text=str(text), url=url)
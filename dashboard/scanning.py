@@ -0,0 +1,199 @@
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import os
+import sys
+import typing
+from collections import Counter
+
+from . import search
+
+T = typing.TypeVar("T")
+
+# Filters on a key with this suffix match any of a collection of values,
+# for example `filter(pk__in=[1, 2, 3])`.
+IN_LOOKUP = "__in"
+
+# Scans over fewer rows than this run inline on the event loop.
+PARALLEL_SCAN_THRESHOLD = 10000
+
+
+def is_free_threaded() -> bool:
+    """
+    Return `True` if running on a free-threaded build, with the GIL disabled.
+    """
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def create_executor(max_workers: int = None) -> concurrent.futures.Executor:
+    """
+    Return an executor suitable for parallel scans.
+
+    Threads can only scan in parallel on free-threaded builds. Otherwise we
+    use a process pool, which has to copy each partition to a worker process.
+    """
+    if is_free_threaded():
+        return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+
+def filter_items(
+    items: typing.List[dict],
+    filter_kwargs: typing.Optional[dict],
+    search_term: typing.Optional[str],
+) -> typing.List[dict]:
+    """
+    Return the items matching all of the filters and the search term.
+    """
+    matches = get_matcher(filter_kwargs, search_term)
+    return [item for item in items if matches(item)]
+
+
+def count_values(
+    items: typing.List[dict], fields: typing.Sequence[str]
+) -> typing.Dict[str, typing.Dict[typing.Any, int]]:
+    """
+    Return the number of items with each value of each of the given fields.
+    """
+    counters: typing.Dict[str, Counter] = {field: Counter() for field in fields}
+    for item in items:
+        for field, counter in counters.items():
+            counter[item.get(field)] += 1
+    return {field: dict(counter) for field, counter in counters.items()}
+
+
+def match_partition(
+    items: typing.List[dict],
+    filter_kwargs: typing.Optional[dict],
+    search_term: typing.Optional[str],
+) -> typing.List[int]:
+    """
+    Return the positions of the items matching all of the filters and the
+    search term. Runs in a worker, so only the positions are sent back.
+    """
+    matches = get_matcher(filter_kwargs, search_term)
+    return [index for index, item in enumerate(items) if matches(item)]
+
+
+def get_matcher(
+    filter_kwargs: typing.Optional[dict], search_term: typing.Optional[str]
+) -> typing.Callable[[dict], bool]:
+    """
+    Return a function that tests whether an item matches all of the filters
+    and the search term.
+    """
+    filters = []
+    choices = []
+    for key, value in (filter_kwargs or {}).items():
+        if key.endswith(IN_LOOKUP):
+            choices.append((key[: -len(IN_LOOKUP)], frozenset(value)))
+        else:
+            filters.append((key, value))
+    search_term = search_term.lower() if search_term else None
+
+    def matches(item: dict) -> bool:
+        if not all(item[key] == value for key, value in filters):
+            return False
+        if not all(item[key] in values for key, values in choices):
+            return False
+        return not search_term or search.item_matches_search(item, search_term)
+
+    return matches
+
+
+async def find_first(
+    items: typing.Sequence[dict],
+    limit: int,
+    filter_kwargs: typing.Optional[dict],
+    search_term: typing.Optional[str],
+    batch_size: int = 1000,
+) -> typing.List[dict]:
+    """
+    Return the first `limit` matching items, in order.
+
+    The scan stops as soon as enough matches are found. It runs on the event
+    loop, returning control after each batch, so that a cancelled search
+    stops scanning at once.
+    """
+    matches = get_matcher(filter_kwargs, search_term)
+    found: typing.List[dict] = []
+    for start in range(0, len(items), batch_size):
+        for item in itertools.islice(items, start, start + batch_size):
+            if matches(item):
+                found.append(item)
+                if len(found) >= limit:
+                    return found
+        await asyncio.sleep(0)
+    return found
+
+
+async def run(
+    func: typing.Callable[..., T],
+    items: typing.List[dict],
+    *args: typing.Any,
+    threshold: int = PARALLEL_SCAN_THRESHOLD,
+    **kwargs: typing.Any,
+) -> T:
+    """
+    Call `func(items, ...)`, in a background thread if there are `threshold`
+    or more items, so that large lists don't block the event loop.
+    """
+    if len(items) < threshold:
+        return func(items, *args, **kwargs)
+    # Imported here, as the thread pool is only needed for large lists.
+    from starlette.concurrency import run_in_threadpool
+
+    return await run_in_threadpool(func, items, *args, **kwargs)
+
+
+async def scan(
+    items: typing.List[dict],
+    filter_kwargs: typing.Optional[dict],
+    search_term: typing.Optional[str],
+    executor: concurrent.futures.Executor = None,
+    threshold: int = PARALLEL_SCAN_THRESHOLD,
+    partitions: int = None,
+) -> typing.List[dict]:
+    """
+    Filter a list of items, without blocking the event loop on large lists.
+
+    Small lists are filtered inline. Large lists are split into partitions
+    that are filtered in parallel using `executor`, with the results merged
+    back in order. Without an executor, large scans run in a single
+    background thread.
+    """
+    if filter_kwargs is None and search_term is None:
+        return items
+
+    if executor is None or len(items) < threshold:
+        return await run(
+            filter_items, items, filter_kwargs, search_term, threshold=threshold
+        )
+
+    if partitions is None:
+        partitions = getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+    size = -(-len(items) // partitions)
+    starts = range(0, len(items), size)
+
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *[
+            loop.run_in_executor(
+                executor,
+                functools.partial(
+                    match_partition,
+                    items[start : start + size],
+                    filter_kwargs,
+                    search_term,
+                ),
+            )
+            for start in starts
+        ]
+    )
+    return [
+        items[start + index]
+        for start, indexes in zip(starts, results)
+        for index in indexes
+    ]
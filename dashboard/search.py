@@ -1,9 +1,13 @@
 import typing
 
-from starlette.datastructures import URL, QueryParams
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from starlette.datastructures import URL
 
 
-def get_search_term(url: URL) -> typing.Optional[str]:
+def get_search_term(url: "URL") -> typing.Optional[str]:
+    # Imported here, so that datasources can search without loading Starlette.
+    from starlette.datastructures import QueryParams
+
     return QueryParams(url.query).get("search")
 
 
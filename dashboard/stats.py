@@ -0,0 +1,200 @@
+import hashlib
+import math
+import sys
+import typing
+from collections import Counter
+from dataclasses import dataclass
+
+# The number of most common values shown for each column.
+TOP_VALUES = 5
+
+# Exact value counts are kept for columns with up to this many distinct
+# values. Beyond that only the HyperLogLog estimate of distinct values is kept.
+MAX_TRACKED_VALUES = 1000
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added, in constant memory.
+
+    With the default precision of 12 there are 4096 one-byte registers, and
+    the standard error of the estimate is around 1.6%.
+    """
+
+    def __init__(self, precision: int = 12) -> None:
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: typing.Any) -> None:
+        digest = hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        bits = 64 - self.precision
+        index = hashed >> bits
+        # The rank is the position of the first set bit in the remaining bits.
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0**-rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Small cardinalities are estimated better by linear counting.
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+
+@dataclass(frozen=True)
+class ColumnSummary:
+    """
+    Summary statistics for a column. `count` is the number of non-null values,
+    and `distinct` is an estimate if `distinct_is_exact` is false. `top` holds
+    the most common values and their counts, when they are known.
+    """
+
+    count: int
+    nulls: int
+    min: typing.Any
+    max: typing.Any
+    distinct: int
+    distinct_is_exact: bool
+    top: typing.Tuple[typing.Tuple[typing.Any, int], ...]
+
+
+class ColumnStats:
+    """
+    Incrementally maintained statistics for the values of a column.
+
+    Adding values keeps every statistic up to date. Removing values keeps the
+    counts up to date, but removing the minimum or maximum leaves it out of
+    date, in which case the column is marked as `stale`, to be rebuilt from
+    the rows the next time it is read.
+
+    The distinct estimate for columns with too many values to track can't
+    forget removed values, so after removals it may overcount, though never
+    beyond the number of values.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.nulls = 0
+        self.min: typing.Any = None
+        self.max: typing.Any = None
+        self.values: typing.Optional[Counter] = Counter()
+        self.distinct = HyperLogLog()
+        self.stale = False
+
+    def add(self, value: typing.Any) -> None:
+        if value is None:
+            self.nulls += 1
+            return
+        if self.count == 0:
+            self.min = self.max = value
+        else:
+            try:
+                self.min = min(self.min, value)
+                self.max = max(self.max, value)
+            except TypeError:
+                self.min = self.max = None
+        self.count += 1
+        self.distinct.add(value)
+        if self.values is not None:
+            self.values[value] += 1
+            if len(self.values) > MAX_TRACKED_VALUES:
+                self.values = None
+
+    def remove(self, value: typing.Any) -> None:
+        if value is None:
+            self.nulls -= 1
+            return
+        self.count -= 1
+        if self.values is not None:
+            self.values[value] -= 1
+            if not self.values[value]:
+                del self.values[value]
+        # The old minimum or maximum may have been the value removed.
+        if value == self.min or value == self.max:
+            self.stale = True
+
+    def summary(self) -> ColumnSummary:
+        top: typing.Tuple[typing.Tuple[typing.Any, int], ...] = ()
+        if self.values is not None:
+            distinct = len(self.values)
+            top = tuple(self.values.most_common(TOP_VALUES))
+        else:
+            distinct = min(self.distinct.count(), self.count)
+        return ColumnSummary(
+            count=self.count,
+            nulls=self.nulls,
+            min=self.min,
+            max=self.max,
+            distinct=distinct,
+            distinct_is_exact=self.values is not None,
+            top=top,
+        )
+
+
+class TableStats:
+    """
+    Statistics for each column of a table.
+
+    For example:
+
+    stats = TableStats(schema.fields, rows)
+    stats.update(old_row, new_row)
+    summaries = stats.summarize(rows)
+    """
+
+    def __init__(
+        self, fields: typing.Iterable[str], rows: typing.Iterable[dict] = ()
+    ) -> None:
+        self.columns = {field: ColumnStats() for field in fields}
+        for row in rows:
+            self.add(row)
+
+    def add(self, row: dict) -> None:
+        for field, column in self.columns.items():
+            column.add(row.get(field))
+
+    def remove(self, row: dict) -> None:
+        for field, column in self.columns.items():
+            column.remove(row.get(field))
+
+    def update(self, old: dict, new: dict) -> None:
+        for field, column in self.columns.items():
+            if old.get(field) != new.get(field):
+                column.remove(old.get(field))
+                column.add(new.get(field))
+
+    def stale_fields(self) -> typing.List[str]:
+        """
+        Return the fields whose columns need to be rebuilt from the rows.
+        """
+        return [field for field, column in self.columns.items() if column.stale]
+
+    def memory_size(self) -> int:
+        """
+        Return the approximate size of the statistics in bytes.
+        """
+        size = 0
+        for column in self.columns.values():
+            size += sys.getsizeof(column.distinct.registers)
+            if column.values is not None:
+                size += sys.getsizeof(column.values)
+        return size
+
+    def summarize(
+        self, rows: typing.Sequence[dict] = ()
+    ) -> typing.Dict[str, ColumnSummary]:
+        """
+        Return a summary of each column, first rebuilding any stale columns
+        from `rows`.
+        """
+        for field, column in self.columns.items():
+            if column.stale:
+                column = self.columns[field] = ColumnStats()
+                for row in rows:
+                    column.add(row.get(field))
+        return {field: column.summary() for field, column in self.columns.items()}
@@ -0,0 +1,127 @@
+import asyncio
+import typing
+
+import jinja2
+from starlette.responses import StreamingResponse
+
+# Marks the end of a rendered template, in the chunk queue.
+DONE = object()
+
+
+class RowStream:
+    """
+    The rows on a page of a table, for rendering with an async template.
+
+    The rows are given either as a list, or as the batches yielded by a
+    datasource's `iterate()`, which are read as the template reaches them.
+    Iterating yields the rows one by one. After each batch, control returns
+    to the event loop, so that the rendered rows can be sent while the next
+    batch is read and rendered.
+
+    Call `start()` to read the first batch, before rendering. Each batch is
+    passed to `on_batch`, if given, before any of its rows are yielded.
+    """
+
+    def __init__(
+        self,
+        rows: typing.Union[typing.List[typing.Any], typing.AsyncIterable[list]],
+        batch_size: int,
+        on_batch: typing.Callable[[list], typing.Awaitable[None]] = None,
+        timeout: float = None,
+    ) -> None:
+        if isinstance(rows, list):
+            rows = iter_batches(rows, batch_size)
+        self.batches = rows.__aiter__()
+        self.on_batch = on_batch
+        self.timeout = timeout
+        self.first: typing.List[typing.Any] = []
+
+    async def start(self) -> None:
+        self.first = await self.next_batch()
+
+    async def next_batch(self) -> typing.List[typing.Any]:
+        try:
+            batch = await asyncio.wait_for(self.batches.__anext__(), self.timeout)
+        except StopAsyncIteration:
+            return []
+        if self.on_batch is not None:
+            await self.on_batch(batch)
+        return batch
+
+    def __bool__(self) -> bool:
+        return bool(self.first)
+
+    async def __aiter__(self) -> typing.AsyncIterator[typing.Any]:
+        batch = self.first
+        while batch:
+            for row in batch:
+                yield row
+            await asyncio.sleep(0)
+            batch = await self.next_batch()
+
+
+async def iter_batches(
+    rows: typing.List[typing.Any], batch_size: int
+) -> typing.AsyncIterator[typing.List[typing.Any]]:
+    for start in range(0, len(rows), batch_size):
+        yield rows[start : start + batch_size]
+
+
+async def render_chunks(
+    template: jinja2.Template, context: dict
+) -> typing.AsyncIterator[str]:
+    """
+    Render an async template, yielding the output in chunks.
+
+    Rendering runs as a separate task. Whenever the template has to wait, for
+    example for the rows of a table, everything rendered so far is sent as a
+    single chunk, rather than one chunk for each piece of template output.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def render() -> None:
+        try:
+            async for output in template.generate_async(context):
+                queue.put_nowait(output)
+        except Exception as exc:
+            queue.put_nowait(exc)
+        else:
+            queue.put_nowait(DONE)
+
+    task = asyncio.ensure_future(render())
+    try:
+        while True:
+            outputs = [await queue.get()]
+            while not queue.empty():
+                outputs.append(queue.get_nowait())
+            end = outputs[-1]
+            if end is DONE or isinstance(end, Exception):
+                outputs.pop()
+            if outputs:
+                yield "".join(outputs)
+            if isinstance(end, Exception):
+                raise end
+            if end is DONE:
+                return
+    finally:
+        task.cancel()
+
+
+class TemplateStreamingResponse(StreamingResponse):
+    """
+    A response that streams a template, rendered with an async environment.
+    """
+
+    def __init__(
+        self,
+        template: jinja2.Template,
+        context: dict,
+        status_code: int = 200,
+        headers: dict = None,
+    ) -> None:
+        super().__init__(
+            render_chunks(template, context),
+            status_code=status_code,
+            headers=headers,
+            media_type="text/html",
+        )
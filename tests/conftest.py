@@ -0,0 +1,149 @@
+import asyncio
+import collections
+
+import pytest
+import typesystem
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+import dashboard
+
+Call = collections.namedtuple("Call", ["operation", "filter", "offset", "timeouts"])
+
+
+class RecordingDataSource(dashboard.MockDataSource):
+    """
+    A mock datasource that records each query, and that can hold queries
+    until a gate is opened, slow them down, or fail them.
+
+    Queries wait for any delay in `delays`, then for any gate in `gates`,
+    and then raise any exception in `errors`, each keyed by the operation.
+    Iterating waits for the "iterate" gate before each batch after the
+    first `ungated` batches.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+        self.delays = {}
+        self.gates = {}
+        self.errors = {}
+        self.timeouts = ()
+        self.ungated = 0
+
+    def _copy(self, **kwargs):
+        copy = super()._copy(**kwargs)
+        copy.calls = self.calls
+        copy.delays = self.delays
+        copy.gates = self.gates
+        copy.errors = self.errors
+        copy.timeouts = self.timeouts
+        copy.ungated = self.ungated
+        return copy
+
+    def timeout(self, seconds):
+        copy = self._copy()
+        copy.timeouts = self.timeouts + (seconds,)
+        return copy
+
+    def recorded(self, field="operation", operation=None):
+        """
+        Return a field of each recorded call, optionally of one operation.
+        """
+        return [
+            getattr(call, field)
+            for call in self.calls
+            if operation is None or call.operation == operation
+        ]
+
+    async def _record(self, operation):
+        call = Call(operation, self._filter_kwargs, self._offset, self.timeouts)
+        self.calls.append(call)
+        await asyncio.sleep(self.delays.get(operation, 0))
+        gate = self.gates.get(operation)
+        if gate is not None:
+            await gate.wait()
+        if operation in self.errors:
+            raise self.errors[operation]
+
+    async def all(self):
+        await self._record("all")
+        return await super().all()
+
+    async def count(self):
+        await self._record("count")
+        return await super().count()
+
+    async def get(self):
+        await self._record("get")
+        return await super().get()
+
+    async def facets(self, *fields):
+        await self._record("facets")
+        return await super().facets(*fields)
+
+    async def suggest(self, search_term, limit=10):
+        await self._record("suggest")
+        return await super().suggest(search_term, limit=limit)
+
+    async def iterate(self, *args, **kwargs):
+        self.calls.append(
+            Call("iterate", self._filter_kwargs, self._offset, self.timeouts)
+        )
+        batches = 0
+        async for batch in super().iterate(*args, **kwargs):
+            gate = self.gates.get("iterate")
+            if gate is not None and batches >= self.ungated:
+                await gate.wait()
+            batches += 1
+            yield batch
+
+
+@pytest.fixture
+def make_users():
+    """
+    Return a factory for recording datasources of `count` users.
+    """
+
+    def make_users(count=25):
+        schema = typesystem.Schema(
+            fields={
+                "pk": typesystem.Integer(
+                    title="Identity", read_only=True, default=dashboard.autoincrement()
+                ),
+                "username": typesystem.String(title="Username", max_length=100),
+                "is_admin": typesystem.Boolean(title="Is Admin", default=False),
+            }
+        )
+        initial = [
+            {"username": f"user{i}", "is_admin": i % 2 == 0} for i in range(count)
+        ]
+        return RecordingDataSource(schema=schema, initial=initial)
+
+    return make_users
+
+
+@pytest.fixture
+def users(make_users):
+    return make_users()
+
+
+@pytest.fixture
+def make_client():
+    """
+    Return a factory for test clients of a dashboard with the given tables.
+    """
+
+    def make_client(*tables):
+        app = Starlette(
+            routes=[
+                Mount(
+                    "/admin", dashboard.Dashboard(tables=list(tables)), name="dashboard"
+                ),
+                Mount("/statics", ..., name="static"),
+            ]
+        )
+        return TestClient(app)
+
+    return make_client
@@ -0,0 +1,393 @@
+import asyncio
+import threading
+
+import pytest
+
+from dashboard.cache import (
+    MISSING,
+    CachedDataItem,
+    CachedDataSource,
+    MemoryCache,
+    SQLiteCache,
+    StoredItem,
+    call,
+    freeze,
+    get_generation,
+)
+
+
+@pytest.fixture
+def source(make_users):
+    return make_users(10)
+
+
+def test_memory_cache_lru_eviction():
+    cache = MemoryCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_memory_cache_ttl_expiry():
+    cache = MemoryCache(ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_memory_cache_clear():
+    cache = MemoryCache()
+    cache.set("a", 1)
+    cache.clear()
+    assert cache.get("a") is MISSING
+    assert cache.generation == 1
+
+
+def test_memory_cache_discards_stale_generations():
+    cache = MemoryCache()
+    generation = cache.generation
+    cache.clear()
+    cache.set("a", 1, generation=generation)
+    assert cache.get("a") is MISSING
+    cache.set("a", 2, generation=cache.generation)
+    assert cache.get("a") == 2
+
+
+def test_derived_caches(tmp_path):
+    cache = MemoryCache().derive("rows", max_size=5, ttl=1.0)
+    assert isinstance(cache, MemoryCache)
+    assert (cache.max_size, cache.ttl) == (5, 1.0)
+
+    # Derived SQLite caches are cleared separately, in the same file.
+    path = str(tmp_path / "cache.db")
+    parent = SQLiteCache(path, namespace="users")
+    cache = parent.derive("rows", max_size=5, ttl=1.0)
+    assert (cache.path, cache.namespace) == (path, "users/rows")
+    cache.set("a", 1)
+    parent.clear()
+    assert cache.get("a") == 1
+
+
+def test_sqlite_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, namespace="users")
+    cache.set(("count", ("search", "a")), 10)
+    cache.set("page", [{"pk": 1}])
+    assert cache.get(("count", ("search", "a"))) == 10
+    assert cache.get("page") == [{"pk": 1}]
+    assert cache.get("missing") is MISSING
+    assert len(cache) == 2
+
+    # Workers share entries through the file, and an invalidation in any
+    # worker applies to all of them.
+    other_worker = SQLiteCache(path, namespace="users")
+    assert other_worker.get("page") == [{"pk": 1}]
+    generation = cache.generation
+    other_worker.clear()
+    assert cache.generation == generation + 1
+    assert cache.get("page") is MISSING
+    assert len(cache) == 0
+
+    # Values computed before the invalidation are discarded.
+    cache.set("page", [], generation=generation)
+    assert cache.get("page") is MISSING
+
+    # Namespaces are invalidated independently.
+    other_table = SQLiteCache(path, namespace="orders")
+    other_table.set("count", 3)
+    cache.clear()
+    assert other_table.get("count") == 3
+
+
+def test_sqlite_cache_eviction_and_expiry(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is MISSING
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+    expired = SQLiteCache(str(tmp_path / "cache.db"), ttl=0)
+    expired.set("d", 4)
+    assert expired.get("d") is MISSING
+
+    # Eviction reads the entries in expiry order from an index.
+    plan = cache._connection.execute(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM entries WHERE namespace = ? "
+        "ORDER BY expires LIMIT 1",
+        ("",),
+    ).fetchall()
+    assert "TEMP B-TREE" not in str(plan)
+
+
+def test_cache_calls(tmp_path):
+    async def main():
+        memory = MemoryCache()
+        await call(memory, memory.set, "a", 1)
+        assert memory.get("a") == 1
+
+        # Blocking caches are called in a thread.
+        sqlite = SQLiteCache(str(tmp_path / "cache.db"))
+        thread = await call(sqlite, lambda: threading.get_ident())
+        assert thread != threading.get_ident()
+        await call(
+            sqlite, sqlite.set, "a", 1, await call(sqlite, get_generation, sqlite)
+        )
+        assert await call(sqlite, sqlite.get, "a") == 1
+
+    asyncio.run(main())
+
+
+def test_freeze():
+    assert freeze([1, [2, 3]]) == (1, (2, 3))
+    assert freeze({"b": 1, "a": [2]}) == (("a", (2,)), ("b", 1))
+    assert freeze("value") == "value"
+
+
+def test_cached_queries(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        first = await cached.order_by("username").offset(0).limit(3).all()
+        second = await cached.limit(3).offset(0).order_by("username").all()
+        assert [item.username for item in first] == [
+            "user0",
+            "user1",
+            "user2",
+        ]
+        assert first == second
+        assert first is not second
+        assert source.recorded() == ["all"]
+
+        # Modifying a result doesn't affect the cached copy.
+        first.clear()
+        assert len(await cached.order_by("username").offset(0).limit(3).all()) == 3
+        assert source.recorded() == ["all"]
+
+        assert await cached.search("user1").count() == 1
+        assert await cached.search("user1").count() == 1
+        assert source.recorded() == ["all", "count"]
+
+        facets = await cached.facets("username")
+        assert facets["username"]["user1"] == 1
+        assert await cached.facets("username") is facets
+        assert await cached.facets("username", "pk") is not facets
+
+        item = await cached.get(pk=3)
+        assert item.username == "user3"
+        assert await cached.filter(pk=3).get() is item
+        assert await cached.get(pk=1000) is None
+
+    asyncio.run(main())
+
+
+def test_concurrent_queries_are_deduplicated(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        results = await asyncio.gather(*[cached.search("user").all() for _ in range(5)])
+        assert all(result == results[0] for result in results)
+        assert source.recorded() == ["all"]
+
+    asyncio.run(main())
+
+
+def test_writes_invalidate_cache(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        assert await cached.count() == 10
+        await cached.create(username="new")
+        assert await cached.count() == 11
+
+        item = await cached.get(pk=0)
+        await item.update(username="updated")
+        assert item.username == "updated"
+        assert await cached.search("updated").count() == 1
+
+        await item.delete()
+        assert await cached.count() == 10
+        assert await cached.search("updated").count() == 0
+
+    asyncio.run(main())
+
+
+def test_writes_by_key_invalidate_cache(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        assert await cached.search("updated").count() == 0
+        assert await cached.update_by_key(1, {"username": "updated"}) == 1
+        assert await cached.search("updated").count() == 1
+        assert await cached.delete_by_key(1) == 1
+        assert await cached.delete_by_key(1) == 0
+        assert await cached.count() == 9
+
+    asyncio.run(main())
+
+
+def test_write_during_fetch_is_not_cached(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        gate = source.gates["count"] = asyncio.Event()
+        task = asyncio.ensure_future(cached.count())
+        await asyncio.sleep(0)
+        await cached.create(username="new")
+        gate.set()
+        await task
+        assert len(cached._cache) == 0
+        assert await cached.count() == 11
+
+    asyncio.run(main())
+
+
+def test_errors_are_shared_and_not_cached(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        gate = source.gates["all"] = asyncio.Event()
+        source.errors["all"] = RuntimeError()
+        tasks = [asyncio.ensure_future(cached.all()) for _ in range(2)]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert source.recorded() == ["all"]
+
+        results = await asyncio.gather(cached.all(), return_exceptions=True)
+        assert source.recorded() == ["all"] * 2
+
+    asyncio.run(main())
+
+
+def test_cancelled_fetch_is_retried_by_waiters(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        gate = source.gates["all"] = asyncio.Event()
+        first = asyncio.ensure_future(cached.all())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cached.all())
+        await asyncio.sleep(0)
+        first.cancel()
+        gate.set()
+        assert len(await second) == 10
+        assert source.recorded() == ["all"] * 2
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        gate = source.gates["all"] = asyncio.Event()
+        first = asyncio.ensure_future(cached.all())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cached.all())
+        await asyncio.sleep(0)
+        second.cancel()
+        gate.set()
+        assert len(await first) == 10
+        assert second.cancelled()
+
+    asyncio.run(main())
+
+
+def test_iterate_is_not_cached(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        batches = [batch async for batch in cached.search("user1").iterate(1)]
+        assert [[item.username for item in batch] for batch in batches] == [["user1"]]
+        assert isinstance(batches[0][0], CachedDataItem)
+        assert len(cached._cache) == 0
+
+    asyncio.run(main())
+
+
+def test_suggest_is_cached(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        items = await cached.suggest("USER1", limit=2)
+        assert [item.username for item in items] == ["user1"]
+        assert isinstance(items[0], CachedDataItem)
+        items.clear()
+        again = await cached.suggest("USER1", limit=2)
+        assert [item.username for item in again] == ["user1"]
+        assert len(cached._cache) == 1
+
+    asyncio.run(main())
+
+
+def test_stats_are_cached(source):
+    cached = CachedDataSource(source)
+
+    async def main():
+        summaries = await cached.stats()
+        assert summaries["username"].count == 10
+        await source.create(username="new")
+        assert await cached.stats() is summaries
+        cached.invalidate()
+        summaries = await cached.stats()
+        assert summaries["username"].count == 11
+
+    asyncio.run(main())
+
+
+def test_timeout_is_passed_to_datasource(source):
+    timed_source = source.limit(1)
+    source.timeout = lambda seconds: timed_source
+    cached = CachedDataSource(source)
+
+    timed = cached.timeout(5.0)
+    assert timed.datasource is timed_source
+    # Timeouts don't change the results, so share the cache entries.
+    assert timed.cache_key("count") == cached.cache_key("count")
+
+
+def test_shared_cache_backend(source, tmp_path):
+    path = str(tmp_path / "cache.db")
+    cached = CachedDataSource(source, cache=SQLiteCache(path))
+    other_worker = CachedDataSource(source, cache=SQLiteCache(path))
+
+    async def main():
+        assert await cached.count() == 10
+        first = await cached.order_by("username").limit(2).all()
+        assert source.recorded() == ["count", "all"]
+
+        # The other worker reads the results stored by the first.
+        assert await other_worker.count() == 10
+        page = await other_worker.order_by("username").limit(2).all()
+        assert source.recorded() == ["count", "all"]
+        assert [item.username for item in page] == [item.username for item in first]
+        assert isinstance(page[0], CachedDataItem)
+        assert isinstance(page[0]._item, StoredItem)
+        assert await other_worker.get(pk=5) is not None
+        assert await other_worker.facets("username") is not None
+
+        # Writes through a stored row apply to the underlying datasource,
+        # and invalidate the results in every worker.
+        await page[0].update(username="updated")
+        assert page[0].username == "updated"
+        assert await cached.search("updated").count() == 1
+        await cached.search("updated").all()
+        item = (await other_worker.search("updated").all())[0]
+        assert isinstance(item._item, StoredItem)
+        await item.delete()
+        assert await cached.count() == 9
+
+        with pytest.raises(AttributeError):
+            page[0].unknown
+        with pytest.raises(ValueError):
+            await page[0].delete()
+
+    asyncio.run(main())
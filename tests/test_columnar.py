@@ -0,0 +1,224 @@
+import asyncio
+import datetime
+
+import pytest
+import typesystem
+
+import dashboard
+
+numpy = pytest.importorskip("numpy")
+
+from dashboard.columnar import ColumnarDataSource  # noqa: E402
+
+
+def make_schema():
+    return typesystem.Schema(
+        fields={
+            "pk": typesystem.Integer(
+                title="Identity", read_only=True, default=dashboard.autoincrement()
+            ),
+            "username": typesystem.String(title="Username", max_length=100),
+            "status": typesystem.Choice(
+                title="Status", choices=[("open", "Open"), ("closed", "Closed")]
+            ),
+            "is_admin": typesystem.Boolean(title="Is Admin", default=False),
+            "score": typesystem.Float(title="Score"),
+            "joined": typesystem.DateTime(title="Joined"),
+            "birthday": typesystem.Date(title="Birthday"),
+        }
+    )
+
+
+def make_rows():
+    start = datetime.datetime(2020, 1, 1)
+    return [
+        {
+            "username": f"user{i}@example.org",
+            "status": "open" if i % 4 else "closed",
+            "is_admin": i % 3 == 0,
+            "score": float(i % 7),
+            "joined": start + datetime.timedelta(days=i % 5),
+            "birthday": datetime.date(1990, 1, 1 + i % 10),
+        }
+        for i in range(50)
+    ]
+
+
+def make_datasources():
+    columnar = ColumnarDataSource(schema=make_schema(), initial=make_rows())
+    mock = dashboard.MockDataSource(schema=make_schema(), initial=make_rows())
+    return columnar, mock
+
+
+async def values(datasource):
+    return [
+        (item.pk, item.username, item.status, item.is_admin, item.score, item.joined)
+        for item in await datasource.all()
+    ]
+
+
+QUERIES = [
+    lambda ds: ds,
+    lambda ds: ds.filter(status="open"),
+    lambda ds: ds.filter(is_admin="true").filter(status="closed"),
+    lambda ds: ds.filter(username="does-not-exist"),
+    lambda ds: ds.filter(pk__in=[3, 5, 99]),
+    lambda ds: ds.filter(status__in=["closed"], score__in=["1", 4.0]),
+    lambda ds: ds.filter(joined=datetime.datetime(2020, 1, 3)),
+    lambda ds: ds.search("USER1"),
+    lambda ds: ds.search("2020-01-02"),
+    lambda ds: ds.search("true"),
+    lambda ds: ds.search("1990-01-05"),
+    lambda ds: ds.order_by("score", "pk"),
+    lambda ds: ds.order_by("-score", "-username"),
+    lambda ds: ds.order_by("status", "-joined", "pk").offset(5).limit(10),
+    lambda ds: ds.order_by("is_admin", "-pk").limit(3),
+    lambda ds: ds.order_by("-is_admin", "birthday", "pk").limit(12),
+    lambda ds: ds.search("user").order_by("-score", "pk").offset(40).limit(20),
+    lambda ds: ds.offset(45),
+    lambda ds: ds.limit(0),
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_mock_datasource(query):
+    columnar, mock = make_datasources()
+
+    async def main():
+        assert await values(query(columnar)) == await values(query(mock))
+        assert await query(columnar).count() == await query(mock).count()
+
+    asyncio.run(main())
+
+
+def test_facets():
+    columnar, mock = make_datasources()
+
+    async def main():
+        fields = ("status", "is_admin", "score", "birthday")
+        for query in QUERIES[:9]:
+            assert await query(columnar).facets(*fields) == await query(mock).facets(
+                *fields
+            )
+
+    asyncio.run(main())
+
+
+def test_get():
+    columnar, _ = make_datasources()
+
+    async def main():
+        assert (await columnar.filter(pk=5).get()).username == "user5@example.org"
+        assert (await columnar.order_by("-pk").limit(5).get()).pk == 49
+        assert await columnar.filter(pk=500).get() is None
+
+    asyncio.run(main())
+
+
+def test_writes():
+    columnar, _ = make_datasources()
+
+    async def main():
+        item = await columnar.create(
+            username="new@example.org",
+            status="open",
+            score=1.5,
+            joined=datetime.datetime(2021, 1, 1),
+            birthday=datetime.date(2000, 1, 1),
+        )
+        assert item.pk == 50
+        assert (await columnar.get()).pk == 50
+        assert await columnar.count() == 51
+
+        await item.update(username="updated@example.org", status="closed")
+        assert item.username == "updated@example.org"
+        updated = await columnar.search("updated").get()
+        assert updated.pk == 50
+        assert updated.status == "closed"
+
+        await item.delete()
+        assert await columnar.count() == 50
+        assert await columnar.search("updated").count() == 0
+
+    asyncio.run(main())
+
+
+def test_nullable_columns():
+    schema = typesystem.Schema(
+        fields={
+            "pk": typesystem.Integer(title="Identity"),
+            "name": typesystem.String(title="Name", allow_null=True),
+            "score": typesystem.Integer(title="Score", allow_null=True),
+            "data": typesystem.Object(title="Data"),
+        }
+    )
+    rows = [
+        {"pk": 0, "name": None, "score": 2, "data": {}},
+        {"pk": 1, "name": "b", "score": None, "data": {}},
+        {"pk": 2, "name": "a", "score": 2, "data": {}},
+        {"pk": 3, "name": "a", "score": 1, "data": {}},
+    ]
+    columnar = ColumnarDataSource(schema=schema, initial=rows)
+
+    async def main():
+        items = await columnar.order_by("name", "-score").all()
+        assert [item.pk for item in items] == [0, 2, 3, 1]
+        items = await columnar.order_by("-score", "pk").all()
+        assert [item.pk for item in items] == [0, 2, 3, 1]
+        assert await columnar.search("none").count() == 2
+        assert await columnar.filter(name=None).count() == 1
+        assert await columnar.facets("name", "score") == {
+            "name": {None: 1, "a": 2, "b": 1},
+            "score": {2: 2, None: 1, 1: 1},
+        }
+
+        for i in range(4, 40):
+            await columnar.create(pk=i, name="c", score=i, data={})
+        assert await columnar.count() == 40
+        assert (await columnar.order_by("-score").get()).pk == 39
+
+    asyncio.run(main())
+
+
+def test_column_growth():
+    from dashboard.columnar import Column
+
+    column = Column(dtype="int64", capacity=1)
+    column.extend([1, 2, 3])
+    column.append(4)
+    column.extend([5])
+    assert column.values.tolist() == [1, 2, 3, 4, 5]
+
+
+def test_timezone_aware_datetimes():
+    schema = typesystem.Schema(fields={"joined": typesystem.DateTime(title="Joined")})
+    joined = schema.fields["joined"].validate("2020-01-01T12:00:00+02:00")
+    datasource = ColumnarDataSource(schema=schema, initial=[{"joined": joined}])
+
+    async def main():
+        item = await datasource.get()
+        assert item.joined == joined
+        assert item.joined.tzinfo == datetime.timezone.utc
+        assert await datasource.filter(joined="2020-01-01T10:00:00Z").count() == 1
+        assert await datasource.filter(joined="2020-01-01T10:00:00").count() == 0
+        with pytest.raises(ValueError):
+            await datasource.create(joined=datetime.datetime(2020, 1, 1))
+
+    asyncio.run(main())
+
+
+def test_missing_non_nullable_values():
+    with pytest.raises(ValueError, match="'score'"):
+        ColumnarDataSource(schema=make_schema(), initial=[{"username": "a"}])
+
+    datasource = ColumnarDataSource(schema=make_schema(), initial=make_rows())
+
+    async def main():
+        with pytest.raises(ValueError, match="'score'"):
+            await datasource.create(username="a", joined=datetime.datetime.now())
+        item = await datasource.get()
+        with pytest.raises(ValueError, match="'is_admin'"):
+            await item.update(is_admin=None)
+        assert await datasource.count() == 50
+
+    asyncio.run(main())
@@ -0,0 +1,457 @@
+import asyncio
+import concurrent.futures
+
+import pytest
+import typesystem
+
+import dashboard
+
+
+def make_datasource(cls=dashboard.MockDataSource):
+    schema = typesystem.Schema(
+        fields={
+            "pk": typesystem.Integer(
+                title="Identity", read_only=True, default=dashboard.autoincrement()
+            ),
+            "status": typesystem.String(title="Status"),
+            "score": typesystem.Integer(title="Score"),
+        }
+    )
+    return cls(
+        schema=schema,
+        initial=[
+            {"status": "open", "score": 1},
+            {"status": "closed", "score": 2},
+            {"status": "open", "score": 3},
+            {"status": "closed", "score": 1},
+        ],
+    )
+
+
+def test_order_by_multiple_columns():
+    datasource = make_datasource()
+
+    async def main():
+        items = await datasource.order_by("status", "score").all()
+        assert [item.pk for item in items] == [3, 1, 0, 2]
+
+        items = await datasource.order_by("-status", "-score").all()
+        assert [item.pk for item in items] == [2, 0, 1, 3]
+
+        items = await datasource.order_by("status", "-score").all()
+        assert [item.pk for item in items] == [1, 3, 2, 0]
+
+        items = await datasource.order_by("-score", "status", "pk").all()
+        assert [item.pk for item in items] == [2, 1, 3, 0]
+
+    asyncio.run(main())
+
+
+def test_sorted_index_is_reused_and_invalidated():
+    datasource = make_datasource()
+
+    async def main():
+        ordered = datasource.order_by("-score", "pk")
+        items = await ordered.all()
+        assert [item.pk for item in items] == [2, 1, 0, 3]
+        index = datasource._table.indexes[("-score", "pk")]
+
+        items = await ordered.filter(status="open").all()
+        assert [item.pk for item in items] == [2, 0]
+        assert datasource._table.indexes[("-score", "pk")] is index
+
+        await items[0].update(score=0)
+        assert datasource._table.indexes == {}
+        items = await ordered.all()
+        assert [item.pk for item in items] == [1, 0, 3, 2]
+
+        await items[0].delete()
+        assert datasource._table.indexes == {}
+        items = await ordered.all()
+        assert [item.pk for item in items] == [0, 3, 2]
+
+        await datasource.create(status="open", score=5)
+        assert datasource._table.indexes == {}
+        items = await ordered.all()
+        assert [item.pk for item in items] == [4, 0, 3, 2]
+
+    asyncio.run(main())
+
+
+def test_sorted_indexes_are_bounded():
+    class BoundedDataSource(dashboard.MockDataSource):
+        MAX_SORT_INDEXES = 2
+
+    datasource = make_datasource(cls=BoundedDataSource)
+
+    async def main():
+        await datasource.order_by("score").all()
+        await datasource.order_by("status").all()
+        await datasource.order_by("score").all()
+        await datasource.order_by("pk").all()
+        assert list(datasource._table.indexes.keys()) == [("score",), ("pk",)]
+
+    asyncio.run(main())
+
+
+def test_parallel_scan():
+    class ParallelDataSource(dashboard.MockDataSource):
+        PARALLEL_SCAN_THRESHOLD = 2
+
+    async def main(datasource):
+        items = await datasource.filter(status="open").order_by("-score").all()
+        assert [item.pk for item in items] == [2, 0]
+        assert await datasource.search("clo").count() == 2
+        assert await datasource.facets("status") == {"status": {"open": 2, "closed": 2}}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        datasource = make_datasource(cls=ParallelDataSource)
+        datasource.executor = executor
+        asyncio.run(main(datasource))
+
+
+def test_writes_publish_a_new_version():
+    datasource = make_datasource()
+
+    async def main():
+        version, rows = datasource._table.current
+        items = await datasource.all()
+        await items[0].update(score=10)
+        await items[0].update(status="closed")
+        await items[1].delete()
+        await datasource.create(status="open", score=5)
+
+        # Earlier versions are never modified.
+        assert [row["score"] for row in rows] == [1, 2, 3, 1]
+        assert datasource._table.current[0] == version + 4
+        items = await datasource.all()
+        assert [(item.status, item.score) for item in items] == [
+            ("open", 5),
+            ("closed", 10),
+            ("open", 3),
+            ("closed", 1),
+        ]
+
+    asyncio.run(main())
+
+
+def test_reads_are_isolated_from_concurrent_writes():
+    gate = asyncio.Event()
+
+    class SlowDataSource(dashboard.MockDataSource):
+        async def _filter_items(self, items):
+            if self._filter_kwargs is not None:
+                await gate.wait()
+            return await super()._filter_items(items)
+
+    datasource = make_datasource(cls=SlowDataSource)
+
+    async def main():
+        query = asyncio.ensure_future(datasource.filter(status="open").all())
+        await asyncio.sleep(0)
+
+        item = await datasource.get()
+        await item.delete()
+        await datasource.create(status="open", score=5)
+        gate.set()
+
+        # The query sees the rows as they were when it started.
+        items = await query
+        assert [item.pk for item in items] == [0, 2]
+        items = await datasource.filter(status="open").all()
+        assert [item.pk for item in items] == [4, 2]
+
+    asyncio.run(main())
+
+
+def test_delete_missing_item():
+    datasource = make_datasource()
+
+    async def main():
+        item = await datasource.get()
+        await item.delete()
+        with pytest.raises(ValueError):
+            await item.delete()
+        assert await datasource.count() == 3
+
+    asyncio.run(main())
+
+
+def test_update_and_delete_by_key():
+    datasource = make_datasource()
+
+    async def main():
+        assert await datasource.update_by_key("1", {"score": 5}) == 1
+        assert await datasource.update_by_key(10, {"score": 5}) == 0
+        assert [item.score for item in await datasource.all()] == [1, 5, 3, 1]
+
+        # Rows that don't match the expected values are left unchanged.
+        updated = await datasource.update_by_key(
+            2, {"score": 4}, expected={"status": "closed"}
+        )
+        assert updated == 0
+        assert await datasource.delete_by_key(0, expected={"score": 2}) == 0
+        deleted = await datasource.delete_by_key(1, lookup_field="pk", expected={})
+        assert deleted == 1
+        assert await datasource.delete_by_key(1) == 0
+        assert [item.pk for item in await datasource.all()] == [0, 2, 3]
+
+    asyncio.run(main())
+
+
+def test_default_update_and_delete_by_key():
+    class DefaultWriteDataSource(dashboard.MockDataSource):
+        update_by_key = dashboard.DataSource.update_by_key
+        delete_by_key = dashboard.DataSource.delete_by_key
+
+    datasource = make_datasource(cls=DefaultWriteDataSource)
+
+    async def main():
+        assert await datasource.update_by_key(1, {"score": 5}) == 1
+        assert await datasource.update_by_key(1, {}, expected={"score": 2}) == 0
+        assert await datasource.delete_by_key(1) == 1
+        assert await datasource.delete_by_key(1) == 0
+        assert [item.score for item in await datasource.all()] == [1, 3, 1]
+
+    asyncio.run(main())
+
+
+def test_memory_usage():
+    datasource = make_datasource()
+
+    async def main():
+        usage = await datasource.memory_usage()
+        assert usage.rows == 4
+        assert usage.row_bytes > 0
+        assert usage.index_bytes == usage.stats_bytes == 0
+        assert usage.budget_used is None and not usage.near_budget
+
+        # Indexes and statistics are included once they are built, and the
+        # size of the rows is kept up to date.
+        await datasource.order_by("score").all()
+        await datasource.stats()
+        await datasource.create(status="open", score=5)
+        await datasource.update_by_key(4, {"status": "open" * 100})
+        await datasource.order_by("score").all()
+        usage = await datasource.memory_usage()
+        assert usage.index_bytes > 0 and usage.stats_bytes > 0
+        assert usage.total_bytes > usage.row_bytes
+        await datasource.delete_by_key(4)
+        usage = await datasource.memory_usage()
+        rows = datasource._table.rows
+        assert usage.row_bytes == sum(map(dashboard.datasource.get_row_size, rows))
+
+    asyncio.run(main())
+
+
+def test_memory_measured_across_a_write():
+    class RacingDataSource(dashboard.MockDataSource):
+        PARALLEL_SCAN_THRESHOLD = 0
+
+    datasource = make_datasource(cls=RacingDataSource)
+
+    async def main():
+        task = asyncio.ensure_future(datasource.memory_usage())
+        await asyncio.sleep(0)
+        await datasource.delete_by_key(0)
+        usage = await task
+        assert usage.rows == 3
+        assert usage.row_bytes == sum(
+            map(dashboard.datasource.get_row_size, datasource._table.rows)
+        )
+
+    asyncio.run(main())
+
+
+def test_row_budget_evicts_oldest_rows(caplog):
+    changes = []
+    datasource = dashboard.MockDataSource(
+        schema=make_datasource().schema,
+        initial=[{"pk": i, "status": "open", "score": i} for i in range(3)],
+        max_rows=4,
+    )
+    datasource.subscribe(changes.append)
+
+    async def main():
+        await datasource.stats()
+        await datasource.create(pk=3, status="open", score=3)
+        assert "A table has used 100% of its budget." in caplog.text
+        await datasource.create(pk=4, status="closed", score=4)
+        # Rows are kept newest first, so the last row is the oldest.
+        items = await datasource.all()
+        assert [item.pk for item in items] == [4, 3, 0, 1]
+        assert [change.operation for change in changes] == [
+            "insert",
+            "insert",
+            "delete",
+        ]
+        assert changes[-1].row["pk"] == 2
+        assert (await datasource.stats())["pk"].max == 4
+        usage = await datasource.memory_usage()
+        assert usage.budget_used == 1.0 and usage.near_budget
+
+    asyncio.run(main())
+
+
+def test_byte_budget_rejects_inserts(tmp_path):
+    schema = make_datasource().schema
+    store = dashboard.SnapshotStore(str(tmp_path / "rows"))
+    initial = [{"pk": i, "status": "open", "score": i} for i in range(3)]
+    unlimited = dashboard.MockDataSource(schema=schema, initial=initial, store=store)
+    size = asyncio.run(unlimited.memory_usage()).row_bytes
+    datasource = unlimited._copy(max_bytes=size, evict=False)
+    # Tables with a memory budget are measured up front.
+    budgeted = dashboard.MockDataSource(schema=schema, initial=initial)
+    budgeted = budgeted._copy(max_bytes=size)
+    assert budgeted._table.row_bytes is not None
+
+    async def main():
+        with pytest.raises(dashboard.datasource.BudgetExceeded):
+            await datasource.create(pk=3, status="open", score=3)
+        assert await datasource.count() == 3
+
+        # Rows larger than the whole budget are rejected, even with eviction.
+        evicting = datasource._copy(evict=True)
+        with pytest.raises(dashboard.datasource.BudgetExceeded):
+            await evicting.create(pk=3, status="open" * size, score=3)
+        await evicting.create(pk=3, status="open", score=3)
+        assert [item.pk for item in await evicting.all()] == [3, 0, 1]
+        assert (await evicting.memory_usage()).row_bytes <= size
+
+    asyncio.run(main())
+
+    # Evicted rows are deleted from the persisted rows too.
+    restored = dashboard.MockDataSource(schema=schema, store=store)
+    items = asyncio.run(restored.order_by("pk").all())
+    assert [item.pk for item in items] == [0, 1, 3]
+
+
+def test_initial_rows_fit_the_budget(tmp_path):
+    schema = make_datasource().schema
+    initial = [{"pk": i, "status": "open", "score": i} for i in range(100)]
+    with pytest.raises(dashboard.datasource.BudgetExceeded):
+        dashboard.MockDataSource(
+            schema=schema, initial=initial, max_rows=10, evict=False
+        )
+
+    # Rows are kept newest first, so the last rows are evicted.
+    datasource = dashboard.MockDataSource(schema=schema, initial=initial, max_rows=10)
+    items = asyncio.run(datasource.all())
+    assert [item.pk for item in items] == list(range(10))
+
+    # Restored rows are fitted to the budget, and persisted that way.
+    store = dashboard.SnapshotStore(str(tmp_path / "rows"))
+    dashboard.MockDataSource(schema=schema, initial=initial, store=store)
+    first = dashboard.MockDataSource(schema=schema, initial=initial[:5])
+    size = asyncio.run(first.memory_usage()).row_bytes
+    restored = dashboard.MockDataSource(schema=schema, store=store, max_bytes=size)
+    assert asyncio.run(restored.count()) == 5
+    assert asyncio.run(restored.memory_usage()).row_bytes <= size
+    reloaded = dashboard.MockDataSource(schema=schema, store=store)
+    assert asyncio.run(reloaded.count()) == 5
+
+
+def test_snapshot():
+    datasource = make_datasource()
+
+    async def main():
+        snapshot = datasource.snapshot()
+        await datasource.create(status="open", score=5)
+        assert await snapshot.count() == 4
+        assert await snapshot.filter(status="open").count() == 2
+        assert await snapshot.facets("status") == {"status": {"open": 2, "closed": 2}}
+        assert await datasource.count() == 5
+
+        # Writes made through a snapshot apply to the latest version.
+        item = await snapshot.get()
+        await item.update(score=10)
+        assert [item.score for item in await datasource.all()] == [5, 10, 2, 3, 1]
+
+    asyncio.run(main())
+
+
+def test_iterate():
+    datasource = make_datasource()
+
+    async def batches(datasource, batch_size):
+        return [
+            [item.pk for item in batch]
+            async for batch in datasource.iterate(batch_size=batch_size)
+        ]
+
+    async def main():
+        assert await batches(datasource, 3) == [[0, 1, 2], [3]]
+        assert await batches(datasource, 4) == [[0, 1, 2, 3]]
+        ordered = datasource.order_by("-score", "pk")
+        assert await batches(ordered, 1) == [[2], [1], [0], [3]]
+        assert await batches(ordered.offset(1).limit(2), 1) == [[1], [0]]
+        assert await batches(ordered.offset(3).limit(5), 2) == [[3]]
+        assert await batches(datasource.filter(status="missing"), 2) == []
+
+        rows = [
+            [item.pk for item in batch]
+            async for batch in ordered.iterate(batch_size=2, offset=1, limit=3)
+        ]
+        assert rows == [[1, 0], [3]]
+
+    asyncio.run(main())
+
+
+def test_default_iterate():
+    class DefaultIterateDataSource(dashboard.MockDataSource):
+        iterate = dashboard.DataSource.iterate
+
+    datasource = make_datasource(cls=DefaultIterateDataSource)
+
+    async def main():
+        batches = [
+            [item.pk for item in batch]
+            async for batch in datasource.order_by("pk").iterate(batch_size=2)
+        ]
+        assert batches == [[0, 1], [2, 3]]
+        batches = [
+            [item.pk for item in batch]
+            async for batch in datasource.search("open").iterate(batch_size=3)
+        ]
+        assert batches == [[0, 2]]
+        batches = [
+            [item.pk for item in batch]
+            async for batch in datasource.order_by("pk").iterate(
+                batch_size=2, offset=1, limit=3
+            )
+        ]
+        assert batches == [[1, 2], [3]]
+
+    asyncio.run(main())
+
+
+def test_suggest():
+    datasource = make_datasource()
+
+    async def main():
+        items = await datasource.suggest("OPEN", limit=1)
+        assert [item.pk for item in items] == [0]
+        items = await datasource.order_by("-score").suggest("open")
+        assert [item.pk for item in items] == [2, 0]
+        items = await datasource.filter(score=1).suggest("o", limit=5)
+        assert [item.pk for item in items] == [0, 3]
+
+    asyncio.run(main())
+
+
+def test_default_suggest():
+    class DefaultSuggestDataSource(dashboard.MockDataSource):
+        suggest = dashboard.DataSource.suggest
+
+    datasource = make_datasource(cls=DefaultSuggestDataSource)
+
+    async def main():
+        items = await datasource.suggest("closed", limit=1)
+        assert [item.pk for item in items] == [1]
+
+    asyncio.run(main())
+
+
+def test_timeout_is_ignored_by_default():
+    datasource = make_datasource()
+    assert datasource.timeout(1.0) is datasource
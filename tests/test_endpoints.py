@@ -1,12 +1,15 @@
+import asyncio
 import datetime
+import json
 
 import pytest
 import typesystem
 from starlette.applications import Starlette
-from starlette.routing import Mount
+from starlette.routing import Match, Mount, NoMatchFound
 from starlette.testclient import TestClient
 
 import dashboard
+from dashboard.application import format_bytes
 
 
 @pytest.fixture
@@ -78,10 +81,48 @@ def test_index(app):
     response = client.get("/admin")
     assert response.status_code == 200
     assert response.template.name == "dashboard/index.html"
-    assert response.context["rows"] == [
+    rows = [
+        {key: row[key] for key in ("text", "url", "count")}
+        for row in response.context["rows"]
+    ]
+    assert rows == [
         {"text": "Users", "url": "http://testserver/admin/users/", "count": 100},
         {"text": "Products", "url": "http://testserver/admin/products/", "count": 0},
     ]
+    memory = response.context["rows"][0]["memory"]
+    assert memory.rows == 100
+    assert memory.budget_used is None
+    assert "badge-warning" not in response.text
+
+
+def test_index_shows_memory_budget():
+    datasource = dashboard.MockDataSource(
+        schema=typesystem.Schema(fields={"pk": typesystem.Integer(title="ID")}),
+        initial=[{"pk": i} for i in range(95)],
+        max_rows=100,
+        evict=False,
+    )
+    table = dashboard.DashboardTable(ident="rows", title="Rows", datasource=datasource)
+    admin = dashboard.Dashboard(tables=[table])
+    client = TestClient(Starlette(routes=[Mount("/admin", admin, name="dashboard")]))
+
+    response = client.get("/admin/")
+    assert response.context["rows"][0]["memory"].near_budget
+    assert "badge-warning" in response.text
+    assert "95% of the budget" in response.text
+
+    for pk in range(95, 100):
+        response = client.post("/admin/rows/", data={"pk": pk})
+        assert response.status_code == 303
+    response = client.post("/admin/rows/", data={"pk": 100})
+    assert response.status_code == 507
+
+
+def test_format_bytes():
+    assert format_bytes(0) == "0 bytes"
+    assert format_bytes(1536) == "1.5 KB"
+    assert format_bytes(3 * 1024**2) == "3.0 MB"
+    assert format_bytes(5000 * 1024**3) == "5,000.0 GB"
 
 
 def test_table(app):
@@ -116,6 +157,179 @@ def test_table(app):
     assert response.template.name == "dashboard/table.html"
     assert response.context["rows"][0].username == "user9@example.org"
 
+    response = client.get("/admin/users?filter.is_admin=false")
+    assert response.status_code == 200
+    assert response.template.name == "dashboard/table.html"
+    assert len(response.context["rows"]) == 10
+    [facet] = response.context["facets"]
+    assert facet.id == "is_admin"
+    assert [control.count for control in facet.controls] == [0, 100]
+
+    response = client.get("/admin/users?filter.is_admin=true")
+    assert response.status_code == 200
+    assert response.template.name == "dashboard/table.html"
+    assert len(response.context["rows"]) == 0
+
+    response = client.get("/admin/users?order=is_admin,-username")
+    assert response.status_code == 200
+    assert response.template.name == "dashboard/table.html"
+    assert response.context["rows"][0].username == "user9@example.org"
+    assert response.text.count("<sup>") == 2
+
+
+def test_table_fragment(app):
+    client = TestClient(app=app)
+    page = client.get("/admin/users/?order=-username&page=2")
+    assert page.headers["vary"] == "X-Dashboard-Fragment"
+    assert 'id="table-fragment"' in page.text
+    # Facet links are outside the fragment, and follow the order after a swap.
+    assert 'id="facets"' in page.text
+    assert '$("#facets a[href]")' in page.text
+
+    headers = {"X-Dashboard-Fragment": "1"}
+    response = client.get("/admin/users/?order=-username&page=2", headers=headers)
+    assert response.status_code == 200
+    assert response.template.name == "dashboard/table_fragment.html"
+    assert response.headers["vary"] == "X-Dashboard-Fragment"
+    assert [row.pk for row in response.context["rows"]] == [
+        row.pk for row in page.context["rows"]
+    ]
+    assert response.context["facets"] == []
+    assert "<html" not in response.text
+    assert 'class="pagination' in response.text
+    assert len(response.text) < len(page.text) / 2
+
+
+def test_suggest(app):
+    client = TestClient(app=app)
+    response = client.get("/admin/users/-/suggest?q=USER4")
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 10
+    assert results[0]["key"] == "4"
+    assert results[0]["url"] == "http://testserver/admin/users/4"
+    assert results[0]["cells"][:3] == ["4", "user4@example.org", "False"]
+
+    response = client.get("/admin/users/-/suggest?q=+")
+    assert response.json() == {"results": []}
+
+
+def test_superseded_suggest_is_cancelled(make_users, make_client):
+    users = make_users(3)
+    table = dashboard.DashboardTable(ident="users", title="Users", datasource=users)
+    app = make_client(table).app
+
+    async def request(query_string):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/admin/users/-/suggest",
+            "root_path": "",
+            "query_string": query_string,
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "scheme": "http",
+        }
+        await app(scope, None, send)
+        return messages[0]["status"], messages[1]["body"]
+
+    async def main():
+        gate = users.gates["suggest"] = asyncio.Event()
+        first = asyncio.ensure_future(request(b"q=user&client=a"))
+        other = asyncio.ensure_future(request(b"q=user1&client=b"))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(request(b"q=user2&client=a"))
+        await asyncio.sleep(0.01)
+        assert await first == (204, b"")
+        gate.set()
+        status, body = await second
+        assert status == 200
+        assert [result["key"] for result in json.loads(body)["results"]] == ["2"]
+        status, body = await other
+        assert [result["key"] for result in json.loads(body)["results"]] == ["1"]
+        assert table._suggestions == {}
+
+        # Cancelling a request cancels its search.
+        users.gates["suggest"] = asyncio.Event()
+        abandoned = asyncio.ensure_future(request(b"q=user&client=a"))
+        anonymous = asyncio.ensure_future(request(b"q=user"))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        anonymous.cancel()
+        await asyncio.gather(abandoned, anonymous, return_exceptions=True)
+        assert abandoned.cancelled() and anonymous.cancelled()
+        assert table._suggestions == {}
+
+    asyncio.run(main())
+
+
+def test_table_dispatch():
+    schema = typesystem.Schema(
+        fields={"pk": typesystem.Integer(title="Identity", read_only=True)}
+    )
+    tables = [
+        dashboard.DashboardTable(
+            ident=f"table{i}",
+            title=f"Table {i}",
+            datasource=dashboard.MockDataSource(schema=schema, initial=[{"pk": i}]),
+        )
+        for i in range(400)
+    ]
+    admin = dashboard.Dashboard(tables=tables)
+    app = Starlette(routes=[Mount("/admin", admin, name="dashboard")])
+    client = TestClient(app=app)
+
+    # Routers and templates are only built when a table is first used.
+    assert all(table._router is None for table in tables)
+    response = client.get("/admin/table321/321")
+    assert response.status_code == 200
+    assert response.context["item"].pk == 321
+    assert [table.tablename for table in tables if table._router is not None] == [
+        "table321"
+    ]
+    assert client.get("/admin/table400/").status_code == 404
+    assert client.get("/admin/table5", allow_redirects=False).status_code == 307
+
+    mount = admin.routes[-1]
+    assert mount.url_path_for("detail", tablename="table7", ident=3) == ("/table7/3")
+    assert app.url_path_for("dashboard:delete", tablename="table7", ident=3) == (
+        "/admin/table7/3/delete"
+    )
+    for name, params in [
+        ("detail", {"tablename": "table400", "ident": 3}),
+        ("detail", {"tablename": "table7"}),
+        ("unknown", {"tablename": "table7"}),
+        ("table", {}),
+    ]:
+        with pytest.raises(NoMatchFound):
+            mount.url_path_for(name, **params)
+
+    assert mount.matches({"type": "websocket", "path": "/table7/"}) == (
+        Match.NONE,
+        {},
+    )
+    with pytest.raises(ValueError):
+        dashboard.Dashboard(tables=[tables[0], tables[0]])
+
+
+def test_filtered_facets(make_users, make_client):
+    users = make_users(10)
+    table = dashboard.DashboardTable(ident="users", title="Users", datasource=users)
+    client = make_client(table)
+
+    response = client.get("/admin/users?filter.is_admin=true")
+    assert response.status_code == 200
+    assert len(response.context["rows"]) == 5
+    [facet] = response.context["facets"]
+    assert [control.count for control in facet.controls] == [5, 5]
+    assert [control.is_active for control in facet.controls] == [True, False]
+    assert facet.controls[1].url.query == "filter.is_admin=false"
+
 
 def test_create(app):
     client = TestClient(app=app)
@@ -159,6 +373,76 @@ def test_update(app):
     assert response.status_code == 401
 
 
+def test_update_writes_without_reading():
+    reads = []
+
+    class WriteOnlyDataSource(dashboard.MockDataSource):
+        async def get(self):
+            reads.append(self._filter_kwargs)
+            return await super().get()
+
+    datasource = WriteOnlyDataSource(
+        schema=typesystem.Schema(fields={"pk": typesystem.Integer(title="ID")}),
+        initial=[{"pk": 1}],
+    )
+    table = dashboard.DashboardTable(ident="rows", title="Rows", datasource=datasource)
+    admin = dashboard.Dashboard(tables=[table])
+    client = TestClient(Starlette(routes=[Mount("/admin", admin, name="dashboard")]))
+
+    response = client.post("/admin/rows/1", data={"pk": 2})
+    assert response.status_code == 303
+    response = client.post("/admin/rows/2/delete")
+    assert response.status_code == 303
+    assert reads == []
+
+    # Invalid forms are shown again with the current row.
+    response = client.post("/admin/rows/1", data={"pk": "x"})
+    assert response.status_code == 404
+    assert reads == [{"pk": 1}]
+
+
+def test_update_with_version():
+    class VersionedTable(dashboard.DashboardTable):
+        VERSION_FIELD = "version"
+
+    datasource = dashboard.MockDataSource(
+        schema=typesystem.Schema(
+            fields={
+                "pk": typesystem.Integer(title="ID", read_only=True),
+                "name": typesystem.String(title="Name"),
+                "version": typesystem.Integer(title="Version", read_only=True),
+            }
+        ),
+        initial=[{"pk": 1, "name": "first", "version": 0}],
+    )
+    table = VersionedTable(ident="rows", title="Rows", datasource=datasource)
+    admin = dashboard.Dashboard(tables=[table])
+    client = TestClient(Starlette(routes=[Mount("/admin", admin, name="dashboard")]))
+
+    response = client.get("/admin/rows/1")
+    assert '<input type="hidden" name="version" value="0">' in response.text
+
+    response = client.post("/admin/rows/1", data={"name": "second", "version": 0})
+    assert response.status_code == 303
+
+    # The row has changed since version 0 was loaded, so this edit conflicts.
+    response = client.post("/admin/rows/1", data={"name": "third", "version": 0})
+    assert response.status_code == 409
+    assert response.context["conflict"]
+    assert response.context["item"].name == "second"
+    assert '<input type="hidden" name="version" value="1">' in response.text
+
+    response = client.post("/admin/rows/1", data={"name": "third", "version": "x"})
+    assert response.status_code == 400
+    response = client.post("/admin/rows/2", data={"name": "third", "version": 1})
+    assert response.status_code == 404
+
+    response = client.post("/admin/rows/1", data={"name": "third", "version": 1})
+    assert response.status_code == 303
+    item = asyncio.run(datasource.get())
+    assert (item.name, item.version) == ("third", 2)
+
+
 def test_delete(app):
     client = TestClient(app=app)
     response = client.post("/admin/users/101/delete")
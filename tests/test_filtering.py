@@ -0,0 +1,180 @@
+import asyncio
+
+import pytest
+import typesystem
+from starlette.datastructures import URL
+
+import dashboard
+from dashboard.filtering import (
+    Facet,
+    FacetControl,
+    get_facet_controls,
+    get_facet_counts,
+    get_facet_fields,
+    get_filters,
+)
+
+schema = typesystem.Schema(
+    fields={
+        "pk": typesystem.Integer(title="Identity", read_only=True),
+        "username": typesystem.String(title="Username", max_length=100),
+        "is_admin": typesystem.Boolean(title="Is Admin", default=False),
+        "status": typesystem.Choice(
+            title="Status", choices=[("open", "Open"), ("closed", "Closed")]
+        ),
+    }
+)
+
+
+def test_get_facet_fields():
+    fields = get_facet_fields(schema)
+    assert list(fields.keys()) == ["is_admin", "status"]
+
+    fields = get_facet_fields(schema, filter_fields=["status"])
+    assert list(fields.keys()) == ["status"]
+
+    for filter_fields in [["pk"], ["missing"]]:
+        with pytest.raises(ValueError):
+            get_facet_fields(schema, filter_fields=filter_fields)
+
+    # Tables check their filter fields when they're created.
+    datasource = dashboard.MockDataSource(schema=schema)
+    with pytest.raises(ValueError):
+        dashboard.DashboardTable(
+            ident="tasks", title="Tasks", datasource=datasource, filter_fields=["pk"]
+        )
+
+
+def test_get_filters():
+    fields = get_facet_fields(schema)
+    url = URL("/?filter.is_admin=true&filter.status=open&filter.pk=1&search=x")
+    assert get_filters(url=url, fields=fields) == {"is_admin": True, "status": "open"}
+
+
+def test_get_filters_ignores_invalid_values():
+    fields = get_facet_fields(schema)
+    url = URL("/?filter.is_admin=invalid&filter.status=invalid")
+    assert get_filters(url=url, fields=fields) == {}
+
+
+def test_get_facet_controls():
+    fields = get_facet_fields(schema)
+    url = URL("/?filter.status=open&page=2")
+    filters = {"status": "open"}
+    counts = {"is_admin": {True: 2, False: 0}, "status": {"open": 2, "closed": 1}}
+
+    facets = get_facet_controls(url, fields=fields, filters=filters, counts=counts)
+
+    assert facets == [
+        Facet(
+            id="is_admin",
+            text="Is Admin",
+            controls=[
+                FacetControl(
+                    text="Yes",
+                    url=URL("/?filter.status=open&filter.is_admin=true"),
+                    count=2,
+                ),
+                FacetControl(text="No", count=0, is_disabled=True),
+            ],
+        ),
+        Facet(
+            id="status",
+            text="Status",
+            controls=[
+                FacetControl(text="Open", url=URL("/"), count=2, is_active=True),
+                FacetControl(text="Closed", url=URL("/?filter.status=closed"), count=1),
+            ],
+        ),
+    ]
+
+
+def make_datasource():
+    return dashboard.MockDataSource(
+        schema=schema,
+        initial=[
+            {"pk": 0, "username": "a", "is_admin": True, "status": "open"},
+            {"pk": 1, "username": "b", "is_admin": False, "status": "open"},
+            {"pk": 2, "username": "c", "is_admin": False, "status": "closed"},
+        ],
+    )
+
+
+def test_facet_counts():
+    datasource = make_datasource()
+    fields = get_facet_fields(schema)
+
+    async def main():
+        counts = await get_facet_counts(datasource, fields)
+        assert counts == {
+            "is_admin": {True: 1, False: 2},
+            "status": {"open": 2, "closed": 1},
+        }
+
+        counts = await get_facet_counts(datasource.filter(status="open"), fields)
+        assert counts == {"is_admin": {True: 1, False: 1}, "status": {"open": 2}}
+
+        assert await get_facet_counts(datasource, {}) == {}
+
+    asyncio.run(main())
+
+
+def test_facet_counts_with_filters():
+    datasource = make_datasource()
+    fields = get_facet_fields(schema)
+
+    async def main():
+        # Counts for a filtered field ignore its own filter.
+        counts = await get_facet_counts(datasource, fields, {"is_admin": True})
+        assert counts == {
+            "is_admin": {True: 1, False: 2},
+            "status": {"open": 1},
+        }
+
+        counts = await get_facet_counts(
+            datasource, fields, {"is_admin": False, "status": "closed"}
+        )
+        assert counts == {
+            "is_admin": {False: 1},
+            "status": {"open": 1, "closed": 1},
+        }
+
+    asyncio.run(main())
+
+
+def test_facet_counts_without_facets_support():
+    class CountOnly:
+        """
+        A datasource that only supports filtering and counting.
+        """
+
+        def __init__(self, datasource):
+            self.datasource = datasource
+
+        def filter(self, **kwargs):
+            return CountOnly(self.datasource.filter(**kwargs))
+
+        async def count(self):
+            return await self.datasource.count()
+
+    datasource = CountOnly(make_datasource())
+    fields = get_facet_fields(schema)
+
+    async def main():
+        counts = await get_facet_counts(datasource, fields)
+        assert counts == {
+            "is_admin": {True: 1, False: 2},
+            "status": {"open": 2, "closed": 1},
+        }
+
+    asyncio.run(main())
+
+
+def test_chained_filters():
+    datasource = make_datasource()
+
+    async def main():
+        items = await datasource.filter(status="open").filter(is_admin=False).all()
+        assert [item.pk for item in items] == [1]
+
+    asyncio.run(main())
@@ -0,0 +1,247 @@
+import asyncio
+import json
+
+import pytest
+import typesystem
+
+import dashboard
+from dashboard.live import ChangeFeed, get_diff
+
+schema = typesystem.Schema(
+    fields={
+        "pk": typesystem.Integer(title="Identity", read_only=True),
+        "username": typesystem.String(title="Username", max_length=100),
+    }
+)
+
+
+def make_datasource():
+    return dashboard.MockDataSource(
+        schema=schema,
+        initial=[{"pk": i, "username": f"user{i}@example.org"} for i in range(5)],
+    )
+
+
+class LiveTable(dashboard.DashboardTable):
+    PAGE_SIZE = 2
+    LIVE_UPDATES = True
+
+
+def test_get_diff():
+    rows = {"1": ["1", "a"], "2": ["2", "b"]}
+    assert get_diff(2, rows, 2, dict(rows)) is None
+    assert get_diff(2, rows, 3, dict(rows)) == {
+        "count": 3,
+        "keys": ["1", "2"],
+        "rows": {},
+        "deleted": [],
+    }
+    assert get_diff(2, rows, 2, {"2": ["2", "b"], "1": ["1", "a"]}) == {
+        "count": 2,
+        "keys": ["2", "1"],
+        "rows": {},
+        "deleted": [],
+    }
+    assert get_diff(2, rows, 2, {"3": ["3", "c"], "1": ["1", "A"]}) == {
+        "count": 2,
+        "keys": ["3", "1"],
+        "rows": {"3": ["3", "c"], "1": ["1", "A"]},
+        "deleted": ["2"],
+    }
+
+
+def test_change_feed():
+    datasource = make_datasource()
+    loads = []
+
+    async def load_page(query):
+        loads.append(query)
+        selected = datasource.search(query) if query else datasource
+        rows = await selected.limit(2).all()
+        count = await selected.count()
+        return count, {str(row.pk): [row.username] for row in rows}
+
+    async def main():
+        feed = ChangeFeed(datasource, load_page)
+        first = await feed.connect(None)
+        second = await feed.connect(None)
+        searched = await feed.connect("user3")
+        assert len(feed.groups) == 2
+        assert len(datasource._table.listeners) == 1
+        loads.clear()
+
+        # Both viewers of the first page share a single reload.
+        item = await datasource.get()
+        await item.update(username="renamed@example.org")
+        await asyncio.sleep(0.01)
+        assert sorted(loads, key=str) == [None, "user3"]
+        diff = first.get_nowait()
+        assert diff == {
+            "count": 5,
+            "keys": ["0", "1"],
+            "rows": {"0": ["renamed@example.org"]},
+            "deleted": [],
+        }
+        assert second.get_nowait() == diff
+        # The change doesn't affect the search results.
+        assert searched.empty()
+
+        # Changes made before a reload runs are coalesced into one reload.
+        loads.clear()
+        await datasource.create(pk=5, username="user5@example.org")
+        await datasource.create(pk=6, username="user6@example.org")
+        await datasource.create(pk=7, username="user7@example.org")
+        await asyncio.sleep(0.01)
+        assert loads.count(None) == 1
+        assert first.get_nowait()["keys"] == ["7", "6"]
+        assert first.empty()
+
+        feed.disconnect(None, first)
+        feed.disconnect(None, second)
+        feed.disconnect("user3", searched)
+        assert feed.groups == {}
+        assert datasource._table.listeners == []
+
+    asyncio.run(main())
+
+
+def test_change_feed_cleanup(caplog):
+    datasource = make_datasource()
+    failing = set()
+    gate = asyncio.Event()
+
+    async def load_page(query):
+        if query == "slow":
+            await gate.wait()
+        if query in failing:
+            raise RuntimeError("Failed query.")
+        return 0, {}
+
+    async def main():
+        feed = ChangeFeed(datasource, load_page)
+
+        # Viewers that fail to load, or go away while loading, are released.
+        failing.add("broken")
+        with pytest.raises(RuntimeError):
+            await feed.connect("broken")
+        task = asyncio.ensure_future(feed.connect("slow"))
+        await asyncio.sleep(0.01)
+        assert list(feed.groups) == ["slow"]
+        task.cancel()
+        await asyncio.sleep(0.01)
+        assert feed.groups == {}
+        assert datasource._table.listeners == []
+
+        # Failed reloads are logged, and the viewers keep their rows.
+        queue = await feed.connect("user")
+        failing.add("user")
+        await datasource.create(pk=5, username="user5@example.org")
+        await asyncio.sleep(0.01)
+        assert "Failed to reload a page" in caplog.text
+        assert queue.empty()
+        feed.disconnect("user", queue)
+
+        # Reloads in progress are cancelled when the last viewer leaves.
+        gate.set()
+        queue = await feed.connect("slow")
+        group = feed.groups["slow"]
+        gate.clear()
+        await datasource.create(pk=6, username="user6@example.org")
+        await asyncio.sleep(0.01)
+        feed.disconnect("slow", queue)
+        await asyncio.sleep(0.01)
+        assert group._task.cancelled()
+
+    asyncio.run(main())
+
+
+def test_live_endpoint(make_client):
+    table = LiveTable(ident="users", title="Users", datasource=make_datasource())
+    client = make_client(table)
+    app = client.app
+    response = client.get("/admin/users/")
+    assert response.context["live_url"] == "http://testserver/admin/users/-/live"
+    assert 'data-key="0"' in response.text
+    assert "EventSource" in response.text
+
+    async def main():
+        messages = []
+        received = asyncio.Event()
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body" and message["body"]:
+                received.set()
+
+        async def next_body():
+            await asyncio.wait_for(received.wait(), timeout=5)
+            received.clear()
+            return messages[-1]["body"].decode()
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/admin/users/-/live",
+            "root_path": "",
+            "query_string": b"order=-pk",
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "scheme": "http",
+        }
+        task = asyncio.ensure_future(app(scope, receive, send))
+        assert await next_body() == "retry: 5000\n\n"
+        assert messages[0]["status"] == 200
+        assert (b"content-type", b"text/event-stream") in [
+            (key, value.split(b";")[0]) for key, value in messages[0]["headers"]
+        ]
+
+        await table.datasource.create(pk=9, username="new@example.org")
+        event = await next_body()
+        assert event.startswith("event: diff\ndata: ")
+        diff = json.loads(event.split("data: ")[1])
+        assert diff == {
+            "count": 6,
+            "keys": ["9", "4"],
+            "rows": {"9": ["9", "new@example.org"]},
+            "deleted": ["3"],
+        }
+
+        disconnected.set()
+        await asyncio.wait_for(task, timeout=5)
+        assert table.change_feed.groups == {}
+
+    asyncio.run(main())
+
+
+def test_keepalive():
+    datasource = make_datasource()
+
+    async def load_page(query):
+        return 0, {}
+
+    async def main():
+        feed = ChangeFeed(datasource, load_page)
+        stream = feed.stream(None, keepalive=0.01)
+        assert await stream.__anext__() == "retry: 5000\n\n"
+        assert await stream.__anext__() == ": keepalive\n\n"
+        await stream.aclose()
+        assert feed.groups == {}
+
+    asyncio.run(main())
+
+
+def test_live_updates_disabled(make_client):
+    table = dashboard.DashboardTable(
+        ident="users", title="Users", datasource=make_datasource()
+    )
+    client = make_client(table)
+    assert table.change_feed is None
+    response = client.get("/admin/users/")
+    assert response.context["live_url"] is None
+    assert "EventSource" not in response.text
+    assert client.get("/admin/users/-/live").status_code == 404
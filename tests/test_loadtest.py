@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+
+import pytest
+
+from benchmarks import loadtest
+
+
+def test_loadtest():
+    app = loadtest.make_app(rows=50)
+    stats, elapsed = asyncio.run(
+        loadtest.run(app, 50, loadtest.DEFAULT_MIX, requests=60, concurrency=5)
+    )
+    assert sum(len(kind.latencies) for kind in stats.values()) == 60
+    assert sum(kind.errors for kind in stats.values()) == 0
+
+    lines = loadtest.report(stats, elapsed).splitlines()
+    assert lines[0].split()[:4] == ["route", "requests", "errors", "req/s"]
+    assert "p99 ms" in lines[0]
+    assert lines[-1].split()[:3] == ["total", "60", "0"]
+
+
+def test_parse_mix():
+    assert loadtest.parse_mix("list=3,search") == {"list": 3, "search": 1}
+    with pytest.raises(argparse.ArgumentTypeError):
+        loadtest.parse_mix("unknown=1")
+
+
+def test_percentile():
+    samples = [float(i) for i in range(1, 101)]
+    assert loadtest.percentile(samples, 50) == 50.0
+    assert loadtest.percentile(samples, 99) == 99.0
+    assert loadtest.percentile([1.0], 0) == 1.0
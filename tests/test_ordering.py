@@ -1,40 +1,67 @@
 from starlette.datastructures import URL
 
-from dashboard.ordering import ColumnControl, get_column_controls, get_ordering
+from dashboard.ordering import (
+    ColumnControl,
+    apply_ordering,
+    get_column_controls,
+    get_ordering,
+    with_tiebreaker,
+)
 
 
 def test_order_by_column():
     url = URL("?order=name")
     columns = {"name": "Name", "email": "Email"}
     ordering = get_ordering(url=url, columns=columns)
-    assert ordering == "name"
+    assert ordering == ["name"]
 
 
 def test_order_by_reverse_column():
     url = URL("?order=-name")
     columns = {"name": "Name", "email": "Email"}
     ordering = get_ordering(url=url, columns=columns)
-    assert ordering == "-name"
+    assert ordering == ["-name"]
 
 
 def test_order_by_invalid_column():
     url = URL("?order=invalid")
     columns = {"name": "Name", "email": "Email"}
     ordering = get_ordering(url=url, columns=columns)
-    assert ordering is None
+    assert ordering == []
+
+
+def test_order_by_multiple_columns():
+    url = URL("?order=name,-email,invalid,-name")
+    columns = {"name": "Name", "email": "Email"}
+    ordering = get_ordering(url=url, columns=columns)
+    assert ordering == ["name", "-email"]
+
+
+def test_no_ordering():
+    url = URL("/")
+    columns = {"name": "Name", "email": "Email"}
+    ordering = get_ordering(url=url, columns=columns)
+    assert ordering == []
+
+
+def test_with_tiebreaker():
+    assert with_tiebreaker([], "pk") == []
+    assert with_tiebreaker(["name"], "pk") == ["name", "pk"]
+    assert with_tiebreaker(["name", "-pk"], "pk") == ["name", "-pk"]
 
 
 def test_get_column_controls_no_current_selection():
     columns = {"username": "Username", "email": "Email"}
     url = URL("/")
 
-    controls = get_column_controls(url, columns, order_by=None)
+    controls = get_column_controls(url, columns, order_by=[])
 
     assert controls == [
         ColumnControl(
             id="username",
             text="Username",
             url=URL("/?order=username"),
+            add_url=URL("/?order=username"),
             is_forward_sorted=False,
             is_reverse_sorted=False,
         ),
@@ -42,6 +69,7 @@ def test_get_column_controls_no_current_selection():
             id="email",
             text="Email",
             url=URL("/?order=email"),
+            add_url=URL("/?order=email"),
             is_forward_sorted=False,
             is_reverse_sorted=False,
         ),
@@ -52,13 +80,15 @@ def test_get_column_controls_forward_current_selection():
     columns = {"username": "Username", "email": "Email"}
     url = URL("/?order=username")
 
-    controls = get_column_controls(url, columns, order_by="username")
+    controls = get_column_controls(url, columns, order_by=["username"])
 
     assert controls == [
         ColumnControl(
             id="username",
             text="Username",
             url=URL("/?order=-username"),
+            add_url=URL("/?order=-username"),
+            sort_position=1,
             is_forward_sorted=True,
             is_reverse_sorted=False,
         ),
@@ -66,6 +96,7 @@ def test_get_column_controls_forward_current_selection():
             id="email",
             text="Email",
             url=URL("/?order=email"),
+            add_url=URL("/?order=username%2Cemail"),
             is_forward_sorted=False,
             is_reverse_sorted=False,
         ),
@@ -76,13 +107,15 @@ def test_get_column_controls_reverse_current_selection():
     columns = {"username": "Username", "email": "Email"}
     url = URL("/?order=-username")
 
-    controls = get_column_controls(url=url, columns=columns, order_by="-username")
+    controls = get_column_controls(url=url, columns=columns, order_by=["-username"])
 
     assert controls == [
         ColumnControl(
             id="username",
             text="Username",
             url=URL("/"),
+            add_url=URL("/"),
+            sort_position=1,
             is_forward_sorted=False,
             is_reverse_sorted=True,
         ),
@@ -90,7 +123,58 @@ def test_get_column_controls_reverse_current_selection():
             id="email",
             text="Email",
             url=URL("/?order=email"),
+            add_url=URL("/?order=-username%2Cemail"),
+            is_forward_sorted=False,
+            is_reverse_sorted=False,
+        ),
+    ]
+
+
+def test_get_column_controls_multiple_selection():
+    columns = {"username": "Username", "email": "Email", "joined": "Joined"}
+    url = URL("/?order=email,-username&page=2")
+
+    controls = get_column_controls(url, columns, order_by=["email", "-username"])
+
+    assert controls == [
+        ColumnControl(
+            id="username",
+            text="Username",
+            url=URL("/"),
+            add_url=URL("/?order=email"),
+            sort_position=2,
+            is_forward_sorted=False,
+            is_reverse_sorted=True,
+        ),
+        ColumnControl(
+            id="email",
+            text="Email",
+            url=URL("/?order=-email"),
+            add_url=URL("/?order=-email%2C-username"),
+            sort_position=1,
+            is_forward_sorted=True,
+            is_reverse_sorted=False,
+        ),
+        ColumnControl(
+            id="joined",
+            text="Joined",
+            url=URL("/?order=joined"),
+            add_url=URL("/?order=email%2C-username%2Cjoined"),
             is_forward_sorted=False,
             is_reverse_sorted=False,
         ),
     ]
+
+
+def test_apply_ordering():
+    class SingleColumnDataSource:
+        def order_by(self, order_by):
+            return [order_by]
+
+    class MultiColumnDataSource:
+        def order_by(self, *order_by):
+            return list(order_by)
+
+    order_by = ["-email", "pk"]
+    assert apply_ordering(SingleColumnDataSource(), order_by) == ["-email"]
+    assert apply_ordering(MultiColumnDataSource(), order_by) == ["-email", "pk"]
@@ -1,6 +1,11 @@
 from starlette.datastructures import URL
 
-from dashboard.pagination import PageControl, get_page_controls, get_page_number
+from dashboard.pagination import (
+    PageControl,
+    get_next_previous_controls,
+    get_page_controls,
+    get_page_number,
+)
 
 
 def test_single_page_does_not_include_any_pagination_controls():
@@ -166,3 +171,25 @@ def test_invalid_page_number():
     url = URL("/?page=invalid")
     page = get_page_number(url=url)
     assert page == 1
+
+
+def test_next_previous_controls():
+    """
+    Without a page count, pagination controls should render as:
+    Previous [3] Next
+    """
+    url = URL("/?search=a")
+    assert get_next_previous_controls(url, current_page=1, has_next=False) == []
+    assert get_next_previous_controls(url, current_page=1, has_next=True) == [
+        PageControl(text="Previous", is_disabled=True),
+        PageControl(text="1", is_active=True),
+        PageControl(text="Next", url=URL("/?search=a&page=2")),
+    ]
+    assert get_next_previous_controls(url, current_page=2, has_next=False) == [
+        PageControl(text="Previous", url=URL("/?search=a")),
+        PageControl(text="2", is_active=True),
+        PageControl(text="Next", is_disabled=True),
+    ]
+    assert get_next_previous_controls(url, current_page=3, has_next=True)[0] == (
+        PageControl(text="Previous", url=URL("/?search=a&page=2"))
+    )
@@ -0,0 +1,207 @@
+import asyncio
+import os
+
+import pytest
+import typesystem
+
+import dashboard
+from dashboard.persistence import (
+    RECORD_HEADER,
+    load_snapshot,
+    read_log,
+    replay_log,
+    save_snapshot,
+)
+
+schema = typesystem.Schema(
+    fields={
+        "pk": typesystem.Integer(title="Identity"),
+        "username": typesystem.String(title="Username", max_length=100),
+        "is_admin": typesystem.Boolean(title="Is Admin", default=False),
+    }
+)
+
+
+def initial():
+    return [{"pk": i, "username": f"user{i}@example.org"} for i in range(5)]
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    items = initial()
+    save_snapshot(items, path)
+    assert load_snapshot(path) == items
+
+
+def test_invalid_snapshot(tmp_path):
+    path = tmp_path / "users.snapshot"
+    path.write_bytes(b"invalid")
+    with pytest.raises(ValueError):
+        load_snapshot(str(path))
+
+
+def test_replay_log():
+    items = initial()
+    records = [
+        ("create", None, {"pk": 5, "username": "new@example.org"}),
+        ("update", 5, {"username": "updated@example.org"}),
+        ("update", 0, {"pk": 10}),
+        ("delete", 1, None),
+        ("create", None, {"pk": 6, "username": "deleted@example.org"}),
+        ("delete", 6, None),
+        ("update", 6, {"username": "ignored@example.org"}),
+        ("create", None, {"pk": 2, "username": "replaced@example.org"}),
+    ]
+    assert replay_log(items, records, lookup_field="pk") == 8
+    assert items == [
+        {"pk": 5, "username": "updated@example.org"},
+        {"pk": 10, "username": "user0@example.org"},
+        {"pk": 2, "username": "replaced@example.org"},
+        {"pk": 3, "username": "user3@example.org"},
+        {"pk": 4, "username": "user4@example.org"},
+    ]
+
+
+def test_warm_start(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+
+    async def write():
+        store = dashboard.SnapshotStore(path)
+        users = dashboard.MockDataSource(schema=schema, initial=initial(), store=store)
+        assert os.path.exists(path)
+        assert load_snapshot(path)[0] == {
+            "pk": 0,
+            "username": "user0@example.org",
+            "is_admin": False,
+        }
+
+        await users.create(pk=5, username="new@example.org")
+        item = await users.filter(pk=0).get()
+        await item.update(is_admin=True)
+        item = await users.filter(pk=1).get()
+        await item.delete()
+        assert store.records == 3
+        store.close()
+
+    async def read():
+        store = dashboard.SnapshotStore(path)
+        users = dashboard.MockDataSource(schema=schema, initial=[], store=store)
+        assert store.records == 3
+        assert await users.count() == 5
+        assert (await users.get()).pk == 5
+        assert (await users.filter(pk=0).get()).is_admin
+        assert await users.filter(pk=1).get() is None
+        store.close()
+
+    asyncio.run(write())
+    asyncio.run(read())
+
+
+def test_incomplete_log_record_is_ignored(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    store = dashboard.SnapshotStore(path)
+    store.append("delete", 0, None)
+    store.close()
+    with open(store.log_path, "ab") as log:
+        log.write(RECORD_HEADER.pack(100) + b"partial")
+    assert list(read_log(store.log_path)) == [("delete", 0, None)]
+
+    with open(store.log_path, "ab") as log:
+        log.write(b"\x00")
+    assert list(read_log(store.log_path)) == [("delete", 0, None)]
+
+
+def test_background_compaction(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+
+    async def main():
+        store = dashboard.SnapshotStore(path, compact_after=2, fsync=True)
+        users = dashboard.MockDataSource(schema=schema, initial=initial(), store=store)
+
+        await users.create(pk=5, username="five@example.org")
+        await users.create(pk=6, username="six@example.org")
+        store.close()
+        assert store.records == 0
+        assert not os.path.exists(store.old_log_path)
+        assert len(load_snapshot(path)) == 7
+
+        await users.create(pk=7, username="seven@example.org")
+        store.close()
+        assert store.records == 1
+
+        restored = dashboard.MockDataSource(
+            schema=schema, store=dashboard.SnapshotStore(path)
+        )
+        assert await restored.count() == 8
+
+    asyncio.run(main())
+
+
+def test_interrupted_compaction(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    store = dashboard.SnapshotStore(path)
+    items = initial()
+    store.compact(items, background=False)
+
+    # Simulate a compaction that moved the log aside, but did not complete.
+    store.append("delete", 0, None)
+    store.close()
+    os.replace(store.log_path, store.old_log_path)
+    store.append("delete", 1, None)
+
+    # Compacting again should include both logs.
+    store.compact(items, background=False)
+    assert not os.path.exists(store.old_log_path)
+
+    store.append("delete", 2, None)
+    store.close()
+    os.replace(store.log_path, store.old_log_path)
+    store.append("delete", 3, None)
+    store.close()
+
+    restored = dashboard.SnapshotStore(path).load()
+    assert [item["pk"] for item in restored] == [0, 1, 4]
+
+
+def test_compaction_is_not_concurrent(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    store = dashboard.SnapshotStore(path)
+
+    class Running:
+        def is_alive(self):
+            return True
+
+    store._compaction = Running()
+    assert store.is_compacting
+    store.compact(initial())
+    assert not os.path.exists(path)
+
+
+def test_rows_require_a_key(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    with pytest.raises(ValueError):
+        dashboard.MockDataSource(
+            schema=schema,
+            initial=[{"username": "user@example.org"}],
+            store=dashboard.SnapshotStore(path),
+        )
+
+    async def main():
+        store = dashboard.SnapshotStore(path)
+        users = dashboard.MockDataSource(schema=schema, initial=initial(), store=store)
+        with pytest.raises(ValueError):
+            await users.create(username="new@example.org")
+        with pytest.raises(ValueError):
+            await users.create(pk=None, username="new@example.org")
+        item = await users.get()
+        with pytest.raises(ValueError):
+            await item.update(pk=None)
+        store.close()
+
+        restored = dashboard.MockDataSource(
+            schema=schema, store=dashboard.SnapshotStore(path)
+        )
+        assert await restored.count() == 5
+        assert (await restored.get()).pk == 0
+
+    asyncio.run(main())
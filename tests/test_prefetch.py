@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+from starlette.datastructures import URL
+from starlette.requests import Request
+
+import dashboard
+
+
+class PrefetchTable(dashboard.DashboardTable):
+    PREFETCH = True
+
+
+@pytest.fixture
+def make_table(make_users):
+    def make_table(rows=35, table_class=PrefetchTable):
+        users = make_users(rows)
+        return table_class(ident="users", title="Users", datasource=users)
+
+    return make_table
+
+
+def offsets(table):
+    """
+    Return the offset of each query for rows.
+    """
+    return table.datasource.recorded("offset", operation="all")
+
+
+def make_request(headers=None):
+    headers = [
+        (key.lower().encode(), value.encode()) for key, value in (headers or {}).items()
+    ]
+    return Request({"type": "http", "headers": headers})
+
+
+def test_next_page_is_prefetched(make_table):
+    table = make_table()
+
+    async def main():
+        query = table._get_query(URL("/admin/users/?order=-pk"))
+        page = await table._load(make_request(), query)
+        assert [row.pk for row in page["rows"]] == list(range(34, 24, -1))
+        assert str(page["next_query"]) == "/admin/users/?order=-pk&page=2"
+        await asyncio.gather(*table._prefetching.values())
+        assert offsets(table) == [0, 10]
+
+        # Pages that are already prefetched aren't loaded again.
+        await table._load(make_request(), query)
+        await asyncio.gather(*table._prefetching.values())
+        assert offsets(table) == [0, 10, 0]
+
+        # The next page is served from the prefetched results, and the page
+        # after it is prefetched in turn.
+        page = await table._load(make_request(), page["next_query"])
+        assert [row.pk for row in page["rows"]] == list(range(24, 14, -1))
+        await asyncio.gather(*table._prefetching.values())
+        assert offsets(table) == [0, 10, 0, 20]
+
+        # There's nothing to prefetch after the last page.
+        page = await table._load(make_request(), page["next_query"])
+        await asyncio.gather(*table._prefetching.values())
+        page = await table._load(make_request(), page["next_query"])
+        assert page["next_query"] is None
+        assert offsets(table) == [0, 10, 0, 20, 30]
+        assert table._prefetching == {}
+
+        # Browser prefetch requests don't prefetch any further.
+        query = table._get_query(URL("/admin/users/?order=pk"))
+        await table._load(make_request({"Sec-Purpose": "prefetch"}), query)
+        assert table._prefetching == {}
+
+    asyncio.run(main())
+
+
+def test_page_being_prefetched_is_not_loaded_again(make_table):
+    table = make_table()
+
+    async def main():
+        query = table._get_query(URL("/admin/users/"))
+        page = await table._load(make_request(), query)
+        assert list(table._prefetching) == [page["next_query"]]
+        page = await table._load(make_request(), page["next_query"], False)
+        assert [row.pk for row in page["rows"]] == list(range(10, 20))
+        await asyncio.gather(*table._prefetching.values())
+        assert offsets(table) == [0, 10, 20]
+
+    asyncio.run(main())
+
+
+def test_prefetch_concurrency_and_invalidation(make_table):
+    table = make_table(rows=100)
+    datasource = table.datasource
+
+    async def main():
+        gate = datasource.gates["all"] = asyncio.Event()
+        for page in (1, 3, 5):
+            query = table._get_query(URL(f"/admin/users/?page={page}"))
+            table._prefetch(query)
+        # Only two pages are prefetched at once, and each page only once.
+        assert len(table._prefetching) == 2
+        table._prefetch(query.replace(page=1))
+        assert len(table._prefetching) == 2
+
+        # Pages loaded across a write are discarded.
+        await asyncio.sleep(0)
+        table._prefetched.clear()
+        gate.set()
+        await asyncio.gather(*table._prefetching.values())
+        assert len(table._prefetched) == 0
+
+        # Failed prefetches are ignored.
+        datasource.errors["all"] = RuntimeError("Failed query.")
+        table._prefetch(query.replace(page=2))
+        await asyncio.sleep(0.01)
+        assert table._prefetching == {}
+        assert len(table._prefetched) == 0
+
+    asyncio.run(main())
+
+
+def test_prefetch_hints(make_table, make_client):
+    table = make_table()
+    with make_client(table) as client:
+        response = client.get("/admin/users/")
+        assert '<link rel="prefetch" href="/admin/users/?page=2">' in response.text
+
+        response = client.get("/admin/users/?page=4")
+        assert 'rel="prefetch"' not in response.text
+
+        # Fragments are served from the pages prefetched for full pages, and
+        # don't hint the browser to fetch the full next page.
+        table.datasource.calls.clear()
+        client.get("/admin/users/?order=-pk")
+        headers = {"X-Dashboard-Fragment": "1"}
+        response = client.get("/admin/users/?order=-pk&page=2", headers=headers)
+        assert [row.pk for row in response.context["rows"]] == list(range(24, 14, -1))
+        assert 'rel="prefetch"' not in response.text
+
+        async def prefetched():
+            await asyncio.gather(*table._prefetching.values())
+
+        client.portal.call(prefetched)
+        assert offsets(table) == [0, 10, 20]
+
+        # Writes through the dashboard discard any prefetched pages.
+        client.get("/admin/users/?page=2")
+        assert len(table._prefetched) > 0
+        response = client.post("/admin/users/1", data={"username": "updated"})
+        assert response.status_code == 303
+        assert len(table._prefetched) == 0
+
+    # Prefetching is off by default.
+    table = make_table(table_class=dashboard.DashboardTable)
+    response = make_client(table).get("/admin/users/")
+    assert 'rel="prefetch"' not in response.text
+    assert table._prefetching == {}
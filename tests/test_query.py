@@ -0,0 +1,105 @@
+import typesystem
+from starlette.datastructures import URL
+
+from dashboard.ordering import get_column_controls
+from dashboard.pagination import get_page_controls
+from dashboard.query import TableQuery
+
+columns = {"username": "Username", "is_admin": "Is Admin", "status": "Status"}
+filter_fields = {
+    "is_admin": typesystem.Boolean(title="Is Admin"),
+    "status": typesystem.Choice(
+        title="Status", choices=[("open", "Open"), ("closed", "Closed")]
+    ),
+}
+
+
+def parse(url):
+    return TableQuery.from_url(URL(url), columns=columns, filter_fields=filter_fields)
+
+
+def test_from_url():
+    query = parse(
+        "/users?view=json&order=-username,invalid&page=3&search=user"
+        "&filter.is_admin=1&filter.invalid=x"
+    )
+    assert query.path == "/users"
+    assert query.page == 3
+    assert query.order == ("-username",)
+    assert query.search == "user"
+    assert query.filter_values == {"is_admin": True}
+    assert query.params == (("view", "json"),)
+    assert str(query) == (
+        "/users?view=json&filter.is_admin=true&search=user&order=-username&page=3"
+    )
+
+
+def test_invalid_values():
+    query = parse("/users?page=-2&order=&search=&filter.status=invalid")
+    assert query == TableQuery(path="/users")
+    assert str(query) == "/users"
+    assert parse("/users?page=x").page == 1
+
+
+def test_canonical_cache_key():
+    first = parse("/users?filter.status=open&filter.is_admin=true&page=2")
+    second = parse("/users?page=2&filter.is_admin=1&filter.status=open")
+    assert first == second
+    assert hash(first) == hash(second)
+    assert {first: "cached"}[second] == "cached"
+    assert first != parse("/users?page=3&filter.is_admin=1&filter.status=open")
+
+
+def test_links():
+    query = parse("/users?search=user&order=username&view=json")
+    assert str(query.include_query_params(page=2)) == (
+        "/users?view=json&search=user&order=username&page=2"
+    )
+    assert str(query.include_query_params(order="-username,status")) == (
+        "/users?view=json&search=user&order=-username%2Cstatus"
+    )
+    assert str(query.include_query_params(view="table", search="")) == (
+        "/users?view=table&order=username"
+    )
+
+    filtered = query.include_query_params(**{"filter.status": "open"})
+    filtered = filtered.include_query_params(**{"filter.is_admin": "false"})
+    assert filtered.filters == (("is_admin", False), ("status", "open"))
+    assert filtered.query == (
+        "view=json&filter.is_admin=false&filter.status=open"
+        "&search=user&order=username"
+    )
+
+    removed = filtered.remove_query_params("filter.is_admin").remove_query_params(
+        ["search", "order", "view", "page"]
+    )
+    assert str(removed) == "/users?filter.status=open"
+
+    # Filters on unknown fields are kept as given, after the known fields.
+    unknown = removed.include_query_params(**{"filter.other": "x"})
+    assert unknown.query == "filter.status=open&filter.other=x"
+
+
+def test_encoded_parts_are_reused():
+    query = parse("/users?search=user&order=username")
+    assert str(query) == "/users?search=user&order=username"
+    linked = query.include_query_params(page=2)
+    assert "page" not in linked._encoded
+    assert linked._encoded["search"] is query._encoded["search"]
+
+
+def test_controls_from_query():
+    query = parse("/users?order=username&page=2")
+
+    [username, *_] = get_column_controls(query, columns, order_by=list(query.order))
+    assert str(username.url) == "/users?order=-username"
+    assert isinstance(username.url, TableQuery)
+
+    controls = get_page_controls(query, current_page=2, total_pages=3)
+    assert [str(control.url) for control in controls] == [
+        "/users?order=username",
+        "/users?order=username",
+        "/users?order=username&page=2",
+        "/users?order=username&page=3",
+        "/users?order=username&page=3",
+    ]
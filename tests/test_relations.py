@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+import typesystem
+from starlette.requests import Request
+
+import dashboard
+from dashboard.relations import Link, RelationLoader
+
+orders_schema = typesystem.Schema(
+    fields={
+        "pk": typesystem.Integer(title="Identity", read_only=True),
+        "owner": typesystem.Integer(title="Owner", allow_null=True),
+        "reviewer": typesystem.Integer(title="Reviewer", allow_null=True),
+    }
+)
+
+
+class UsersTable(dashboard.DashboardTable):
+    DISPLAY_FIELD = "username"
+
+
+class StreamingOrdersTable(dashboard.DashboardTable):
+    STREAMING = True
+
+
+@pytest.fixture
+def users(make_users):
+    return make_users(5)
+
+
+@pytest.fixture
+def client(users, make_client):
+    initial = [
+        {"pk": i, "owner": i % 3, "reviewer": 4 if i % 2 else None} for i in range(20)
+    ]
+    initial.append({"pk": 20, "owner": 99, "reviewer": 0})
+    orders = dashboard.MockDataSource(schema=orders_schema, initial=initial)
+    users_table = UsersTable(ident="users", title="Users", datasource=users)
+    relations = {"owner": users_table, "reviewer": users_table}
+    return make_client(
+        users_table,
+        dashboard.DashboardTable(
+            ident="orders", title="Orders", datasource=orders, relations=relations
+        ),
+        StreamingOrdersTable(
+            ident="streamed", title="Orders", datasource=orders, relations=relations
+        ),
+    )
+
+
+def queries(users):
+    return users.recorded("filter", operation="all")
+
+
+def test_relationship_columns(client, users):
+    response = client.get("/admin/orders/")
+    assert response.status_code == 200
+    # Both columns refer to the users table, so share a single query.
+    assert queries(users) == [{"pk__in": (0, 1, 2, 4)}]
+    related = response.context["related"]
+    assert related["owner"][1] == Link(
+        text="user1", url="http://testserver/admin/users/1"
+    )
+    assert '<a href="http://testserver/admin/users/4">user4</a>' in response.text
+
+    # Keys without a matching row are shown as they are.
+    users.calls.clear()
+    response = client.get("/admin/orders/?order=-pk")
+    assert queries(users) == [{"pk__in": (99, 1, 0, 2, 4)}]
+    assert 99 not in response.context["related"]["owner"]
+    assert "<td>99</td>" in response.text
+
+    response = client.get("/admin/orders/", headers={"X-Dashboard-Fragment": "1"})
+    assert '<a href="http://testserver/admin/users/2">user2</a>' in response.text
+
+    response = client.get("/admin/streamed/")
+    assert '<a href="http://testserver/admin/users/2">user2</a>' in response.text
+
+    response = client.get("/admin/orders/20")
+    assert '<a href="http://testserver/admin/users/0">user0</a>' in response.text
+
+    # Tables without relationship columns don't load anything.
+    users.calls.clear()
+    response = client.get("/admin/users/1")
+    assert response.context["related"] == {}
+    assert queries(users) == [{"pk": 1}]
+
+
+def test_loaded_rows_are_memoized(client, users):
+    app = client.app
+    users_table = app.routes[0].app.tables[0]
+    request = Request({"type": "http", "router": app.router})
+
+    async def main():
+        loader = RelationLoader(request)
+        loaded = await loader.load(users_table, [1, 2, None, 1])
+        assert list(loaded) == [1, 2]
+        loaded = await loader.load(users_table, [2, 3, 7])
+        assert list(loaded) == [2, 3]
+        loaded = await loader.load(users_table, [7, 3])
+        assert list(loaded) == [3]
+        assert queries(users) == [{"pk__in": (1, 2)}, {"pk__in": (3, 7)}]
+
+    asyncio.run(main())
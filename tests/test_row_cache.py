@@ -0,0 +1,162 @@
+import asyncio
+
+import dashboard
+
+
+class CachedRowsTable(dashboard.DashboardTable):
+    ROW_CACHE = True
+
+
+def lookups(users):
+    """
+    Return the filters of each lookup of a row.
+    """
+    return users.recorded("filter", operation="get")
+
+
+def test_rows_are_cached(users, make_client):
+    table = CachedRowsTable(ident="users", title="Users", datasource=users)
+    client = make_client(table)
+
+    # Rows that were just listed are shown without another query.
+    client.get("/admin/users/")
+    response = client.get("/admin/users/9")
+    assert response.status_code == 200
+    assert response.context["item"].username == "user9"
+    assert lookups(users) == []
+
+    # Rows that were viewed are cached for the edit form.
+    table._rows.clear()
+    response = client.get("/admin/users/3")
+    assert lookups(users) == [{"pk": 3}]
+    response = client.get("/admin/users/3")
+    response = client.post("/admin/users/3", data={"username": "x" * 101})
+    assert response.status_code == 400
+    assert lookups(users) == [{"pk": 3}]
+
+    # Edits and deletes through the dashboard clear the cache.
+    response = client.post("/admin/users/3", data={"username": "updated"})
+    assert response.status_code == 303
+    response = client.get("/admin/users/3")
+    assert response.context["item"].username == "updated"
+    assert lookups(users) == [{"pk": 3}, {"pk": 3}]
+    response = client.post("/admin/users/3/delete")
+    assert response.status_code == 303
+    response = client.get("/admin/users/3")
+    assert response.status_code == 404
+
+    # Created rows are cached.
+    response = client.post("/admin/users/", data={"username": "new"})
+    assert response.status_code == 303
+    users.calls.clear()
+    response = client.get("/admin/users/25")
+    assert response.context["item"].username == "new"
+    assert lookups(users) == []
+
+
+def test_rows_loaded_across_a_write_are_not_cached(users):
+    table = CachedRowsTable(ident="users", title="Users", datasource=users)
+
+    async def main():
+        generation = table._rows.generation
+        item = await table.datasource.filter(pk=5).get()
+        await table.datasource.update_by_key(5, {"username": "changed"})
+        await table._clear_caches()
+        await table._cache_rows([item], generation)
+        assert len(table._rows) == 0
+
+    asyncio.run(main())
+
+
+def test_row_cache_is_off_by_default(users, make_client):
+    table = dashboard.DashboardTable(ident="users", title="Users", datasource=users)
+    client = make_client(table)
+    client.get("/admin/users/")
+    client.get("/admin/users/24")
+    assert lookups(users) == [{"pk": 24}]
+    assert len(table._rows) == 0
+
+
+def test_detail_etag(users, make_client):
+    client = make_client(
+        CachedRowsTable(ident="users", title="Users", datasource=users)
+    )
+    response = client.get("/admin/users/1")
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.headers["cache-control"] == "no-cache"
+
+    for if_none_match in [etag, etag[2:], f'"other", {etag}', "*"]:
+        response = client.get(
+            "/admin/users/1", headers={"If-None-Match": if_none_match}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.text == ""
+
+    response = client.get("/admin/users/1", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+    # The tag changes when the row does.
+    client.post("/admin/users/1", data={"username": "updated"})
+    response = client.get("/admin/users/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_caches_are_shared_between_workers(users, make_client, tmp_path):
+    class SharedTable(CachedRowsTable):
+        PREFETCH = True
+
+    # Two workers, each with their own connection to the same cache file.
+    path = str(tmp_path / "cache.db")
+    tables = [
+        SharedTable(
+            ident="users",
+            title="Users",
+            datasource=dashboard.CachedDataSource(
+                users, cache=dashboard.SQLiteCache(path, namespace="users")
+            ),
+        )
+        for _ in range(2)
+    ]
+    table, other_table = tables
+    client, other_client = map(make_client, tables)
+
+    # Pages prefetched by one worker are served by the other.
+    with client:
+        client.get("/admin/users/")
+
+        async def prefetched():
+            await asyncio.gather(*table._prefetching.values())
+
+        client.portal.call(prefetched)
+    assert len(other_table._prefetched) == 1
+    response = other_client.get("/admin/users/?page=2")
+    assert [row.username for row in response.context["rows"]][:2] == [
+        "user10",
+        "user11",
+    ]
+
+    # Rows cached by one worker are revalidated by the other, until an edit
+    # in either worker clears them for both.
+    response = client.get("/admin/users/3")
+    etag = response.headers["etag"]
+    response = other_client.get("/admin/users/3", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = client.post("/admin/users/3", data={"username": "updated"})
+    assert response.status_code == 303
+    assert len(other_table._rows) == 0
+    assert len(other_table._prefetched) == 0
+    response = other_client.get("/admin/users/3", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.context["item"].username == "updated"
+
+    # Rows created by one worker are cached for both.
+    client.get("/admin/users/")
+    response = other_client.post("/admin/users/", data={"username": "new"})
+    assert response.status_code == 303
+    assert len(table._prefetched) == 0
+    assert table._rows.get("25")["username"] == "new"
+    response = client.get("/admin/users/25")
+    assert response.context["item"].username == "new"
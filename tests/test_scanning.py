@@ -0,0 +1,93 @@
+import asyncio
+import concurrent.futures
+import sys
+import threading
+
+from dashboard import scanning
+
+items = [
+    {"pk": i, "username": f"user{i}@example.org", "is_admin": i % 3 == 0}
+    for i in range(100)
+]
+
+
+def expected(filter_kwargs, search_term):
+    return scanning.filter_items(items, filter_kwargs, search_term)
+
+
+def test_scan_without_filters_returns_items():
+    result = asyncio.run(scanning.scan(items, None, None))
+    assert result is items
+
+
+def test_inline_scan():
+    result = asyncio.run(scanning.scan(items, {"is_admin": True}, "1"))
+    assert [item["pk"] for item in result] == [
+        pk for pk in range(100) if pk % 3 == 0 and "1" in str(pk)
+    ]
+
+
+def test_threadpool_scan():
+    result = asyncio.run(scanning.scan(items, {"is_admin": True}, None, threshold=10))
+    assert result == expected({"is_admin": True}, None)
+
+
+def test_run_in_threadpool():
+    main_thread = threading.get_ident()
+
+    def current_thread(items):
+        return threading.get_ident()
+
+    assert asyncio.run(scanning.run(current_thread, items)) == main_thread
+    assert asyncio.run(scanning.run(current_thread, items, threshold=10)) != main_thread
+
+
+def test_count_values():
+    counts = scanning.count_values(items, ["is_admin"])
+    assert counts == {"is_admin": {True: 34, False: 66}}
+
+
+def test_partitioned_scan():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        result = asyncio.run(
+            scanning.scan(
+                items, {"is_admin": False}, "USER2", executor=executor, threshold=10
+            )
+        )
+    assert result == expected({"is_admin": False}, "USER2")
+    assert len(result) > 0
+
+
+def test_process_pool_scan():
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        result = asyncio.run(
+            scanning.scan(
+                items, None, "9", executor=executor, threshold=10, partitions=4
+            )
+        )
+    assert result == expected(None, "9")
+
+
+def test_create_executor(monkeypatch):
+    monkeypatch.setattr(sys, "_is_gil_enabled", lambda: False, raising=False)
+    assert scanning.is_free_threaded()
+    with scanning.create_executor(max_workers=1) as executor:
+        assert isinstance(executor, concurrent.futures.ThreadPoolExecutor)
+
+    monkeypatch.setattr(sys, "_is_gil_enabled", lambda: True, raising=False)
+    assert not scanning.is_free_threaded()
+    with scanning.create_executor(max_workers=1) as executor:
+        assert isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+
+
+def test_find_first():
+    result = asyncio.run(scanning.find_first(items, 3, {"is_admin": True}, "USER"))
+    assert [item["pk"] for item in result] == [0, 3, 6]
+
+    # The scan stops as soon as enough matches are found, so later items
+    # are never looked at.
+    unmatchable = items[:12] + [None] * 5
+    result = asyncio.run(scanning.find_first(unmatchable, 2, None, "1", batch_size=5))
+    assert [item["pk"] for item in result] == [1, 10]
+    result = asyncio.run(scanning.find_first(items[:12], 5, None, "1", batch_size=5))
+    assert [item["pk"] for item in result] == [1, 10, 11]
@@ -11,3 +11,8 @@ def test_get_search_term():
 def test_search():
     queryset = filter_by_search_term(queryset=[], search_term="")
     assert queryset == []
+
+    queryset = [{"username": "Tom"}, {"username": "Lucy"}]
+    assert filter_by_search_term(queryset=queryset, search_term="TOM") == [
+        {"username": "Tom"}
+    ]
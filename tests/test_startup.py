@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+import dashboard
+from benchmarks import startup
+
+
+def loaded_modules(statement):
+    program = f"import sys\n{statement}\nprint(' '.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-c", program], capture_output=True, text=True, check=True
+    )
+    return set(result.stdout.split())
+
+
+def test_lazy_imports():
+    modules = loaded_modules("import dashboard")
+    assert [name for name in modules if name.startswith("dashboard.")] == []
+
+    modules = loaded_modules("from dashboard import MockDataSource")
+    assert "dashboard.datasource" in modules
+    assert "dashboard.application" not in modules
+    assert "starlette.concurrency" not in modules
+
+
+def test_lazy_attributes():
+    assert "DashboardTable" in dir(dashboard)
+    assert dashboard.DashboardTable is dashboard.application.DashboardTable
+    with pytest.raises(AttributeError):
+        dashboard.DoesNotExist
+
+
+def test_parse_import_time():
+    output = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |   typing",
+            "import time:       200 |       1500 | dashboard.datasource",
+            "import time:       300 |       2000 | dashboard",
+            "Traceback (most recent call last):",
+        ]
+    )
+    assert startup.parse_import_time(output) == 3.5
+
+
+def test_check():
+    [(statement, elapsed, budget)] = startup.check({"import dashboard": 5.0}, runs=1)
+    assert statement == "import dashboard"
+    assert elapsed < 1000
+    assert budget == 5.0
@@ -0,0 +1,207 @@
+import asyncio
+import datetime
+
+import typesystem
+
+import dashboard
+from dashboard import stats
+from dashboard.stats import ColumnStats, HyperLogLog, TableStats
+
+
+def test_hyperloglog():
+    counter = HyperLogLog()
+    assert counter.count() == 0
+    for value in range(50000):
+        counter.add(value)
+        counter.add(str(value))
+    assert abs(counter.count() - 100000) < 100000 * 0.05
+
+    counter = HyperLogLog()
+    for value in [1, 2, 3, 2, 1]:
+        counter.add(value)
+    assert counter.count() == 3
+
+
+def test_column_stats():
+    column = ColumnStats()
+    for value in [3, None, 1, 3, 2, None]:
+        column.add(value)
+    summary = column.summary()
+    assert (summary.count, summary.nulls) == (4, 2)
+    assert (summary.min, summary.max) == (1, 3)
+    assert (summary.distinct, summary.distinct_is_exact) == (3, True)
+    assert summary.top == ((3, 2), (1, 1), (2, 1))
+
+    column.remove(2)
+    column.remove(None)
+    summary = column.summary()
+    assert (summary.count, summary.nulls, summary.distinct) == (3, 1, 2)
+    assert not column.stale
+    column.remove(3)
+    assert column.stale
+
+    # Values that can't be compared have no minimum or maximum.
+    column = ColumnStats()
+    column.add(1)
+    column.add("a")
+    assert column.summary().min is None
+
+
+def test_untracked_values(monkeypatch):
+    monkeypatch.setattr(stats, "MAX_TRACKED_VALUES", 10)
+    column = ColumnStats()
+    for value in range(20):
+        column.add(value)
+    summary = column.summary()
+    assert (summary.distinct, summary.distinct_is_exact) == (20, False)
+    assert summary.top == ()
+
+    # The estimate can't forget values, but never exceeds the count.
+    for value in range(1, 19):
+        column.remove(value)
+    assert not column.stale
+    summary = column.summary()
+    assert (summary.count, summary.distinct) == (2, 2)
+    column.remove(19)
+    assert column.stale
+
+
+def test_table_stats():
+    rows = [{"pk": i, "status": "open" if i % 3 else "closed"} for i in range(9)]
+    table = TableStats(["pk", "status"], rows)
+    table.update(rows[0], {"pk": 0, "status": "open"})
+    table.update(rows[1], dict(rows[1]))
+    table.remove(rows[8])
+    current = [{"pk": 0, "status": "open"}] + rows[1:8]
+    summaries = table.summarize(current)
+    assert summaries["status"].top == (("open", 6), ("closed", 2))
+    # The maximum was removed, so the column is rebuilt from the rows.
+    assert summaries["pk"].max == 7
+    assert not table.columns["pk"].stale
+
+
+schema = typesystem.Schema(
+    fields={
+        "pk": typesystem.Integer(title="Identity", read_only=True),
+        "status": typesystem.String(title="Status", allow_null=True),
+        "created": typesystem.DateTime(title="Created"),
+    }
+)
+
+
+def make_datasource(cls=dashboard.MockDataSource):
+    start = datetime.datetime(2020, 1, 1)
+    return cls(
+        schema=schema,
+        initial=[
+            {
+                "pk": i,
+                "status": [None, "open", "completed"][i % 3],
+                "created": start + datetime.timedelta(days=i),
+            }
+            for i in range(10)
+        ],
+    )
+
+
+def test_mock_datasource_stats():
+    datasource = make_datasource()
+
+    async def main():
+        summaries = await datasource.stats()
+        assert summaries["status"].top == (("open", 3), ("completed", 3))
+        assert summaries["status"].nulls == 4
+        assert summaries["created"].max == datetime.datetime(2020, 1, 10)
+        built = datasource._table.stats
+        assert built is not None
+
+        # Writes keep the statistics up to date, without rebuilding them.
+        await datasource.create(
+            pk=10, status="completed", created=datetime.datetime(2021, 1, 1)
+        )
+        await datasource.update_by_key(1, {"status": "completed"})
+        await datasource.delete_by_key(0)
+        summaries = await datasource.stats()
+        assert datasource._table.stats is built
+        assert summaries["status"].top == (("completed", 5), ("open", 2))
+        assert summaries["status"].nulls == 3
+        assert summaries["created"].max == datetime.datetime(2021, 1, 1)
+        assert summaries["pk"].min == 1
+
+        # Only the columns whose minimum or maximum was removed are rebuilt.
+        pk, created = built.columns["pk"], built.columns["created"]
+        await datasource.delete_by_key(5)
+        assert built.stale_fields() == ["status"]
+        summaries = await datasource.stats()
+        assert built.stale_fields() == []
+        assert built.columns["pk"] is pk and built.columns["created"] is created
+        assert summaries["status"].top == (("completed", 4), ("open", 2))
+
+        # Statistics for part of the table are computed by a scan.
+        summaries = await datasource.filter(status="open").stats()
+        assert summaries["pk"].count == 2
+
+    asyncio.run(main())
+
+
+def test_stats_built_across_a_write():
+    class RacingDataSource(dashboard.MockDataSource):
+        PARALLEL_SCAN_THRESHOLD = 0
+
+    datasource = make_datasource(cls=RacingDataSource)
+
+    async def main():
+        task = asyncio.ensure_future(datasource.stats())
+        await asyncio.sleep(0)
+        await datasource.delete_by_key(9)
+        summaries = await task
+        assert summaries["pk"].count == 9
+
+    asyncio.run(main())
+
+
+def test_default_stats():
+    class DefaultStatsDataSource(dashboard.MockDataSource):
+        stats = dashboard.DataSource.stats
+
+    datasource = make_datasource(cls=DefaultStatsDataSource)
+
+    async def main():
+        summaries = await datasource.stats()
+        assert summaries["status"].top == (("open", 3), ("completed", 3))
+        assert summaries["pk"].distinct == 10
+
+    asyncio.run(main())
+
+
+def test_stats_view(make_client):
+    class SlowDataSource(dashboard.MockDataSource):
+        async def stats(self):
+            await asyncio.sleep(1)
+
+    class BudgetedTable(dashboard.DashboardTable):
+        REQUEST_TIMEOUT = 0.01
+
+    tables = [
+        dashboard.DashboardTable(
+            ident="tasks", title="Tasks", datasource=make_datasource()
+        ),
+        BudgetedTable(
+            ident="slow", title="Slow", datasource=make_datasource(cls=SlowDataSource)
+        ),
+    ]
+    client = make_client(*tables)
+
+    response = client.get("/admin/tasks/")
+    assert 'href="http://testserver/admin/tasks/-/stats"' in response.text
+
+    response = client.get("/admin/tasks/-/stats")
+    assert response.status_code == 200
+    assert response.template.name == "dashboard/stats.html"
+    title, status = response.context["columns"][1]
+    assert title == "Status"
+    assert status.top == (("open", 3), ("completed", 3))
+    assert "2020-01-10 00:00:00" in response.text
+
+    response = client.get("/admin/slow/-/stats")
+    assert response.status_code == 503
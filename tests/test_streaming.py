@@ -0,0 +1,178 @@
+import asyncio
+import re
+
+import jinja2
+import pytest
+
+import dashboard
+from dashboard.streaming import RowStream, render_chunks
+
+
+class StreamingTable(dashboard.DashboardTable):
+    STREAMING = True
+    STREAMING_BATCH_SIZE = 3
+
+
+@pytest.fixture
+def client(users, make_client):
+    return make_client(
+        StreamingTable(ident="streamed", title="Users", datasource=users),
+        dashboard.DashboardTable(ident="rendered", title="Users", datasource=users),
+    )
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text.replace("/admin/rendered", "/admin/streamed"))
+
+
+@pytest.mark.parametrize(
+    "query", ["", "?page=2&filter.is_admin=true", "?search=nothing", "?order=-pk"]
+)
+def test_streamed_page_matches_rendered_page(client, query):
+    streamed = client.get("/admin/streamed" + query)
+    rendered = client.get("/admin/rendered" + query)
+    assert streamed.status_code == 200
+    assert streamed.headers["content-type"] == "text/html; charset=utf-8"
+    assert normalize(streamed.text) == normalize(rendered.text)
+
+
+def test_head_is_sent_before_rows(client, users):
+    app = client.app
+
+    async def main():
+        gate = users.gates["iterate"] = asyncio.Event()
+        messages = []
+        first_body = asyncio.Event()
+
+        async def receive():
+            # The client never disconnects.
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body":
+                first_body.set()
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/admin/streamed/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "scheme": "http",
+        }
+        task = asyncio.ensure_future(app(scope, receive, send))
+        await asyncio.wait_for(first_body.wait(), timeout=5)
+
+        # The page head has been sent, while the rows are still being fetched.
+        head = messages[1]["body"].decode()
+        assert "bootstrap.min.css" in head
+        assert '/admin/streamed/0"' not in head
+        assert not task.done()
+
+        gate.set()
+        await task
+        body = "".join(
+            message["body"].decode()
+            for message in messages
+            if message["type"] == "http.response.body"
+        )
+        assert '/admin/streamed/9"' in body
+        assert body.rstrip().endswith("</html>")
+
+    asyncio.run(main())
+
+
+def test_rows_are_sent_as_they_are_read(client, users):
+    app = client.app
+
+    async def main():
+        gate = users.gates["iterate"] = asyncio.Event()
+        users.ungated = 1
+        messages = []
+
+        def body():
+            return "".join(
+                message["body"].decode()
+                for message in messages
+                if message["type"] == "http.response.body"
+            )
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/admin/streamed/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "scheme": "http",
+        }
+        task = asyncio.ensure_future(app(scope, receive, send))
+
+        async def first_batch_sent():
+            while '/admin/streamed/2"' not in body():
+                await asyncio.sleep(0.01)
+
+        # The first batch of rows is sent before the later batches are read.
+        await asyncio.wait_for(first_batch_sent(), timeout=5)
+        assert '/admin/streamed/3"' not in body()
+        assert not task.done()
+
+        gate.set()
+        await task
+        assert '/admin/streamed/9"' in body()
+        assert '/admin/streamed/10"' not in body()
+
+    asyncio.run(main())
+
+
+def test_row_stream():
+    async def main():
+        batches = []
+
+        async def on_batch(batch):
+            batches.append(batch)
+
+        rows = RowStream([1, 2, 3, 4, 5], batch_size=2, on_batch=on_batch)
+        assert not rows
+        await rows.start()
+        assert rows
+        assert [row async for row in rows] == [1, 2, 3, 4, 5]
+        assert batches == [[1, 2], [3, 4], [5]]
+
+        rows = RowStream([], batch_size=2)
+        await rows.start()
+        assert not rows
+
+    asyncio.run(main())
+
+
+def test_render_chunks():
+    env = jinja2.Environment(enable_async=True)
+
+    async def values():
+        for value in range(3):
+            yield value
+            await asyncio.sleep(0)
+
+    async def render(source, **context):
+        template = env.from_string(source)
+        return [chunk async for chunk in render_chunks(template, context)]
+
+    chunks = asyncio.run(
+        render("a{% for v in values %}[{{ v }}]{% endfor %}b", values=values())
+    )
+    assert "".join(chunks) == "a[0][1][2]b"
+    assert len(chunks) > 1
+
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(render("a{{ 1 // 0 }}"))
@@ -0,0 +1,61 @@
+import pytest
+
+import dashboard
+
+
+@pytest.fixture
+def make_budgeted_client(users, make_client):
+    def make_budgeted_client(**budgets):
+        table_class = type("BudgetedTable", (dashboard.DashboardTable,), budgets)
+        return make_client(table_class(ident="users", title="Users", datasource=users))
+
+    return make_budgeted_client
+
+
+def test_page_within_budgets(make_budgeted_client, users):
+    client = make_budgeted_client(
+        COUNT_TIMEOUT=5.0, ROWS_TIMEOUT=6.0, REQUEST_TIMEOUT=10.0
+    )
+    response = client.get("/admin/users/")
+    assert response.context["count"] == 25
+    assert "25 results" in response.text
+    assert len(response.context["page_controls"]) == 5
+    assert len(response.context["facets"]) == 1
+    # The budgets are pushed down to the datasource.
+    assert users.recorded("timeouts", operation="all") == [(10.0, 6.0)]
+
+
+def test_slow_count_falls_back_to_next_previous_paging(make_budgeted_client, users):
+    client = make_budgeted_client(COUNT_TIMEOUT=0.01)
+    users.delays["count"] = 1.0
+    users.delays["facets"] = 1.0
+
+    response = client.get("/admin/users/")
+    assert response.status_code == 200
+    assert response.context["count"] is None
+    assert "Many results" in response.text
+    assert len(response.context["rows"]) == 10
+    assert [control.text for control in response.context["page_controls"]] == [
+        "Previous",
+        "1",
+        "Next",
+    ]
+    # Facet counts have the same budget, so are left out.
+    assert response.context["facets"] == []
+
+    response = client.get("/admin/users/?page=3")
+    assert len(response.context["rows"]) == 5
+    assert response.context["page_controls"][-1].is_disabled
+
+
+def test_slow_rows_fail_the_request(make_budgeted_client, users):
+    client = make_budgeted_client(ROWS_TIMEOUT=0.01)
+    users.delays["all"] = 1.0
+    assert client.get("/admin/users/").status_code == 503
+
+
+def test_slow_request_fails(make_budgeted_client, users):
+    client = make_budgeted_client(REQUEST_TIMEOUT=0.05)
+    users.delays["count"] = 0.03
+    users.delays["all"] = 0.03
+    assert client.get("/admin/users/").status_code == 503